@@ -1,6 +1,14 @@
 import os
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from utils.log import setup_logging, get_logger, init_app as init_logging
+from utils.static_files import StaticIndex
+
+# logging dipasang paling awal supaya log saat import (migrasi, model AI) ikut terstruktur
+setup_logging()
+log = get_logger("edumate.app")
 
 # Blueprints (optional import safe)
 try:
@@ -8,16 +16,37 @@ try:
     from routes.chat import chat_bp
     from routes.quiz import quiz_bp
     from routes.misc import misc_bp
-    from database import init_db
+    from database import init_db, init_app
+    from utils import metrics
 except Exception as e:
-    print(f"[WARN] Skipping module import: {e}")
-    auth_bp = chat_bp = quiz_bp = misc_bp = None
+    log.warning("skipping module import", extra={"data": {"error": str(e)}})
+    auth_bp = chat_bp = quiz_bp = misc_bp = metrics = None
     init_db = lambda: None
+    init_app = lambda app: None
 
 # --- Flask setup ---
 frontend_dir = os.path.join(os.path.dirname(__file__), "../frontend")
 app = Flask(__name__, static_folder=frontend_dir, template_folder=frontend_dir)
-CORS(app)
+# Jumlah reverse proxy tepercaya di depan app (nginx, load balancer, Vercel). Tanpa ini
+# request.remote_addr = alamat proxy, jadi rate limit tanpa login berlaku per proxy,
+# bukan per klien. Jangan diisi lebih dari jumlah proxy sebenarnya: X-Forwarded-For
+# bisa dipalsukan klien.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+CORS(app, expose_headers=["X-Request-ID", "Retry-After"])
+init_logging(app)  # request ID per request -> semua log + header X-Request-ID
+init_app(app)  # koneksi DB per request, dikembalikan ke pool saat teardown
+if metrics: metrics.init_app(app)  # latensi per route -> /api/misc/metrics
+# file frontend di-hash & dikompres sekali di sini; request cukup lookup dict
+static_index = StaticIndex(frontend_dir)
+
+# Skema + migrasi dijalankan saat import (gunicorn / vercel tidak lewat __main__).
+# Idempotent: cuma CREATE IF NOT EXISTS + cek schema_version.
+try:
+    init_db()
+except Exception as e:
+    log.warning("init_db gagal", extra={"data": {"error": str(e)}})
 
 # --- Register Blueprints (only if available) ---
 if auth_bp: app.register_blueprint(auth_bp, url_prefix="/api/auth")
@@ -28,16 +57,16 @@ if misc_bp: app.register_blueprint(misc_bp, url_prefix="/api/misc")
 # --- Routes ---
 @app.route("/")
 def index():
-    index_path = os.path.join(app.static_folder, "index.html")
-    if os.path.exists(index_path):
-        return send_from_directory(app.static_folder, "index.html")
+    response = static_index.serve("index.html")
+    if response is not None:
+        return response
     return jsonify({"status": "ok", "message": "Edumate backend running (no frontend)"})
 
 @app.route("/<path:path>")
 def serve_page(path):
-    file_path = os.path.join(app.static_folder, path)
-    if os.path.exists(file_path):
-        return send_from_directory(app.static_folder, path)
+    response = static_index.serve(path)
+    if response is not None:
+        return response
     return jsonify({"error": "File not found"}), 404
 
 # --- Main entry ---
@@ -46,7 +75,7 @@ def vercel_handler(request=None):
     return app
 
 if __name__ == "__main__":
-    print("[INIT] Starting local Flask server...")
-    init_db()
+    log.info("starting local Flask server")
     port = int(os.getenv("PORT", 8080))
+    static_index.auto_reload = True  # dev server: edit file frontend langsung terlihat
     app.run(host="0.0.0.0", port=port, debug=True)
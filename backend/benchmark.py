@@ -0,0 +1,693 @@
+"""
+benchmark.py - micro benchmark lokal EduMate (tanpa Gemini, DB sementara)
+
+Pemakaian:
+    python benchmark.py db [--requests 2000] [--threads 8]
+    python benchmark.py plans          # cek EXPLAIN QUERY PLAN query penting di models.py
+    python benchmark.py startup [--runs 10]   # waktu import app.py (cold start)
+    python benchmark.py parse [--cases 2000]  # fuzz + benchmark parser JSON soal
+    python benchmark.py writes [--quizzes 200]  # tulis quiz: commit terpisah vs satu transaksi
+    python benchmark.py login [--seconds 2]     # login/detik per worker untuk tiap setelan cost hash
+    python benchmark.py static [--requests 2000]  # file frontend: send_from_directory vs index di memori
+    python benchmark.py search [--rows 100000]   # cari chat: LIKE '%kata%' vs FTS5
+    python benchmark.py load [--concurrency 1,4,16,32] [--duration 10] [--out hasil.json] [--compare lama.json]
+                                                # campuran register/login/chat/quiz/submit/leaderboard, fake LLM
+
+Semua benchmark jalan di database sementara, edumate.db tidak disentuh.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_TMPDIR = tempfile.mkdtemp(prefix="edumate-bench-")
+os.environ.setdefault("EDUMATE_DB", os.path.join(_TMPDIR, "bench.db"))
+os.environ.pop("GEMINI_API_KEY", None)  # jangan pernah panggil API asli dari benchmark
+for _name in ("RATE_USER_PER_MIN", "RATE_USER_BURST", "RATE_GLOBAL_PER_MIN", "RATE_GLOBAL_BURST"):
+    os.environ.setdefault(_name, "1e9")  # yang diukur throughput, bukan rate limiter
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database  # noqa: E402
+import models  # noqa: E402
+
+
+def _legacy_get_db():
+    # perilaku lama: koneksi baru tiap query, tanpa WAL / pragma
+    conn = sqlite3.connect(database.DB_PATH, factory=database.Connection)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _run_requests(app, n_requests, n_threads, make_request):
+    local = threading.local()
+    errors = []
+
+    def one(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        try:
+            resp = make_request(client, i)
+            if resp.status_code >= 400:
+                errors.append(resp.status_code)
+        except Exception as e:
+            errors.append(repr(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as ex:
+        list(ex.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return n_requests / elapsed, errors
+
+
+_pooled_get_db = database.get_db
+
+
+def _legacy_save_chat_turn(username, question, answer):
+    # alur lama: dua save_chat, masing-masing koneksi + commit sendiri
+    return models.save_chat(username, "user", question), models.save_chat(username, "bot", answer)
+
+
+def bench_db(args):
+    """Bandingkan requests/sec POST /api/chat: koneksi per query (lama) vs pool + WAL."""
+    import routes.chat
+    from app import app
+
+    database.init_db()
+    # username di body tanpa token ditolak: login 50 user dulu, request memakai token
+    client = app.test_client()
+    tokens = []
+    for n in range(50):
+        client.post("/api/auth/register", json={"username": f"user{n}", "password": "bench12345"})
+        tokens.append(client.post("/api/auth/login", json={"username": f"user{n}", "password": "bench12345"})
+                      .get_json()["token"])
+
+    def chat(client, i):
+        return client.post("/api/chat", json={"message": f"halo {i}"},
+                           headers={"Authorization": f"Bearer {tokens[i % 50]}"})
+
+    results = {}
+    for mode in ("legacy", "pooled"):
+        legacy = mode == "legacy"
+        models.get_db = database.get_db = _legacy_get_db if legacy else _pooled_get_db
+        routes.chat.save_chat_turn = _legacy_save_chat_turn if legacy else models.save_chat_turn
+        rps, errors = _run_requests(app, args.requests, args.threads, chat)
+        results[mode] = rps
+        print(f"{mode:>8}: {rps:8.1f} req/s  errors={len(errors)}")
+        if errors:
+            print(f"          contoh error: {errors[:3]}")
+
+    if results.get("legacy"):
+        print(f" speedup: {results['pooled'] / results['legacy']:.2f}x")
+
+
+# Query panas di models.py beserta index yang wajib dipakai
+HOT_QUERIES = [
+    ("get_user_by_username", models.USER_BY_USERNAME_SQL, ("u",)),
+    ("last_chat_id", models.LAST_CHAT_ID_SQL, ("u",)),
+    ("get_chats_for_user", models.CHATS_LATEST_SQL, ("u", 50)),
+    ("get_chats_for_user(before_id)", models.CHATS_BEFORE_SQL, ("u", 100, 50)),
+    ("get_chats_for_user(after_id)", models.CHATS_AFTER_SQL, ("u", 100, 50)),
+    ("get_quiz_questions", models.QUIZ_QUESTIONS_SQL, (1,)),
+    ("get_leaderboard", models.LEADERBOARD_SQL, ("all", "", 10)),
+    ("get_leaderboard(window, category)", models.LEADERBOARD_SQL, ("w:2026-W41", "fisika", 10)),
+    ("search_chats", models.SEARCH_CHATS_SQL.format(role=""),
+     ("[", "]", '{message}: ("gaya"*) AND {username}: ("u")', "u", 21, 0)),
+    ("search_chats(role)", models.SEARCH_CHATS_SQL.format(role=models.ROLE_FILTER),
+     ("[", "]", '{message}: ("gaya"*) AND {username}: ("u")', "u", "bot", 21, 0)),
+    ("search_questions", models.SEARCH_QUESTIONS_SQL.format(category=""), ("[", "]", '"gaya"*', 21, 0)),
+    ("search_questions(category)", models.SEARCH_QUESTIONS_SQL.format(category=models.CATEGORY_FILTER),
+     ("[", "]", '"gaya"*', "fisika", 21, 0)),
+    ("similar_questions(category)", models.SIMILAR_QUESTIONS_SQL.format(category=models.CATEGORY_FILTER),
+     ('"gaya" OR "newton"', "fisika", 5)),
+    ("job_enqueue(dedupe)", models.JOB_DEDUPE_SQL, ("quiz", "k")),
+    ("job_claim", models.JOB_CLAIM_SQL, ("quiz", 0.0, "quiz", 0.0)),
+    ("job_get", models.JOB_GET_SQL, ("x",)),
+]
+
+# FTS5 dengan constraint MATCH: idxStr berisi "M" (tanpa M = scan seluruh index FTS)
+_FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+
+
+def _indexed(detail):
+    return ("USING" in detail and ("INDEX" in detail or "PRIMARY KEY" in detail)) or bool(_FTS_MATCH.search(detail))
+
+
+def bench_plans(args):
+    """Gagal (exit 1) kalau ada query panas yang full table scan tanpa index."""
+    database.init_db()
+    conn = database.get_db()
+    failed = []
+    for name, sql, params in HOT_QUERIES:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        details = [r["detail"] for r in rows]
+        uses_index = any(_indexed(d) for d in details)
+        full_scan = any(d.startswith("SCAN") and not _indexed(d) and "COVERING INDEX" not in d for d in details)
+        ok = uses_index and not full_scan
+        print(f"{'OK ' if ok else 'BAD'} {name}: {' | '.join(details)}")
+        if not ok:
+            failed.append(name)
+    if failed:
+        sys.exit(f"Query tanpa index: {', '.join(failed)}")
+
+
+def bench_startup(args):
+    """
+    Waktu `import app` di interpreter baru (mirip cold start worker / Vercel).
+    'eager' = import + deteksi model langsung (perilaku lama: list_models() saat import),
+    'lazy'  = import saja (deteksi model ditunda ke request pertama / background).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    scripts = {
+        "eager": "import app; from utils import ai_helper; ai_helper.get_available_model()",
+        "lazy": "import app",
+    }
+    env = dict(os.environ, AI_MODEL_CACHE=os.path.join(_TMPDIR, "model.json"))
+    if args.api_key:
+        env["GEMINI_API_KEY"] = args.api_key
+    for mode, code in scripts.items():
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        print(f"{mode:>6}: median {statistics.median(times) * 1000:7.1f} ms  min {min(times) * 1000:7.1f} ms")
+
+
+def _legacy_parse(raw):
+    # parse_possible_json versi lama (regex multi-pass), hanya untuk pembanding
+    raw = re.sub(r"```json|```", "", raw, flags=re.IGNORECASE).strip()
+    start, end = raw.find("["), raw.rfind("]")
+    if start == -1 or end == -1:
+        raise ValueError("No JSON array found in AI output")
+    json_str = raw[start:end + 1]
+    json_str = (json_str.replace("\u201c", '"').replace("\u201d", '"')
+                .replace("\u2018", "'").replace("\u2019", "'").replace("\n", " "))
+    json_str = re.sub(r",\s*]", "]", json_str)
+    json_str = re.sub(r",\s*}", "}", json_str)
+    try:
+        parsed = json.loads(json_str)
+        if isinstance(parsed, list) and all("q" in q for q in parsed):
+            return parsed
+    except Exception:
+        pass
+    fixed = []
+    for match in re.finditer(r'\{[^{}]*\}', json_str):
+        try:
+            item = json.loads(match.group())
+            if "q" in item and "options" in item and "answer" in item:
+                fixed.append(item)
+        except Exception:
+            continue
+    return fixed
+
+
+def _sample_questions(n, rng):
+    return [
+        {"q": f"Soal {i} tentang {{gaya}} \"newton\"?", "options": [f"opsi {c}{i}" for c in "ABCD"],
+         "answer": rng.choice("ABCD")}
+        for i in range(n)
+    ]
+
+
+def _mutate(text, rng):
+    """Rusak output seperti yang biasa dilakukan model."""
+    mutations = []
+    if rng.random() < 0.3:
+        text = "```json\n" + text + "\n```"
+        mutations.append("fence")
+    if rng.random() < 0.3:
+        text = "Berikut soalnya:\n" + text + "\nSemoga membantu."
+        mutations.append("prose")
+    if rng.random() < 0.3:
+        text = text.replace('"q": "', '"q": \u201c', 1).replace('?", "options"', '?\u201d, "options"', 1)
+        mutations.append("smart-quotes")
+    if rng.random() < 0.3:
+        text = text.replace("]}", "],}").replace("}]", "},]")
+        mutations.append("trailing-comma")
+    if rng.random() < 0.3:
+        text = text.replace("tentang", "tentang\n", 3)
+        mutations.append("raw-newline")
+    if rng.random() < 0.4:
+        text = text[: rng.randint(1, len(text))]
+        mutations.append("truncate")
+    return text, mutations
+
+
+def bench_parse(args):
+    """Fuzz parser inkremental (tidak boleh crash, hasil stream == hasil utuh), lalu benchmark 1000 soal."""
+    from utils.json_stream import QuizStreamParser
+    from utils.ai_helper import parse_possible_json
+
+    def parse_all(text, chunk=None):
+        parser = QuizStreamParser()
+        if chunk is None:
+            return parser.feed(text) + parser.close()
+        out = []
+        for i in range(0, len(text), chunk):
+            out.extend(parser.feed(text[i:i + chunk]))
+        return out + parser.close()
+
+    rng = random.Random(args.seed)
+    failures, salvaged, legacy_salvaged = 0, 0, 0
+    for _ in range(args.cases):
+        original = _sample_questions(rng.randint(1, 30), rng)
+        text, mutations = _mutate(json.dumps(original, ensure_ascii=False), rng)
+        whole = parse_all(text)
+        streamed = parse_all(text, chunk=rng.randint(1, 64))
+        known = {" ".join(q["q"].split()) for q in original}
+        if whole != streamed or any(" ".join(item["q"].split()) not in known for item in whole):
+            failures += 1
+            if failures <= 3:
+                print(f"FAIL mutations={mutations}: {text[:120]!r}")
+        salvaged += len(whole)
+        try:
+            legacy_salvaged += len(_legacy_parse(text))
+        except ValueError:
+            pass
+    print(f"fuzz: {args.cases} kasus, {failures} gagal, soal terselamatkan baru={salvaged} lama={legacy_salvaged}")
+
+    big = json.dumps(_sample_questions(1000, rng), ensure_ascii=False)
+    truncated = big[: int(len(big) * 0.97)]
+    for label, text in (("1000 soal utuh", big), ("1000 soal terpotong", truncated)):
+        for name, fn in (("lama", _legacy_parse), ("inkremental", parse_all), ("parse_possible_json", parse_possible_json)):
+            start = time.perf_counter()
+            n = len(fn(text))
+            print(f"{label:>20} {name:>19}: {n:4d} soal {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    parser = QuizStreamParser()
+    start = time.perf_counter()
+    for i in range(0, len(big), 64):
+        if parser.feed(big[i:i + 64]):
+            break
+    print(f"{'stream 64B/chunk':>20}: soal pertama siap setelah {i + 64} byte, {(time.perf_counter() - start) * 1e6:.0f} us")
+    if failures:
+        sys.exit(1)
+
+
+def _legacy_create_quiz(conn, username, category, questions):
+    # alur lama: insert quiz (commit), lalu satu execute + commit untuk tiap soal
+    with conn:
+        quiz_id = conn.execute("INSERT INTO quizzes (username, category, total) VALUES (?, ?, ?)",
+                               (username, category, len(questions))).lastrowid
+    with conn:
+        for idx, item in enumerate(questions):
+            conn.execute(
+                "INSERT INTO quiz_questions (quiz_id, q_index, question, options, answer) VALUES (?,?,?,?,?)",
+                (quiz_id, idx, item["q"], json.dumps(item["options"]), item["answer"]))
+    return quiz_id
+
+
+def bench_writes(args):
+    """Quiz/detik & soal/detik: create_quiz_record + save_quiz_questions lama vs models.create_quiz."""
+
+    database.init_db()
+    conn = database.get_db()
+    for size in (15, 30, 100):
+        questions = [
+            {"q": f"Soal nomor {i + 1}?", "options": [f"Opsi {c}" for c in "ABCD"], "answer": "Opsi A"}
+            for i in range(size)
+        ]
+        results = {}
+        for mode in ("legacy", "batched"):
+            start = time.perf_counter()
+            for i in range(args.quizzes):
+                if mode == "legacy":
+                    _legacy_create_quiz(conn, f"user{i % 50}", "bench", questions)
+                else:
+                    models.create_quiz(f"user{i % 50}", "bench", size, questions)
+            elapsed = time.perf_counter() - start
+            results[mode] = args.quizzes / elapsed
+            print(f"{size:>3} soal {mode:>8}: {results[mode]:8.1f} quiz/s  {results[mode] * size:9.0f} baris/s")
+        print(f"{size:>3} soal  speedup: {results['batched'] / results['legacy']:.2f}x")
+
+
+def bench_login(args):
+    """Verifikasi password per detik: 1 worker, lalu pool PWD_WORKERS thread (KDF melepas GIL)."""
+    from utils import security
+
+    settings = [
+        ("sha256 (lama)", security.LegacySHA256Hasher()),
+        ("pbkdf2 100k", security.PBKDF2Hasher(100_000)),
+        ("pbkdf2 600k", security.PBKDF2Hasher(600_000)),
+        ("scrypt n=2^13", security.ScryptHasher(n=2 ** 13)),
+        ("scrypt n=2^14", security.ScryptHasher(n=2 ** 14)),
+        ("scrypt n=2^15", security.ScryptHasher(n=2 ** 15)),
+    ]
+    workers = args.workers
+    print(f"{'setelan':>15} {'1 worker':>12} {f'{workers} worker':>12} {'per worker':>12}")
+    for label, hasher in settings:
+        hashed = hasher.encode("rahasia123")
+
+        def verify_until(deadline):
+            n = 0
+            while time.perf_counter() < deadline:
+                hasher.verify("rahasia123", hashed)
+                n += 1
+            return n
+
+        deadline = time.perf_counter() + args.seconds
+        single = verify_until(deadline) / args.seconds
+        deadline = time.perf_counter() + args.seconds
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            pooled = sum(ex.map(verify_until, [deadline] * workers)) / args.seconds
+        print(f"{label:>15} {single:10.1f}/s {pooled:10.1f}/s {pooled / workers:10.1f}/s")
+
+
+def bench_static(args):
+    """Request/detik + byte terkirim untuk satu page load (HTML + CSS + JS), lama vs StaticIndex."""
+    from flask import Flask, send_from_directory
+    from app import app, frontend_dir, static_index
+
+    legacy = Flask("legacy_static")
+
+    @legacy.route("/<path:path>")
+    def legacy_serve(path):
+        if os.path.exists(os.path.join(frontend_dir, path)):
+            return send_from_directory(frontend_dir, path)
+        return "", 404
+
+    fingerprinted = [static_index.url_for(n) for n in ("style.css", "script.js")]
+    cases = [
+        ("lama", legacy, ["/index.html", "/style.css", "/script.js"], {}),
+        ("index", app, ["/index.html"] + fingerprinted, {"Accept-Encoding": "gzip, br"}),
+    ]
+    for label, target, paths, headers in cases:
+        sent = []
+
+        def request(client, i):
+            resp = client.get(paths[i % len(paths)], headers=headers)
+            sent.append(len(resp.get_data()))
+            return resp
+
+        rps, errors = _run_requests(target, args.requests, args.threads, request)
+        print(f"{label:>6}: {rps:8.1f} req/s  {sum(sent) / len(sent):8.0f} byte/request  error={len(errors)}")
+
+    # kunjungan ulang: HTML direvalidasi (304), aset ber-fingerprint tidak diminta lagi sama sekali
+    etag = app.test_client().get("/index.html").headers["ETag"]
+    rps, errors = _run_requests(app, args.requests, args.threads,
+                                lambda client, i: client.get("/index.html", headers={"If-None-Match": etag}))
+    print(f"   304: {rps:8.1f} req/s  error={len(errors)}")
+
+
+def bench_search(args):
+    """Cari di chats: LIKE '%kata%' (full scan) vs chats_fts MATCH (bm25), pada --rows pesan."""
+
+    database.init_db()
+    rng = random.Random(1)
+    words = [f"kata{i}" for i in range(5000)] + ["fotosintesis", "klorofil", "newton", "gravitasi"]
+    with database.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chats (username, role, message) VALUES (?, ?, ?)",
+            ((f"user{i % 200}", "bot", " ".join(rng.choices(words, k=40))) for i in range(args.rows)))
+    conn = database.get_db()
+    cases = [
+        ("LIKE", lambda w, u: conn.execute(
+            "SELECT id FROM chats WHERE username=? AND message LIKE ? ORDER BY id DESC LIMIT 20",
+            (u, f"%{w}%")).fetchall()),
+        ("FTS5", lambda w, u: models.search_chats(u, w, limit=20)),
+    ]
+    for label, search in cases:
+        start = time.perf_counter()
+        for i in range(args.queries):
+            search(rng.choice(words[-4:]), f"user{i % 200}")
+        elapsed = time.perf_counter() - start
+        print(f"{label:>5}: {args.queries / elapsed:8.1f} query/s  {elapsed / args.queries * 1000:7.2f} ms/query")
+
+
+# Campuran traffic default (bobot relatif) untuk `load`
+LOAD_MIX = {
+    "chat": 30, "chat_stream": 5, "quiz": 8, "questions": 7, "submit": 15,
+    "leaderboard": 20, "history": 10, "login": 4, "register": 1,
+}
+CHAT_TOPICS = ["fotosintesis", "hukum newton", "pecahan", "sistem pencernaan", "perang dunia",
+               "persamaan kuadrat", "teks eksposisi", "siklus air", "sel hewan", "listrik statis"]
+
+
+def _parse_mix(spec):
+    mix = dict(LOAD_MIX)
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, weight = part.partition("=")
+        if name not in LOAD_MIX:
+            raise SystemExit(f"endpoint tidak dikenal di --mix: {name} (pilihan: {', '.join(LOAD_MIX)})")
+        mix[name] = float(weight)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[idx]
+
+
+class _LoadState:
+    """Data bersama antar thread load: user yang sudah login + quiz yang bisa dikerjakan."""
+
+    def __init__(self, password):
+        self.password = password
+        self.users = []      # [(username, token)]
+        self.quizzes = []    # [(quiz_id, total)]
+        self.registered = 0
+        self.lock = threading.Lock()
+
+    def add_quiz(self, resp):
+        if resp.status_code == 201:
+            body = resp.get_json()
+            with self.lock:
+                self.quizzes.append((body["quiz_id"], len(body["questions"])))
+
+
+def _load_action(name, client, state, rng):
+    username, token = rng.choice(state.users)
+    auth = {"Authorization": f"Bearer {token}"}
+    if name in ("chat", "chat_stream"):
+        # pertanyaan dari kumpulan terbatas: sebagian kena ai_cache seperti traffic asli
+        message = f"Jelaskan {rng.choice(CHAT_TOPICS)} bagian {rng.randint(1, 20)}"
+        path = "/api/chat" if name == "chat" else "/api/chat/stream"
+        return client.post(path, json={"username": username, "message": message}, headers=auth)
+    if name == "quiz":
+        # POST /api/quiz selalu lewat antrian job; wait=N -> 201 + soal kalau selesai dalam N detik
+        resp = client.post("/api/quiz", headers=dict(auth, Prefer="wait=25"), json={
+            "username": username, "category": rng.choice(CHAT_TOPICS), "total": rng.choice((5, 10, 15))})
+        state.add_quiz(resp)
+        return resp
+    if name == "questions":
+        quiz_id, _ = rng.choice(state.quizzes)
+        return client.get(f"/api/quiz/{quiz_id}/questions", headers=auth)
+    if name == "submit":
+        quiz_id, total = rng.choice(state.quizzes)
+        answers = {str(i): rng.choice("ABCD") for i in range(total)}
+        return client.post(f"/api/quiz/{quiz_id}/submit", json={"username": username, "answers": answers}, headers=auth)
+    if name == "leaderboard":
+        window = rng.choice(("all", "all", "weekly", "daily"))
+        return client.get(f"/api/quiz/leaderboard?window={window}", headers=auth)
+    if name == "history":
+        return client.get(f"/api/chat/history/{username}?limit=20", headers=auth)
+    if name == "login":
+        return client.post("/api/auth/login", json={"username": username, "password": state.password})
+    if name == "register":
+        with state.lock:
+            state.registered += 1
+            new_user = f"load_new_{os.getpid()}_{state.registered}"
+        return client.post("/api/auth/register", json={"username": new_user, "password": state.password})
+    raise ValueError(name)
+
+
+def _load_level(app, state, mix, concurrency, duration, seed):
+    names, weights = list(mix), list(mix.values())
+    samples = []  # (endpoint, detik, status)
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(n):
+        rng = random.Random(f"{seed}:{concurrency}:{n}")
+        client = app.test_client()
+        local = []
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                resp = _load_action(name, client, state, rng)
+                resp.get_data()  # SSE: baca sampai stream selesai
+                resp.close()     # test client tidak menutup sendiri -> slot admission tidak lepas
+                status = resp.status_code
+            except Exception:
+                status = 0
+            local.append((name, time.perf_counter() - start, status))
+        with samples_lock:
+            samples.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    for name in names + ["TOTAL"]:
+        rows = [s for s in samples if name == "TOTAL" or s[0] == name]
+        if not rows:
+            continue
+        latencies = sorted(s[1] for s in rows)
+        report[name] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "429": sum(1 for s in rows if s[2] == 429),
+            "errors": sum(1 for s in rows if s[2] == 0 or (s[2] >= 400 and s[2] != 429)),
+        }
+    return report
+
+
+def _load_compare(results, baseline_path, tolerance):
+    """Bandingkan dengan hasil --out sebelumnya: p95 naik / RPS turun > toleransi -> regresi."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["levels"]
+    regressions = []
+    for level, endpoints in results.items():
+        for name, now in endpoints.items():
+            before = baseline.get(level, {}).get(name)
+            if not before:
+                continue
+            if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"c={level} {name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+            if before["rps"] and now["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"c={level} {name}: rps {before['rps']} -> {now['rps']}")
+    for line in regressions:
+        print(f"[REGRESI] {line}")
+    print(f"[BENCH] {len(regressions)} regresi dibanding {baseline_path} (toleransi {tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+def bench_load(args):
+    """
+    Load test in-process: app.py + DB sementara + fake LLM (latensi, token/detik, rasio JSON rusak).
+    Concurrency dinaikkan bertahap; per endpoint dilaporkan RPS dan p50/p95/p99.
+    """
+    os.environ["EDUMATE_FAKE_LLM"] = "1"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_TOKEN_DELAY"] = str(1 / args.token_rate if args.token_rate > 0 else 0)
+    os.environ["FAKE_LLM_MALFORMED_RATE"] = str(args.malformed_rate)
+    os.environ["FAKE_LLM_FAIL_RATE"] = str(args.fail_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    os.environ.setdefault("QUESTION_BANK_WORKER", "0")  # worker background bikin angka tidak stabil
+    from app import app
+    from utils import metrics
+
+    mix = _parse_mix(args.mix)
+    state = _LoadState("loadtest123")
+    client = app.test_client()
+    setup_start = time.perf_counter()
+    for i in range(args.users):
+        username = f"load_user_{i}"
+        client.post("/api/auth/register", json={"username": username, "password": state.password})
+        resp = client.post("/api/auth/login", json={"username": username, "password": state.password})
+        token = resp.get_json()["token"]
+        state.users.append((username, token))
+        state.add_quiz(client.post("/api/quiz", json={"username": username, "category": CHAT_TOPICS[i % len(CHAT_TOPICS)],
+                                                      "total": 10},
+                                   headers={"Authorization": f"Bearer {token}", "Prefer": "wait=25"}))
+    print(f"[BENCH] setup {args.users} user + {len(state.quizzes)} quiz: {time.perf_counter() - setup_start:.1f}s")
+    print(f"[BENCH] fake LLM: latency={args.llm_latency}s token/s={args.token_rate or 'tak terbatas'} "
+          f"malformed={args.malformed_rate:.0%} fail={args.fail_rate:.0%}  mix={mix}")
+
+    results = {}
+    for concurrency in args.concurrency:
+        report = _load_level(app, state, mix, concurrency, args.duration, args.seed)
+        results[str(concurrency)] = report
+        print(f"\nconcurrency={concurrency}")
+        print(f"{'endpoint':>12} {'n':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'429':>5} {'error':>6}")
+        for name, r in report.items():
+            print(f"{name:>12} {r['requests']:>7} {r['rps']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                  f"{r['p99_ms']:>9.1f} {r['429']:>5} {r['errors']:>6}")
+
+    parse_paths = {path: metrics.quiz_parse.value(path) for path in ("fast", "stream", "salvage", "fallback", "error")}
+    print(f"\nparse quiz: {parse_paths}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args) | {"func": None}, "levels": results}, f, indent=2, default=str)
+        print(f"[BENCH] hasil disimpan: {args.out}")
+    if args.compare:
+        return _load_compare(results, args.compare, args.tolerance)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EduMate micro benchmark")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("db", help="connection pool vs koneksi per query")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--threads", type=int, default=8)
+    p.set_defaults(func=bench_db)
+
+    p = sub.add_parser("plans", help="pastikan query panas memakai index")
+    p.set_defaults(func=bench_plans)
+
+    p = sub.add_parser("startup", help="waktu import app.py")
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--api-key", default="", help="pakai API key asli supaya list_models() ikut terukur")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("parse", help="fuzz + benchmark parser soal")
+    p.add_argument("--cases", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("writes", help="tulis quiz: commit terpisah vs satu transaksi")
+    p.add_argument("--quizzes", type=int, default=200)
+    p.set_defaults(func=bench_writes)
+
+    p = sub.add_parser("login", help="login/detik per worker untuk tiap setelan cost hash")
+    p.add_argument("--seconds", type=float, default=2)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.set_defaults(func=bench_login)
+
+    p = sub.add_parser("search", help="cari chat: LIKE vs FTS5")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--queries", type=int, default=300)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("load", help="load test campuran endpoint dengan fake LLM, concurrency bertahap")
+    p.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 4, 16, 32])
+    p.add_argument("--duration", type=float, default=10, help="detik per tingkat concurrency")
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--mix", default="", help='ubah bobot, mis. "chat=50,register=0"')
+    p.add_argument("--llm-latency", type=float, default=0.2, help="detik sebelum token pertama")
+    p.add_argument("--token-rate", type=float, default=200, help="token/detik fake LLM (0 = tanpa jeda)")
+    p.add_argument("--malformed-rate", type=float, default=0.1, help="porsi output soal dengan JSON rusak")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="porsi panggilan LLM yang error")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="simpan hasil (JSON) untuk dibandingkan nanti")
+    p.add_argument("--compare", help="hasil --out sebelumnya; exit 1 kalau ada regresi")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("static", help="file frontend: send_from_directory vs index di memori")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--threads", type=int, default=4)
+    p.set_defaults(func=bench_static)
+
+    args = parser.parse_args(argv)
+    print(f"[BENCH] DB sementara: {database.DB_PATH}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
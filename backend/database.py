@@ -1,15 +1,396 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent / "edumate.db"
+from utils.log import get_logger
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+try:
+    from flask import g, has_app_context
+except Exception:
+    g = None
+    has_app_context = lambda: False
+
+log = get_logger(__name__)
+
+DB_PATH = Path(os.getenv("EDUMATE_DB", Path(__file__).parent / "edumate.db"))
+
+# Pragma per koneksi. journal_mode=WAL bikin reader tidak memblok writer,
+# busy_timeout bikin writer menunggu lock alih-alih langsung "database is locked".
+POOL_SIZE = int(os.getenv("EDUMATE_DB_POOL_SIZE", 8))
+BUSY_TIMEOUT_MS = int(os.getenv("EDUMATE_DB_BUSY_TIMEOUT_MS", 5000))
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": BUSY_TIMEOUT_MS,
+    "temp_store": "MEMORY",
+    "mmap_size": 64 * 1024 * 1024,
+    "cache_size": -16000,  # negatif = KiB, jadi ~16 MB per koneksi
+}
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3.Connection + penghitung kedalaman transaction() (untuk nesting)."""
+    tx_depth = 0
+
+
+def connect(path=None):
+    """Buka koneksi baru dengan pragma yang sudah di-tuning."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,  # koneksi dipindah antar thread lewat pool
+        factory=Connection,
+    )
     conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool koneksi SQLite sederhana (per proses).
+    - acquire() ambil koneksi idle atau buka baru
+    - release() kembalikan ke pool (rollback dulu kalau masih ada transaksi)
+    - aman untuk gunicorn fork: koneksi milik proses induk tidak dipakai ulang
+    """
+
+    def __init__(self, path=None, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # koneksi warisan proses induk jangan ditutup/dipakai di sini
+            self._idle = []
+            self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            self._check_fork()
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.path)
+
+    def release(self, conn):
+        if conn is None:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = ConnectionPool()
+_local = threading.local()
+
+
+def get_db():
+    """
+    Koneksi yang dipakai ulang:
+    - di dalam request Flask: satu koneksi per request (disimpan di g,
+      dikembalikan ke pool saat teardown)
+    - di luar request (CLI, worker thread): satu koneksi per thread
+    Pemanggil TIDAK perlu menutup koneksinya.
+    """
+    if has_app_context():
+        if "db" not in g:
+            g.db = _pool.acquire()
+        return g.db
+
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "pid", None) != os.getpid():
+        conn = _local.conn = _pool.acquire()
+        _local.pid = os.getpid()
     return conn
 
+
+@contextmanager
+def transaction(conn=None):
+    """
+    Satu transaksi tulis (BEGIN IMMEDIATE ... COMMIT), bisa di-nest:
+    transaction() di dalam transaction() ikut transaksi luar, commit hanya sekali
+    di paling luar. Exception di mana pun -> rollback semuanya.
+    BEGIN IMMEDIATE ambil write lock di awal, jadi tidak ada upgrade lock di tengah
+    transaksi yang bisa gagal "database is locked" tanpa menunggu busy_timeout.
+    """
+    conn = conn or get_db()
+    if conn.tx_depth:
+        conn.tx_depth += 1
+        try:
+            yield conn
+        finally:
+            conn.tx_depth -= 1
+        return
+
+    if conn.in_transaction:
+        conn.commit()  # sisa transaksi implisit dari kode lama
+    conn.execute("BEGIN IMMEDIATE")
+    conn.tx_depth = 1
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.tx_depth = 0
+
+
+def close_db(exc=None):
+    """Teardown hook: kembalikan koneksi request ke pool."""
+    conn = g.pop("db", None) if g is not None else None
+    _pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
+# ======================================================
+# Migrasi skema (berurutan, idempotent)
+# ======================================================
+# Agregat leaderboard: satu baris per (periode, kategori, user).
+# period: 'all', 'd:YYYY-MM-DD' (harian, UTC) atau 'w:YYYY-Www' (mingguan, %W)
+# category: '' = semua kategori, selain itu nama kategori (lowercase)
+LEADERBOARD_BACKFILL_SQL = """
+INSERT INTO user_totals (period, category, username, total_score, attempts)
+SELECT period, category, username, SUM(score), COUNT(*) FROM (
+    SELECT 'all' AS period, '' AS category, username, score FROM scores
+    UNION ALL
+    SELECT 'd:' || date(created_at), '', username, score FROM scores
+    UNION ALL
+    SELECT 'w:' || strftime('%Y-W%W', created_at), '', username, score FROM scores
+    UNION ALL
+    SELECT 'all', lower(trim(q.category)), s.username, s.score
+    FROM scores s JOIN quizzes q ON q.id = s.quiz_id WHERE trim(COALESCE(q.category, '')) <> ''
+    UNION ALL
+    SELECT 'd:' || date(s.created_at), lower(trim(q.category)), s.username, s.score
+    FROM scores s JOIN quizzes q ON q.id = s.quiz_id WHERE trim(COALESCE(q.category, '')) <> ''
+    UNION ALL
+    SELECT 'w:' || strftime('%Y-W%W', s.created_at), lower(trim(q.category)), s.username, s.score
+    FROM scores s JOIN quizzes q ON q.id = s.quiz_id WHERE trim(COALESCE(q.category, '')) <> ''
+)
+WHERE username IS NOT NULL
+GROUP BY period, category, username
+"""
+
+# unicode61 + hapus diakritik: "é" cocok dengan "e"; cukup untuk teks bahasa Indonesia
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+# (version, nama, [statement SQL]). Tambah migrasi baru di akhir list,
+# jangan ubah migrasi yang sudah pernah dirilis.
+MIGRATIONS = [
+    (1, "index chats(username, id)", [
+        "CREATE INDEX IF NOT EXISTS idx_chats_username_id ON chats(username, id)",
+    ]),
+    (2, "index quiz_questions(quiz_id, q_index)", [
+        "CREATE INDEX IF NOT EXISTS idx_quiz_questions_quiz_qindex ON quiz_questions(quiz_id, q_index)",
+    ]),
+    (3, "covering index scores(username, score)", [
+        "CREATE INDEX IF NOT EXISTS idx_scores_username_score ON scores(username, score)",
+    ]),
+    (4, "leaderboard agregat user_totals + backfill", [
+        """
+        CREATE TABLE IF NOT EXISTS user_totals (
+            period TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            username TEXT NOT NULL,
+            total_score INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, category, username)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_user_totals_board ON user_totals(period, category, total_score DESC)",
+        "DELETE FROM user_totals",
+        LEADERBOARD_BACKFILL_SQL,
+    ]),
+    (5, "tabel ai_cache (tier persisten cache respons AI)", [
+        """
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_at)",
+    ]),
+    (6, "bank soal per kategori/kesulitan", [
+        """
+        CREATE TABLE IF NOT EXISTS question_bank (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            difficulty TEXT NOT NULL DEFAULT '',
+            q_hash TEXT NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL, -- JSON stringified list
+            answer TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (category, difficulty, q_hash)
+        )""",
+    ]),
+    (7, "session login + app_settings (secret penandatangan token)", [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)",
+        """
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )""",
+    ]),
+    (8, "token bucket rate limit (dibagi antar worker)", [
+        """
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""",
+    ]),
+    (9, "ringkasan percakapan per user (konteks chat)", [
+        """
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            username TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            upto_id INTEGER NOT NULL, -- chats.id terakhir yang sudah masuk ringkasan
+            updated_at REAL NOT NULL
+        )""",
+    ]),
+    (10, "full-text search FTS5 chats.message + quiz_questions.question", [
+        # external content: teks tidak disimpan dua kali, index disinkronkan trigger.
+        # username ikut di-index supaya filter per user jadi irisan posting list di MATCH,
+        # bukan menyaring hit semua user satu per satu
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+            message, username, content='chats', content_rowid='id', tokenize="{FTS_TOKENIZE}"
+        )""",
+        """
+        CREATE TRIGGER IF NOT EXISTS chats_fts_ai AFTER INSERT ON chats BEGIN
+            INSERT INTO chats_fts (rowid, message, username) VALUES (new.id, new.message, new.username);
+        END""",
+        """
+        CREATE TRIGGER IF NOT EXISTS chats_fts_ad AFTER DELETE ON chats BEGIN
+            INSERT INTO chats_fts (chats_fts, rowid, message, username) VALUES ('delete', old.id, old.message, old.username);
+        END""",
+        """
+        CREATE TRIGGER IF NOT EXISTS chats_fts_au AFTER UPDATE OF message, username ON chats BEGIN
+            INSERT INTO chats_fts (chats_fts, rowid, message, username) VALUES ('delete', old.id, old.message, old.username);
+            INSERT INTO chats_fts (rowid, message, username) VALUES (new.id, new.message, new.username);
+        END""",
+        "INSERT INTO chats_fts (chats_fts) VALUES ('rebuild')",
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS quiz_questions_fts USING fts5(
+            question, content='quiz_questions', content_rowid='id', tokenize="{FTS_TOKENIZE}"
+        )""",
+        """
+        CREATE TRIGGER IF NOT EXISTS quiz_questions_fts_ai AFTER INSERT ON quiz_questions BEGIN
+            INSERT INTO quiz_questions_fts (rowid, question) VALUES (new.id, new.question);
+        END""",
+        """
+        CREATE TRIGGER IF NOT EXISTS quiz_questions_fts_ad AFTER DELETE ON quiz_questions BEGIN
+            INSERT INTO quiz_questions_fts (quiz_questions_fts, rowid, question) VALUES ('delete', old.id, old.question);
+        END""",
+        """
+        CREATE TRIGGER IF NOT EXISTS quiz_questions_fts_au AFTER UPDATE OF question ON quiz_questions BEGIN
+            INSERT INTO quiz_questions_fts (quiz_questions_fts, rowid, question) VALUES ('delete', old.id, old.question);
+            INSERT INTO quiz_questions_fts (rowid, question) VALUES (new.id, new.question);
+        END""",
+        "INSERT INTO quiz_questions_fts (quiz_questions_fts) VALUES ('rebuild')",
+    ]),
+    (11, "antrian job background (generate quiz)", [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            dedupe_key TEXT,
+            username TEXT,
+            params TEXT NOT NULL,         -- JSON
+            status TEXT NOT NULL,         -- queued | running | done | failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,                  -- JSON
+            error TEXT,
+            worker TEXT,
+            lease_until REAL,             -- job running yang lewat lease dianggap worker-nya mati
+            run_after REAL,               -- retry: jangan diambil sebelum waktu ini (backoff)
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(kind, status, created_at)",
+        # satu job in-flight per permintaan identik; yang datang belakangan ikut job yang sama
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_jobs_inflight ON jobs(kind, dedupe_key) "
+        "WHERE status IN ('queued', 'running') AND dedupe_key IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at) WHERE finished_at IS NOT NULL",
+    ]),
+]
+
+
+def schema_version(conn=None):
+    conn = conn or get_db()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    row = conn.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    return row["v"] or 0
+
+
+def migrate(conn=None):
+    """Jalankan migrasi yang belum diterapkan. Aman dipanggil dari banyak worker."""
+    conn = conn or get_db()
+    schema_version(conn)
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        # BEGIN IMMEDIATE: worker lain menunggu, lalu melihat versi terbaru
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(conn):
+                conn.rollback()
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        log.info("migrasi diterapkan", extra={"data": {"version": version, "name": name}})
+    return applied
+
+
 def init_db():
     conn = get_db()
+    if conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+        # DB baru: ruang bekas baris yang dihapus (retensi) bisa dilepas bertahap,
+        # tanpa VACUUM penuh. DB lama perlu `manage.py compact --full` sekali.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")  # file kosong (hanya header WAL): mode baru berlaku, instan
     c = conn.cursor()
     # users
     c.execute("""
@@ -61,6 +442,5 @@ def init_db():
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP
     )""")
     conn.commit()
-    conn.close()
-
+    migrate(conn)
 
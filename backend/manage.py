@@ -0,0 +1,121 @@
+"""
+manage.py - perintah maintenance EduMate
+
+Pemakaian:
+    python manage.py init-db                # buat tabel + jalankan migrasi
+    python manage.py backfill-leaderboard   # bangun ulang user_totals dari tabel scores
+    python manage.py purge-ai-cache         # hapus entry ai_cache yang sudah kedaluwarsa
+    python manage.py purge-sessions         # hapus session login yang sudah kedaluwarsa
+    python manage.py retention-report       # ukuran tabel, baris yang lewat batas retensi, ukuran DB/arsip
+    python manage.py retention-run [--table chats] [--days 90] [--target db|jsonl] [--dry-run]
+    python manage.py compact [--pages 5000] [--full]   # incremental vacuum + checkpoint WAL
+    python manage.py jobs-worker [--workers 4]          # proses worker terpisah untuk job generate quiz
+"""
+import argparse
+import json
+
+from database import init_db, schema_version, DB_PATH
+
+
+def cmd_init_db(args):
+    init_db()
+    print(f"[DB] skema versi {schema_version()} di {DB_PATH}")
+
+
+def cmd_backfill_leaderboard(args):
+    from models import rebuild_leaderboard
+    init_db()
+    count = rebuild_leaderboard()
+    print(f"[LEADERBOARD] {count} baris agregat dibangun ulang")
+
+
+def cmd_purge_ai_cache(args):
+    from utils.cache import SQLiteCache
+    init_db()
+    print(f"[CACHE] {SQLiteCache().purge_expired()} entry kedaluwarsa dihapus")
+
+
+def cmd_purge_sessions(args):
+    from models import session_purge_expired
+    init_db()
+    print(f"[SESSION] {session_purge_expired()} session kedaluwarsa dihapus")
+
+
+def cmd_retention_report(args):
+    from utils.retention import report
+    init_db()
+    out = report()
+    if args.json:
+        print(json.dumps(out, indent=2, default=str))
+        return
+    for name, t in out["tables"].items():
+        print(f"[RETENSI] {name:<13} {t['rows']:>9} baris  {t['eligible']:>8} lewat batas  "
+              f"tertua={t['oldest']}  ({t['policy']})")
+    db = out["db"]
+    print(f"[DB] {db['bytes'] / 1e6:.1f} MB, {db['free_bytes'] / 1e6:.1f} MB kosong, auto_vacuum={db['auto_vacuum']}")
+    for kind, a in out["archive"].items():
+        print(f"[ARSIP] {kind}: {a['path']} {a['bytes'] / 1e6:.1f} MB")
+    print(f"[RETENSI] run terakhir: {out['last_run']}")
+
+
+def cmd_retention_run(args):
+    from utils.retention import run
+    init_db()
+    result = run(tables=args.table, days=args.days, target=args.target, batch=args.batch, dry_run=args.dry_run)
+    verb = "akan diproses" if args.dry_run else "diarsip/dihapus"
+    for table, rows in result.items():
+        print(f"[RETENSI] {table}: {rows} baris {verb}")
+
+
+def cmd_compact(args):
+    from utils.retention import compact
+    init_db()
+    out = compact(max_pages=args.pages, full=args.full)
+    before, after = out["before"], out["after"]
+    print(f"[DB] {before['bytes'] / 1e6:.1f} MB -> {after['bytes'] / 1e6:.1f} MB "
+          f"(kosong {after['free_bytes'] / 1e6:.1f} MB, auto_vacuum={after['auto_vacuum']})")
+
+
+def cmd_jobs_worker(args):
+    init_db()
+    from routes.quiz import quiz_jobs  # mendaftarkan handler job "quiz"
+    if args.workers is not None:
+        quiz_jobs.workers = args.workers
+    print(f"[JOBS] worker quiz jalan ({max(quiz_jobs.workers, 1)} thread), Ctrl+C untuk berhenti")
+    try:
+        quiz_jobs.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EduMate maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init-db", help="buat tabel + migrasi").set_defaults(func=cmd_init_db)
+    sub.add_parser("backfill-leaderboard", help="bangun ulang agregat leaderboard").set_defaults(func=cmd_backfill_leaderboard)
+    sub.add_parser("purge-ai-cache", help="hapus cache AI kedaluwarsa").set_defaults(func=cmd_purge_ai_cache)
+    sub.add_parser("purge-sessions", help="hapus session kedaluwarsa").set_defaults(func=cmd_purge_sessions)
+    p = sub.add_parser("retention-report", help="laporan retensi & ukuran DB")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_retention_report)
+    from utils.retention import POLICIES, RETENTION_BATCH, RETENTION_TARGET
+    p = sub.add_parser("retention-run", help="arsipkan/hapus baris lama sesuai kebijakan")
+    p.add_argument("--table", action="append", choices=list(POLICIES), help="bisa diulang; default semua tabel")
+    p.add_argument("--days", type=float, help="ganti batas hari untuk tabel yang diarsipkan")
+    p.add_argument("--target", choices=("db", "jsonl"), default=RETENTION_TARGET)
+    p.add_argument("--batch", type=int, default=RETENTION_BATCH)
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_retention_run)
+    p = sub.add_parser("compact", help="lepas halaman kosong (incremental vacuum)")
+    p.add_argument("--pages", type=int, help="maksimal halaman per run")
+    p.add_argument("--full", action="store_true", help="sekali saja: aktifkan auto_vacuum incremental + VACUUM penuh")
+    p.set_defaults(func=cmd_compact)
+    p = sub.add_parser("jobs-worker", help="jalankan worker job generate quiz")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(func=cmd_jobs_worker)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
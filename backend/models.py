@@ -1,78 +1,225 @@
+import hashlib
 import json
-from database import get_db
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from database import get_db, transaction, LEADERBOARD_BACKFILL_SQL
+from utils.metrics import timed_module
+from utils.search import MARK_START, MARK_END, fts_any_query, fts_query
+
+# Koneksi dari get_db() dipakai ulang (pool / per request), jadi tidak di-close di sini.
+# Tulis pakai `with transaction() as conn:` (BEGIN IMMEDIATE, commit/rollback otomatis).
+# Beberapa tulis yang saling terkait digabung lewat unit_of_work() -> satu commit/fsync.
+
+def unit_of_work():
+    """
+    Kelompokkan beberapa fungsi tulis di modul ini jadi satu transaksi:
+
+        with unit_of_work():
+            save_chat(...); save_chat(...)
+
+    Transaksi di dalamnya ikut transaksi luar (tidak commit sendiri).
+    """
+    return transaction()
 
 # Users
 def create_user(username, hashed_password):
-    conn = get_db()
-    cur = conn.cursor()
+    """Return False kalau username sudah dipakai (UNIQUE), tanpa SELECT terpisah."""
     try:
-        cur.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
         return True
-    except Exception:
+    except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
+
+def update_user_password(username, hashed_password):
+    with transaction() as conn:
+        conn.execute("UPDATE users SET password=? WHERE username=?", (hashed_password, username))
+
+# Query panas didefinisikan sekali di sini; `benchmark.py plans` memeriksa query plan
+# konstanta yang sama (bukan salinan) supaya perubahan SQL ikut tercek.
+USER_BY_USERNAME_SQL = "SELECT * FROM users WHERE username=?"
 
 def get_user_by_username(username):
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username=?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    cur = conn.execute(USER_BY_USERNAME_SQL, (username,))
+    return cur.fetchone()
+
+def existing_usernames(usernames):
+    """Subset `usernames` yang terdaftar di tabel users (satu query, bukan per user)."""
+    names = sorted({u for u in usernames if isinstance(u, str)})
+    if not names:
+        return set()
+    rows = get_db().execute(
+        "SELECT username FROM users WHERE username IN (SELECT value FROM json_each(?))", (json.dumps(names),))
+    return {r["username"] for r in rows}
+
+# Sessions
+def session_create(session_id, username, expires_at):
+    with transaction() as conn:
+        conn.execute("INSERT INTO sessions (id, username, created_at, expires_at) VALUES (?,?,?,?)",
+                     (session_id, username, time.time(), expires_at))
+
+def session_get(session_id):
+    """Return row (username, expires_at) session yang belum kedaluwarsa, atau None."""
+    conn = get_db()
+    return conn.execute("SELECT username, expires_at FROM sessions WHERE id=? AND expires_at>?",
+                        (session_id, time.time())).fetchone()
+
+def session_delete(session_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM sessions WHERE id=?", (session_id,))
+
+def session_purge_expired():
+    with transaction() as conn:
+        cur = conn.execute("DELETE FROM sessions WHERE expires_at<=?", (time.time(),))
+    return cur.rowcount
+
+def get_setting(key, default_factory):
+    """Nilai app_settings; kalau belum ada, isi dengan default_factory() (sekali, aman antar worker)."""
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO app_settings (key, value) VALUES (?, ?)", (key, default_factory()))
+        return conn.execute("SELECT value FROM app_settings WHERE key=?", (key,)).fetchone()["value"]
+
+# Rate limit
+def rate_bucket_take(key, cost, rate, burst, now=None):
+    """
+    Token bucket di tabel rate_buckets (satu transaksi, aman antar worker).
+    Return 0 kalau token cukup (dan dipotong), selain itu detik sampai token cukup.
+    """
+    now = now or time.time()
+    with transaction() as conn:
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key=?", (key,)).fetchone()
+        tokens = burst if row is None else min(burst, row["tokens"] + (now - row["updated_at"]) * rate)
+        wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+        if not wait:
+            tokens -= cost
+        conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?,?,?)",
+                     (key, tokens, now))
+    return wait
 
 # Chats
 def save_chat(username, role, message):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO chats (username, role, message) VALUES (?, ?, ?)", (username, role, message))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.execute("INSERT INTO chats (username, role, message) VALUES (?, ?, ?)", (username, role, message))
+    return cur.lastrowid
 
-def get_chats_for_user(username, limit=200):
+def save_chat_turn(username, question, answer):
+    """Pesan user + balasan bot dalam satu transaksi. Return (user_id, bot_id)."""
+    with unit_of_work():
+        user_id = save_chat(username, "user", question)
+        bot_id = save_chat(username, "bot", answer)
+    return user_id, bot_id
+
+LAST_CHAT_ID_SQL = "SELECT MAX(id) AS id FROM chats WHERE username=?"
+
+def last_chat_id(username):
+    row = get_db().execute(LAST_CHAT_ID_SQL, (username,)).fetchone()
+    return row["id"] or 0
+
+def get_chat_summary(username):
+    """Return row (summary, upto_id) atau None."""
+    return get_db().execute("SELECT summary, upto_id FROM chat_summaries WHERE username=?", (username,)).fetchone()
+
+def save_chat_summary(username, summary, upto_id):
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO chat_summaries (username, summary, upto_id, updated_at) VALUES (?,?,?,?)",
+                     (username, summary, upto_id, time.time()))
+
+CHATS_COLUMNS = "SELECT id, role, message, created_at FROM chats"
+CHATS_AFTER_SQL = CHATS_COLUMNS + " WHERE username=? AND id>? ORDER BY id ASC LIMIT ?"
+CHATS_BEFORE_SQL = CHATS_COLUMNS + " WHERE username=? AND id<? ORDER BY id DESC LIMIT ?"
+CHATS_LATEST_SQL = CHATS_COLUMNS + " WHERE username=? ORDER BY id DESC LIMIT ?"
+
+def get_chats_for_user(username, limit=200, before_id=None, after_id=None):
+    """
+    Keyset pagination di atas index chats(username, id). Hasil selalu urut id ASC.
+    - tanpa cursor: `limit` pesan TERBARU
+    - before_id: pesan lebih lama dari id tsb (scroll ke atas)
+    - after_id: pesan lebih baru dari id tsb (ambil yang belum dimiliki client)
+    """
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT role, message, created_at FROM chats WHERE username=? ORDER BY id ASC LIMIT ?", (username, limit))
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    if after_id is not None:
+        cur = conn.execute(CHATS_AFTER_SQL, (username, after_id, limit))
+        return [dict(r) for r in cur.fetchall()]
+    if before_id is not None:
+        cur = conn.execute(CHATS_BEFORE_SQL, (username, before_id, limit))
+    else:
+        cur = conn.execute(CHATS_LATEST_SQL, (username, limit))
+    return [dict(r) for r in reversed(cur.fetchall())]
+
+# {role}: "" atau ROLE_FILTER
+SEARCH_CHATS_SQL = (
+    "SELECT c.id, c.role, c.created_at, snippet(chats_fts, 0, ?, ?, '…', 16) AS snippet "
+    "FROM chats_fts JOIN chats c ON c.id = chats_fts.rowid "
+    "WHERE chats_fts MATCH ? AND c.username=?{role} "
+    "ORDER BY bm25(chats_fts, 1.0, 0.0) LIMIT ? OFFSET ?"  # relevansi dari isi pesan saja
+)
+ROLE_FILTER = " AND c.role=?"
+
+def search_chats(username, text, limit=20, offset=0, role=None):
+    """
+    Cari di histori chat user lewat chats_fts (bm25). Return (rows, has_more);
+    snippet berisi penanda MARK_START/MARK_END di sekitar kata yang cocok.
+    """
+    query, user_query = fts_query(text), fts_query(username, prefix=False)
+    if query is None:
+        return [], False
+    # filter user ikut di MATCH; c.username=? tetap dicek karena token username tidak harus persis sama
+    query = f"{{message}}: ({query})" + (f" AND {{username}}: ({user_query})" if user_query else "")
+    params = [MARK_START, MARK_END, query, username]
+    if role:
+        params.append(role)
+    sql = SEARCH_CHATS_SQL.format(role=ROLE_FILTER if role else "")
+    rows = get_db().execute(sql, params + [limit + 1, offset]).fetchall()
+    return [dict(r) for r in rows[:limit]], len(rows) > limit
 
 # Quiz flow
 def create_quiz_record(username, category, total):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO quizzes (username, category, total) VALUES (?, ?, ?)", (username, category, total))
-    qid = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return qid
+    with transaction() as conn:
+        cur = conn.execute("INSERT INTO quizzes (username, category, total) VALUES (?, ?, ?)", (username, category, total))
+    return cur.lastrowid
+
+def _question_rows(quiz_id, questions):
+    return [
+        (quiz_id, idx,  # ✅ FIX: pakai idx mulai dari 0, bukan idx+1
+         item.get("q") or item.get("question"),
+         json.dumps(item.get("options") or item.get("choices") or []),
+         item.get("answer"))
+        for idx, item in enumerate(questions)
+    ]
 
 def save_quiz_questions(quiz_id, questions):
     """
     questions: list of dicts with keys q, options (list), answer
     """
-    conn = get_db()
-    cur = conn.cursor()
-    for idx, item in enumerate(questions):
-        cur.execute(
+    with transaction() as conn:
+        conn.executemany(
             "INSERT INTO quiz_questions (quiz_id, q_index, question, options, answer) VALUES (?,?,?,?,?)",
-            (quiz_id, idx,  # ✅ FIX: pakai idx mulai dari 0, bukan idx+1
-             item.get("q") or item.get("question"),
-             json.dumps(item.get("options") or item.get("choices") or []),
-             item.get("answer"))
+            _question_rows(quiz_id, questions)
         )
-    conn.commit()
-    conn.close()
+
+def create_quiz(username, category, total, questions):
+    """Quiz + semua soalnya dalam satu transaksi (atomik, satu commit). Return quiz_id."""
+    with unit_of_work():
+        quiz_id = create_quiz_record(username, category, total)
+        save_quiz_questions(quiz_id, questions)
+    return quiz_id
+
+def get_quiz_owner(quiz_id):
+    row = get_db().execute("SELECT username FROM quizzes WHERE id=?", (quiz_id,)).fetchone()
+    return row["username"] if row else None
+
+QUIZ_QUESTIONS_SQL = "SELECT q_index, question, options, answer FROM quiz_questions WHERE quiz_id=? ORDER BY q_index ASC"
 
 def get_quiz_questions(quiz_id):
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT q_index, question, options, answer FROM quiz_questions WHERE quiz_id=? ORDER BY q_index ASC", (quiz_id,))
-    rows = cur.fetchall()
-    conn.close()
+    cur = conn.execute(QUIZ_QUESTIONS_SQL, (quiz_id,))
     out = []
-    for r in rows:
+    for r in cur.fetchall():
         out.append({
             "index": r["q_index"],
             "question": r["question"],
@@ -81,20 +228,252 @@ def get_quiz_questions(quiz_id):
         })
     return out
 
-# Scores
-def save_score(username, quiz_id, correct, wrong, total, score):
+# {category}: "" atau CATEGORY_FILTER
+SEARCH_QUESTIONS_SQL = (
+    "SELECT qq.quiz_id, qq.q_index, q.category, q.created_at, "
+    "highlight(quiz_questions_fts, 0, ?, ?) AS question, qq.options "
+    "FROM quiz_questions_fts JOIN quiz_questions qq ON qq.id = quiz_questions_fts.rowid "
+    "JOIN quizzes q ON q.id = qq.quiz_id "
+    "WHERE quiz_questions_fts MATCH ?{category} "
+    "ORDER BY quiz_questions_fts.rank LIMIT ? OFFSET ?"
+)
+SIMILAR_QUESTIONS_SQL = (
+    "SELECT qq.quiz_id, qq.q_index, qq.question "
+    "FROM quiz_questions_fts JOIN quiz_questions qq ON qq.id = quiz_questions_fts.rowid "
+    "JOIN quizzes q ON q.id = qq.quiz_id "
+    "WHERE quiz_questions_fts MATCH ?{category} "
+    "ORDER BY quiz_questions_fts.rank LIMIT ?"
+)
+CATEGORY_FILTER = " AND lower(trim(q.category))=?"
+
+def search_questions(text, category=None, limit=20, offset=0):
+    """Cari soal yang pernah dibuat (quiz_questions_fts, bm25). Return (rows, has_more)."""
+    query = fts_query(text)
+    if query is None:
+        return [], False
+    params = [MARK_START, MARK_END, query]
+    if category:
+        params.append(_norm_category(category))
+    sql = SEARCH_QUESTIONS_SQL.format(category=CATEGORY_FILTER if category else "")
+    rows = get_db().execute(sql, params + [limit + 1, offset]).fetchall()
+    out = [dict(r, options=json.loads(r["options"] or "[]")) for r in rows[:limit]]
+    return out, len(rows) > limit
+
+def similar_questions(text, category=None, limit=5):
+    """Kandidat soal mirip (OR atas kata bermakna, urut bm25) untuk deteksi duplikat."""
+    query = fts_any_query(text)
+    if query is None:
+        return []
+    params = [query]
+    if category:
+        params.append(_norm_category(category))
+    sql = SIMILAR_QUESTIONS_SQL.format(category=CATEGORY_FILTER if category else "")
+    return [dict(r) for r in get_db().execute(sql, params + [limit]).fetchall()]
+
+# Question bank
+def _norm_category(category):
+    return (category or "").strip().lower()
+
+def _question_hash(text):
+    return hashlib.sha1(re.sub(r"\s+", " ", (text or "").strip().lower()).encode()).hexdigest()
+
+def bank_add_questions(category, difficulty, questions):
+    """Simpan soal ke bank (dedupe per kategori/kesulitan). Return jumlah soal baru."""
+    category = _norm_category(category)
+    rows = [
+        (category, difficulty or "", _question_hash(item.get("q")), item.get("q"),
+         json.dumps(item.get("options") or []), item.get("answer"))
+        for item in questions if item.get("q")
+    ]
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO question_bank (category, difficulty, q_hash, question, options, answer) "
+            "VALUES (?,?,?,?,?,?)", rows)
+        return conn.total_changes - before
+
+def bank_count(category, difficulty=""):
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO scores (username, quiz_id, correct, wrong, total, score) VALUES (?,?,?,?,?,?)",
-                (username, quiz_id, correct, wrong, total, score))
-    conn.commit()
-    conn.close()
+    row = conn.execute("SELECT COUNT(*) AS n FROM question_bank WHERE category=? AND difficulty=?",
+                       (_norm_category(category), difficulty or "")).fetchone()
+    return row["n"]
 
-def get_leaderboard(limit=10):
+def bank_sample(category, difficulty, total):
+    """Ambil `total` soal acak dari bank, atau None kalau stok kurang."""
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT username, SUM(score) as total_score FROM scores GROUP BY username ORDER BY total_score DESC LIMIT ?", (limit,))
+    cur = conn.execute(
+        "SELECT question, options, answer FROM question_bank WHERE category=? AND difficulty=? "
+        "ORDER BY random() LIMIT ?", (_norm_category(category), difficulty or "", total))
     rows = cur.fetchall()
-    conn.close()
-    return [{"username": r["username"], "total_score": r["total_score"]} for r in rows]
+    if len(rows) < total:
+        return None
+    return [{"q": r["question"], "options": json.loads(r["options"]), "answer": r["answer"]} for r in rows]
+
+# Scores
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", 5))
+LEADERBOARD_WINDOWS = ("all", "daily", "weekly")
+
+_leaderboard_cache = {}  # (period, category, limit) -> (expires_at, rows)
+_leaderboard_lock = threading.Lock()
+_leaderboard_gen = 0  # naik tiap invalidasi, cegah hasil query lama masuk cache
+
+def _period_key(window, now=None):
+    # harus sama dengan format di LEADERBOARD_BACKFILL_SQL (UTC, minggu %W)
+    now = now or datetime.now(timezone.utc)
+    if window == "daily":
+        return "d:" + now.strftime("%Y-%m-%d")
+    if window == "weekly":
+        return "w:" + now.strftime("%Y-W%W")
+    return "all"
+
+def invalidate_leaderboard_cache():
+    global _leaderboard_gen
+    with _leaderboard_lock:
+        _leaderboard_gen += 1
+        _leaderboard_cache.clear()
+
+def save_score(username, quiz_id, correct, wrong, total, score):
+    save_scores(quiz_id, [(username, correct, wrong, total, score)])
+
+def save_scores(quiz_id, rows):
+    """
+    Simpan banyak skor untuk satu quiz dalam satu transaksi (submit massal satu kelas).
+    rows: [(username, correct, wrong, total, score)]
+    """
+    if not rows:
+        return
+    with transaction() as conn:
+        conn.executemany("INSERT INTO scores (username, quiz_id, correct, wrong, total, score) VALUES (?,?,?,?,?,?)",
+                         [(username, quiz_id, correct, wrong, total, score)
+                          for username, correct, wrong, total, score in rows])
+        # update agregat leaderboard di transaksi yang sama
+        row = conn.execute("SELECT category FROM quizzes WHERE id=?", (quiz_id,)).fetchone()
+        category = _norm_category(row["category"] if row else "")
+        now = datetime.now(timezone.utc)
+        periods = [_period_key(w, now) for w in LEADERBOARD_WINDOWS]
+        categories = [""] + ([category] if category else [])
+        conn.executemany(
+            "INSERT INTO user_totals (period, category, username, total_score, attempts) VALUES (?,?,?,?,1) "
+            "ON CONFLICT(period, category, username) DO UPDATE SET "
+            "total_score = total_score + excluded.total_score, attempts = attempts + 1",
+            [(p, c, r[0], r[4]) for r in rows for p in periods for c in categories]
+        )
+    invalidate_leaderboard_cache()
+
+LEADERBOARD_SQL = (
+    "SELECT username, total_score FROM user_totals WHERE period=? AND category=? "
+    "ORDER BY total_score DESC LIMIT ?"
+)
+
+def get_leaderboard(limit=10, window="all", category=None):
+    """
+    Top-N dari tabel agregat user_totals (tidak scan tabel scores).
+    window: 'all' | 'daily' | 'weekly'; category: None = semua kategori.
+    """
+    key = (_period_key(window), _norm_category(category), limit)
+    now = time.monotonic()
+    with _leaderboard_lock:
+        hit = _leaderboard_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        gen = _leaderboard_gen
+
+    conn = get_db()
+    cur = conn.execute(LEADERBOARD_SQL, key)
+    rows = [{"username": r["username"], "total_score": r["total_score"]} for r in cur.fetchall()]
+
+    with _leaderboard_lock:
+        if gen == _leaderboard_gen:
+            _leaderboard_cache[key] = (now + LEADERBOARD_CACHE_TTL, rows)
+    return rows
+
+def rebuild_leaderboard():
+    """Bangun ulang user_totals dari seluruh histori scores (backfill)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM user_totals")
+        conn.execute(LEADERBOARD_BACKFILL_SQL)
+        count = conn.execute("SELECT COUNT(*) AS n FROM user_totals").fetchone()["n"]
+    invalidate_leaderboard_cache()
+    return count
+
+# Jobs (antrian background)
+JOB_DEDUPE_SQL = "SELECT id FROM jobs WHERE kind=? AND dedupe_key=? AND status IN ('queued', 'running')"
+
+def job_enqueue(job_id, kind, params, dedupe_key=None, username=None):
+    """
+    Masukkan job baru, kecuali sudah ada job identik (dedupe_key sama) yang masih
+    queued/running. Return (job_id, created).
+    """
+    with transaction() as conn:
+        if dedupe_key is not None:
+            row = conn.execute(JOB_DEDUPE_SQL, (kind, dedupe_key)).fetchone()
+            if row:
+                return row["id"], False
+        conn.execute(
+            "INSERT INTO jobs (id, kind, dedupe_key, username, params, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, kind, dedupe_key, username, json.dumps(params), time.time()))
+    return job_id, True
+
+JOB_CLAIM_SQL = (
+    "SELECT id, created_at FROM jobs WHERE kind=? AND status='queued' AND (run_after IS NULL OR run_after<=?) "
+    "UNION ALL SELECT id, created_at FROM jobs WHERE kind=? AND status='running' AND lease_until<? "
+    "ORDER BY created_at LIMIT 1"
+)
+
+def job_claim(kind, worker, lease_seconds, max_attempts):
+    """
+    Ambil job tertua yang queued (atau running tapi lease-nya habis) dan tandai running.
+    BEGIN IMMEDIATE: aman walau worker tersebar di beberapa proses. Return row atau None.
+    """
+    now = time.time()
+    with transaction() as conn:
+        # dua range idx_jobs_claim (kind, status, created_at) digabung MERGE: tanpa temp B-tree
+        # dan tanpa melewati job done/failed yang masih disimpan
+        row = conn.execute(JOB_CLAIM_SQL, (kind, now, kind, now)).fetchone()
+        if row is None:
+            return None
+        job = conn.execute(
+            "UPDATE jobs SET status='running', attempts=attempts+1, worker=?, lease_until=?, started_at=? "
+            "WHERE id=? RETURNING *", (worker, now + lease_seconds, now, row["id"])).fetchone()
+        if job["attempts"] > max_attempts:
+            conn.execute("UPDATE jobs SET status='failed', error=?, finished_at=? WHERE id=?",
+                         ("terlalu banyak percobaan (worker berhenti di tengah job)", now, job["id"]))
+            return None
+    return job
+
+def job_finish(job_id, result):
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET status='done', result=?, error=NULL, lease_until=NULL, finished_at=? WHERE id=?",
+                     (json.dumps(result), time.time(), job_id))
+
+def job_fail(job_id, error, retry_after=None):
+    """retry_after (detik): kembali ke antrian setelah jeda; None: gagal permanen."""
+    with transaction() as conn:
+        if retry_after is not None:
+            conn.execute("UPDATE jobs SET status='queued', error=?, lease_until=NULL, run_after=? WHERE id=?",
+                         (error, time.time() + retry_after, job_id))
+        else:
+            conn.execute("UPDATE jobs SET status='failed', error=?, lease_until=NULL, finished_at=? WHERE id=?",
+                         (error, time.time(), job_id))
+
+JOB_GET_SQL = (
+    "SELECT id, kind, username, status, attempts, result, error, created_at, started_at, finished_at "
+    "FROM jobs WHERE id=?"
+)
+
+def job_get(job_id):
+    row = get_db().execute(JOB_GET_SQL, (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def job_counts():
+    """{(kind, status): jumlah} untuk metrik kedalaman antrian."""
+    rows = get_db().execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status").fetchall()
+    return {(r["kind"], r["status"]): r["n"] for r in rows}
 
+# durasi tiap fungsi di atas -> edumate_db_query_seconds{function=...}
+timed_module(globals(), exclude=("unit_of_work", "invalidate_leaderboard_cache"))
@@ -1,9 +1,15 @@
 # routes/auth.py
 from flask import Blueprint, request, jsonify
-from models import create_user, get_user_by_username
-from utils.security import hash_password, verify_password
+from models import create_user, get_user_by_username, update_user_password
+from utils.security import password_pool, needs_rehash, PasswordBusy
+from utils.sessions import session_store
+from utils.log import get_logger
 
 auth_bp = Blueprint("auth", __name__)
+log = get_logger(__name__)
+
+def _busy():
+    return jsonify({"success": False, "msg": "Server sedang sibuk, coba lagi"}), 503, {"Retry-After": "1"}
 
 @auth_bp.route("/register", methods=["POST"])
 def register():
@@ -13,16 +19,20 @@ def register():
     if not username or not password:
         return jsonify({"success": False, "msg": "Username dan password wajib"}), 400
 
-    # check existing
-    existing = get_user_by_username(username)
-    if existing:
-        return jsonify({"success": False, "msg": "Username sudah dipakai"}), 400
+    try:
+        hashed = password_pool.hash(password)
+    except PasswordBusy:
+        return _busy()
 
-    hashed = hash_password(password)
-    ok = create_user(username, hashed)
-    if ok:
-        return jsonify({"success": True, "msg": "Register berhasil"}), 201
-    return jsonify({"success": False, "msg": "Gagal register"}), 500
+    # cek username dipakai cukup lewat UNIQUE constraint (satu query, tanpa race)
+    try:
+        ok = create_user(username, hashed)
+    except Exception as e:
+        log.exception("register gagal")
+        return jsonify({"success": False, "msg": "Gagal register"}), 500
+    if not ok:
+        return jsonify({"success": False, "msg": "Username sudah dipakai"}), 400
+    return jsonify({"success": True, "msg": "Register berhasil"}), 201
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
@@ -34,13 +44,31 @@ def login():
     if not user:
         return jsonify({"success": False, "msg": "User tidak ditemukan"}), 404
 
-    if verify_password(password, user["password"]):
+    try:
+        ok = password_pool.verify(password, user["password"])
+    except PasswordBusy:
+        return _busy()
+
+    # hash lama / parameter lama: ganti dengan hash baru selagi password-nya ada
+    if ok and needs_rehash(user["password"]):
+        try:
+            update_user_password(username, password_pool.hash(password))
+        except Exception as e:
+            log.warning("rehash gagal", extra={"data": {"username": username, "error": str(e)}})  # login tetap berhasil
+
+    if ok:
         return jsonify({
             "success": True,
             "msg": "Login berhasil",
-            "username": username
+            "username": username,
+            "token": session_store.create(username)
         }), 200
     else:
         return jsonify({"success": False, "msg": "Password salah"}), 401
 
-
+@auth_bp.route("/logout", methods=["POST"])
+def logout():
+    header = request.headers.get("Authorization", "")
+    if header.lower().startswith("bearer "):
+        session_store.revoke(header[7:].strip())
+    return jsonify({"success": True, "msg": "Logout berhasil"}), 200
@@ -1,34 +1,149 @@
 # routes/chat.py
-from flask import Blueprint, request, jsonify
-from models import save_chat, get_chats_for_user
-from utils.ai_helper import generate_chat_reply
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from models import save_chat, save_chat_turn, get_chats_for_user, search_chats
+from utils.ai_helper import generate_chat_reply, stream_chat_reply
+from utils.sse import sse_event, SSE_HEADERS
+from utils.sessions import load_session, login_required, current_username
+from utils.rate_limit import ai_limited
+from utils.chat_context import conversation
+from utils.search import SEARCH_MAX_OFFSET, SEARCH_MAX_PAGE, SEARCH_PAGE_SIZE, markup
 
 chat_bp = Blueprint("chat", __name__)
+chat_bp.before_request(load_session)
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE = 200
 
 @chat_bp.route("", methods=["POST"])
+@ai_limited()
 def chat():
     data = request.get_json() or {}
     question = (data.get("message") or data.get("question") or "").strip()
-    username = data.get("username") or "anonymous"
+    username = current_username(data)
 
     if not question:
         return jsonify({"error": "Pertanyaan kosong"}), 400
 
-    save_chat(username, "user", question)
-
     try:
-        answer = generate_chat_reply(question, username=username)
+        context = conversation.build(username)
+        answer = generate_chat_reply(question, username=username, refresh=bool(data.get("refresh")), context=context)
     except Exception as e:
         answer = f"[Error] Gagal mendapat jawaban: {e}"
 
-    save_chat(username, "bot", answer)
+    # pesan user + bot satu transaksi (satu commit)
+    user_id, bot_id = save_chat_turn(username, question, answer)
+    conversation.record(username, [(user_id, "user", question), (bot_id, "bot", answer)])
+
+    # hanya kirim giliran baru + cursor; client ambil sisanya lewat /history?after_id=
+    messages = [
+        {"id": user_id, "role": "user", "message": question},
+        {"id": bot_id, "role": "bot", "message": answer},
+    ]
+    return jsonify({"reply": answer, "messages": messages, "cursor": bot_id}), 200
+
+@chat_bp.route("/stream", methods=["POST"])
+@ai_limited()
+def chat_stream():
+    """
+    Server-sent events: `token` per potongan teks, lalu `done` berisi id pesan.
+    Pasangan pesan user + bot disimpan sekali di akhir (satu transaksi). Kalau
+    client putus di tengah jalan, generasi dihentikan dan potongan yang sudah ada
+    tetap disimpan (atau pesan user saja kalau belum ada token).
+    """
+    data = request.get_json() or {}
+    question = (data.get("message") or data.get("question") or "").strip()
+    username = current_username(data)
+    refresh = bool(data.get("refresh"))
+
+    if not question:
+        return jsonify({"error": "Pertanyaan kosong"}), 400
+
+    context = conversation.build(username)
+
+    def events():
+        parts = []
+        finished = False
+        tokens = stream_chat_reply(question, username=username, refresh=refresh, context=context)
+        try:
+            yield sse_event("start", {})
+            try:
+                for text in tokens:
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+            except Exception as e:
+                err = f"[Error] Gagal mendapat jawaban: {e}"
+                parts.append(err)
+                yield sse_event("error", {"error": err})
+            answer = "".join(parts).strip()
+            user_id, bot_id = save_chat_turn(username, question, answer)
+            conversation.record(username, [(user_id, "user", question), (bot_id, "bot", answer)])
+            finished = True
+            yield sse_event("done", {"id": bot_id, "user_id": user_id, "reply": answer, "cursor": bot_id})
+        finally:
+            # GeneratorExit = client putus: hentikan stream model, simpan yang sudah ada
+            tokens.close()
+            if not finished:
+                if parts:
+                    save_chat_turn(username, question, "".join(parts).strip())
+                else:
+                    save_chat(username, "user", question)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=SSE_HEADERS)
 
-    history = get_chats_for_user(username)
-    return jsonify({"reply": answer, "history": history}), 200
+def _int_arg(name):
+    try:
+        value = request.args.get(name)
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
 
 @chat_bp.route("/history/<username>", methods=["GET"])
+@login_required
 def history(username):
-    history = get_chats_for_user(username)
-    return jsonify({"history": history})
+    if g.username != username:
+        return jsonify({"error": "Tidak boleh membaca histori user lain"}), 403
+    before_id = _int_arg("before_id")
+    after_id = _int_arg("after_id")
+    limit = min(max(_int_arg("limit") or HISTORY_PAGE_SIZE, 1), HISTORY_MAX_PAGE)
+
+    # ambil limit+1 untuk tahu masih ada halaman berikutnya atau tidak
+    rows = get_chats_for_user(username, limit=limit + 1, before_id=before_id, after_id=after_id)
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit] if after_id is not None else rows[1:]
+
+    return jsonify({
+        "history": rows,
+        "has_more": has_more,
+        "before_id": rows[0]["id"] if rows else before_id,   # cursor untuk pesan lebih lama
+        "after_id": rows[-1]["id"] if rows else after_id,    # cursor untuk pesan lebih baru
+    })
+
 
+@chat_bp.route("/search", methods=["GET"])
+@login_required
+def search():
+    """
+    Cari di histori chat sendiri (user dari session): ?q=kata&role=bot&limit=20&offset=0.
+    Urut relevansi (bm25); `snippet` sudah di-escape dengan <mark> di kata yang cocok.
+    """
+    username = g.username
+    if request.args.get("username") not in (None, "", username):
+        return jsonify({"error": "Tidak boleh mencari histori user lain"}), 403
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "Parameter q wajib"}), 400
+    role = request.args.get("role")
+    if role not in (None, "", "user", "bot"):
+        return jsonify({"error": "role harus user atau bot"}), 400
+    limit = min(max(_int_arg("limit") or SEARCH_PAGE_SIZE, 1), SEARCH_MAX_PAGE)
+    offset = min(max(_int_arg("offset") or 0, 0), SEARCH_MAX_OFFSET)
 
+    rows, has_more = search_chats(username, q, limit=limit, offset=offset, role=role or None)
+    for r in rows:
+        r["snippet"] = markup(r["snippet"])
+    return jsonify({
+        "results": rows,
+        "has_more": has_more,
+        "next_offset": offset + len(rows) if has_more else None,
+    })
@@ -1,8 +1,20 @@
 # routes/misc.py
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
+from utils.cache import ai_cache
+from utils.quiz_cache import quiz_cache
+from utils import jobs, metrics, rate_limit
+from models import job_counts
 
 misc_bp = Blueprint("misc", __name__)
 
+metrics.register_cache("ai_cache", ai_cache.stats)
+metrics.register_cache("quiz_cache", quiz_cache.stats)
+metrics.registry.register(metrics.CallbackCounter(
+    "edumate_ai_shed_total", "Request AI yang ditolak (rate limit / antrian penuh)", ("reason",),
+    lambda: {("rate_limit",): rate_limit.rate_limiter.rejected, ("queue_full",): rate_limit.admission.shed}))
+metrics.registry.register(metrics.Gauge(
+    "edumate_jobs", "Job background per status (tabel jobs, semua proses)", ("kind", "status"), job_counts))
+
 @misc_bp.route("/about", methods=["GET"])
 def about():
     return jsonify({
@@ -12,3 +24,16 @@ def about():
     })
 
 
+@misc_bp.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "ai_cache": ai_cache.stats(),
+        "quiz_cache": quiz_cache.stats(),
+        "rate_limit": rate_limit.stats(),
+        "jobs": jobs.stats(),
+    })
+
+
+@misc_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,10 +1,26 @@
 # routes/quiz.py
-from flask import Blueprint, request, jsonify
-from utils.ai_helper import generate_quiz_questions, parse_possible_json
-from models import create_quiz_record, save_quiz_questions, get_quiz_questions, save_score, get_leaderboard
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from utils.ai_helper import generate_quiz_questions, parse_possible_json, stream_quiz_items
+from utils.sse import sse_event, SSE_HEADERS
+from models import create_quiz, save_score, save_scores, get_leaderboard, get_quiz_owner, existing_usernames, LEADERBOARD_WINDOWS, bank_add_questions, search_questions
+from utils.question_bank import clean_questions, take_from_bank
+from utils.quiz_cache import quiz_cache
+from utils.sessions import load_session, login_required, current_username
+from utils.rate_limit import ai_limited
+from utils.log import get_logger, log_payload
+from utils.search import SEARCH_MAX_OFFSET, SEARCH_MAX_PAGE, SEARCH_PAGE_SIZE, markup, near_duplicates
+from utils.jobs import FINISHED, JobQueue
+import os
 import random
 
 quiz_bp = Blueprint("quiz", __name__)
+log = get_logger(__name__)
+quiz_bp.before_request(load_session)
+
+QUIZ_BULK_MAX = int(os.getenv("QUIZ_BULK_MAX", 500))  # maks jawaban per submit massal
+QUIZ_RATE_COST = float(os.getenv("QUIZ_RATE_COST", 3))  # token rate limit per quiz (lebih mahal dari chat)
+QUIZ_DEDUPE = os.getenv("QUIZ_DEDUPE", "flag")  # flag: tandai soal mirip | drop: buang & minta pengganti | off
+QUIZ_DEDUPE_ROUNDS = int(os.getenv("QUIZ_DEDUPE_ROUNDS", 2))  # drop: ronde minta soal pengganti ke model
 
 BANNED = ["teror", "terror", "rasis", "racis", "rape", "seks", "porn", "sex abuse"]
 
@@ -21,116 +37,312 @@ def make_dummy_questions(category: str, total: int):
         qlist.append({"index": i, "q": qtxt, "options": options, "answer": correct})
     return qlist
 
-def norm(s: str) -> str:
-    return (s or "").strip().lower()
-
-@quiz_bp.route("", methods=["POST"])
-def generate_quiz():
+def _quiz_request():
+    """Baca & validasi body POST quiz. Return (params, None) atau (None, error_response)."""
     data = request.get_json() or {}
     category = (data.get("category") or "").strip()
     try:
         total = int(data.get("total", 15))
     except Exception:
         total = 15
-    username = data.get("username") or "anonymous"
+    params = {
+        "category": category,
+        "total": total,
+        "username": current_username(data),
+        "difficulty": (data.get("difficulty") or "").strip().lower(),
+        "refresh": bool(data.get("refresh")),
+    }
 
     if not category:
-        return jsonify({"error": "Category required"}), 400
+        return None, (jsonify({"error": "Category required"}), 400)
 
     if contains_banned(category):
-        return jsonify({"error": "Category contains disallowed content."}), 400
-
-    raw = generate_quiz_questions(category, total=total)
-    print("DEBUG RAW QUIZ OUTPUT:", raw[:500])  # 🔎 log isi awal dari Gemini
-
+        return None, (jsonify({"error": "Category contains disallowed content."}), 400)
+
+    return params, None
+
+def _dedupe_questions(category, questions, start=0):
+    """
+    Cek soal mirip lewat index FTS, hanya untuk questions[start:] (soal yang baru dibuat model;
+    soal dari bank sudah ada di quiz_questions jadi pasti "mirip dirinya sendiri").
+    Return list near_duplicates [{"index", "similarity", "duplicate_of"}].
+    """
+    if QUIZ_DEDUPE == "off" or len(questions) <= start:
+        return []
     try:
-        parsed = parse_possible_json(raw)
-        questions = []
-        for idx, item in enumerate(parsed):
-            q_text = item.get("q") or item.get("question") or ""
-            options = item.get("options") or item.get("choices") or []
-            answer = item.get("answer") or item.get("correct") or ""
-
-            options = [str(o).strip() for o in options if str(o).strip()]
-            if not options:
-                options = ["True", "False", "Not sure", "Maybe"]
-
-            ans_raw = str(answer).strip()
-            if len(ans_raw) == 1 and ans_raw.upper() in ["A", "B", "C", "D"]:
-                map_idx = ord(ans_raw.upper()) - ord("A")
-                answer_text = options[map_idx] if 0 <= map_idx < len(options) else options[0]
-            else:
-                found = None
-                for opt in options:
-                    if opt.lower() in ans_raw.lower() or ans_raw.lower() in opt.lower():
-                        found = opt
-                        break
-                answer_text = found if found else (options[0] if options else "")
-
-            questions.append({"index": idx, "q": q_text, "options": options, "answer": answer_text})
-
-        if len(questions) < total:
-            questions.extend(make_dummy_questions(category, total - len(questions)))
+        return [d for d in near_duplicates(category, questions) if d["index"] >= start]
     except Exception as e:
-        print("PARSE ERROR:", e)  # 🔎 log error parse
-        questions = make_dummy_questions(category, total)
-
+        log.warning("cek duplikat gagal", extra={"data": {"category": category, "error": str(e)}})
+        return []
+
+def _drop_duplicates(questions, dups):
+    """Buang soal mirip. Return (questions, [(soal, entry)]); entry ditandai dropped, index lain digeser."""
+    bad = {d["index"] for d in dups}
+    moved = {old: new for new, old in enumerate(i for i in range(len(questions)) if i not in bad)}
+    removed = []
+    for d in dups:
+        removed.append((questions[d["index"]], d))
+        d["dropped"] = True
+        del d["index"]
+    for d in dups:
+        if "index" in d["duplicate_of"]:
+            d["duplicate_of"]["index"] = moved.get(d["duplicate_of"]["index"])
+    return [q for i, q in enumerate(questions) if i not in bad], removed
+
+def _generate_questions(category, total, difficulty, refresh):
+    """
+    Soal baru dari model: parse -> cek duplikat -> simpan ke bank. Return (questions, near_duplicates).
+    flag: soal mirip tetap dipakai, hanya dilaporkan (dan tidak masuk bank).
+    drop: soal mirip dibuang lalu model diminta soal pengganti (maks QUIZ_DEDUPE_ROUNDS ronde);
+    kalau tetap kurang, soal mirip dipakai lagi (dilaporkan) sebelum terpaksa pakai dummy.
+    """
+    def ask(count, refresh):
+        raw = generate_quiz_questions(category, total=count, difficulty=difficulty, refresh=refresh)
+        log_payload(log, "output mentah quiz", raw, category=category)  # disampling, hanya di level DEBUG
+        try:
+            return clean_questions(parse_possible_json(raw))
+        except Exception as e:
+            log.warning("parse quiz gagal", extra={"data": {"category": category, "error": str(e)}})
+            return []
+
+    questions, duplicates, spare = [], [], []
+    rounds = 1 + (QUIZ_DEDUPE_ROUNDS if QUIZ_DEDUPE == "drop" else 0)
+    for attempt in range(rounds):
+        kept = len(questions)
+        # ronde pengganti pakai refresh=True: prompt sama, jangan ambil output lama dari cache
+        questions = questions + ask(total - kept, refresh or attempt > 0)
+        dups = _dedupe_questions(category, questions, start=kept)
+        duplicates += dups
+        if QUIZ_DEDUPE != "drop" or not dups:
+            break
+        questions, removed = _drop_duplicates(questions, dups)
+        spare += removed
+        if len(questions) >= total:
+            break
+
+    for question, entry in spare[:max(0, total - len(questions))]:
+        entry.pop("dropped")
+        entry["index"] = len(questions)
+        questions.append(question)
+
+    flagged = {d["index"] for d in duplicates if "index" in d}
+    bank_add_questions(category, difficulty, [q for i, q in enumerate(questions) if i not in flagged])
+    return questions, duplicates
+
+def _finalize_questions(category, total, questions):
+    # kekurangan soal (model gagal / output rusak) terpaksa diisi soal dummy [Fallback]
+    if len(questions) < total:
+        log.warning("soal kurang, diisi fallback", extra={"data": {
+            "category": category, "total": total, "missing": total - len(questions)}})
     if len(questions) > total:
         questions = questions[:total]
     elif len(questions) < total:
         questions.extend(make_dummy_questions(category, total - len(questions)))
+    for idx, q in enumerate(questions):
+        q["index"] = idx
+    return questions
+
+def build_quiz(params):
+    """Pipeline lengkap: bank / Gemini -> parse -> cek duplikat -> simpan. Return (quiz_id, questions, duplicates)."""
+    category, total, difficulty, refresh = params["category"], params["total"], params["difficulty"], params["refresh"]
+
+    # jalur cepat: ambil dari bank soal (tanpa menunggu Gemini); soal bank tidak dicek duplikat lagi
+    questions = None if refresh else take_from_bank(category, difficulty, total)
+    duplicates = []
+    if questions is None:
+        questions, duplicates = _generate_questions(category, total, difficulty, refresh)
+    questions = _finalize_questions(category, total, questions)
+    duplicates = [d for d in duplicates if d.get("dropped") or d["index"] < total]  # soal lebih dipotong
+
+    quiz_id = create_quiz(params["username"], category, total, questions)
+    quiz_cache.put(quiz_id, questions)
+    return quiz_id, questions, duplicates
+
+def _quiz_job(params):
+    quiz_id, questions, duplicates = build_quiz(params)
+    return {"quiz_id": quiz_id, "total": len(questions), "near_duplicates": duplicates}
+
+quiz_jobs = JobQueue("quiz", _quiz_job)
+
+def _enqueue_quiz(params):
+    """Return (job_id, created)."""
+    # permintaan identik yang masih diproses ikut job yang sama; per user, karena quiz hasilnya
+    # dimiliki satu user (hanya pemilik yang boleh melihat job / submit massal)
+    dedupe_key = "|".join([params["username"], params["category"].lower(), params["difficulty"],
+                           str(params["total"]), "refresh" if params["refresh"] else ""])
+    return quiz_jobs.enqueue(params, dedupe_key=dedupe_key, username=params["username"])
+
+def _prefer():
+    """Header Prefer (RFC 7240) -> {nama: nilai}, mis. "respond-async, wait=10" -> {"respond-async": "", "wait": "10"}."""
+    prefs = {}
+    for part in request.headers.get("Prefer", "").split(","):
+        name, _, value = part.split(";", 1)[0].strip().partition("=")
+        if name:
+            prefs.setdefault(name.strip().lower(), value.strip().strip('"'))
+    return prefs
+
+def _job_response(job_id, job, status=200, deduplicated=None):
+    body = {"job_id": job_id, "status": job["status"], "attempts": job["attempts"]}
+    if deduplicated is not None:
+        body["deduplicated"] = deduplicated
+    if job["status"] == "done":
+        result = job["result"]
+        body.update(result, questions=quiz_cache.get(result["quiz_id"]).as_created())
+    elif job["status"] == "failed":
+        body["error"] = job["error"]
+    resp = jsonify(body)
+    resp.status_code = status
+    if job["status"] not in FINISHED:
+        resp.status_code = 202
+        resp.headers["Retry-After"] = "1"
+        resp.headers["Location"] = f"/api/quiz/jobs/{job_id}"
+    return resp
 
-    quiz_id = create_quiz_record(username, category, total)
-    save_quiz_questions(quiz_id, questions)
-
-    return jsonify({"quiz_id": quiz_id, "questions": questions}), 201
+@quiz_bp.route("", methods=["POST"])
+@ai_limited(cost=QUIZ_RATE_COST)
+def generate_quiz():
+    """
+    Generate quiz lewat antrian job (request tidak pernah menjalankan pipeline sendiri):
+    - default / `Prefer: respond-async`: langsung 202 + job_id, poll GET /jobs/<job_id>
+    - `Prefer: wait=N`: tunggu maks N detik (dibatasi JOB_MAX_WAIT); selesai -> 201 + soal,
+      belum selesai -> 202 seperti biasa
+    """
+    params, error = _quiz_request()
+    if error:
+        return error
+    job_id, created = _enqueue_quiz(params)
+    prefs = _prefer()
+    try:
+        wait = 0.0 if "respond-async" in prefs else float(prefs.get("wait") or 0)
+    except ValueError:
+        wait = 0.0
+    job = quiz_jobs.wait(job_id, wait) if wait > 0 else quiz_jobs.get(job_id)
+    return _job_response(job_id, job, status=201, deduplicated=not created)
+
+
+@quiz_bp.route("/jobs", methods=["POST"])
+@ai_limited(cost=QUIZ_RATE_COST)
+def create_quiz_job():
+    """Generate quiz di worker background: 202 + job_id, lalu poll GET /jobs/<job_id>."""
+    params, error = _quiz_request()
+    if error:
+        return error
+    job_id, created = _enqueue_quiz(params)
+    return _job_response(job_id, quiz_jobs.get(job_id), deduplicated=not created)
+
+
+@quiz_bp.route("/jobs/<job_id>", methods=["GET"])
+def quiz_job_status(job_id):
+    """
+    Status job milik user ini. ?wait=N (detik, maks JOB_MAX_WAIT) = long-poll: response dikirim
+    begitu job selesai atau waktu habis. Selesai -> quiz_id + soal, gagal -> error.
+    """
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        wait = 0
+    job = quiz_jobs.wait(job_id, wait) if wait > 0 else quiz_jobs.get(job_id)
+    # job user lain dianggap tidak ada (hasilnya berisi kunci jawaban)
+    if job is None or job["username"] != current_username():
+        return jsonify({"error": "Job tidak ditemukan"}), 404
+    return _job_response(job_id, job)
+
+
+@quiz_bp.route("/stream", methods=["POST"])
+@ai_limited(cost=QUIZ_RATE_COST)
+def generate_quiz_stream():
+    """
+    Versi SSE dari POST /api/quiz: event `question` dikirim begitu tiap soal
+    selesai di-parse dari stream model, lalu `done` berisi quiz_id.
+    """
+    params, error = _quiz_request()
+    if error:
+        return error
+    category, total, difficulty, refresh = params["category"], params["total"], params["difficulty"], params["refresh"]
+
+    def events():
+        questions = None if refresh else take_from_bank(category, difficulty, total)
+        duplicates = []
+        if questions is not None:
+            for idx, q in enumerate(questions):
+                yield sse_event("question", dict(q, index=idx))
+        else:
+            questions = []
+            items = stream_quiz_items(category, total, difficulty)
+            try:
+                for item in items:
+                    cleaned = clean_questions([item])
+                    if not cleaned:
+                        continue
+                    q = dict(cleaned[0], index=len(questions))
+                    questions.append(q)
+                    yield sse_event("question", q)
+                    if len(questions) >= total:
+                        break
+            except Exception as e:
+                log.warning("stream quiz gagal", extra={"data": {"category": category, "error": str(e)}})
+            finally:
+                items.close()
+            # soal sudah terkirim ke client: di stream duplikat hanya ditandai, tidak dibuang
+            duplicates = _dedupe_questions(category, questions)
+            flagged = {d["index"] for d in duplicates}
+            bank_add_questions(category, difficulty, [q for q in questions if q["index"] not in flagged])
+        streamed = len(questions)
+        questions = _finalize_questions(category, total, questions)
+        for q in questions[streamed:]:
+            yield sse_event("question", q)
+
+        quiz_id = create_quiz(params["username"], category, total, questions)
+        quiz_cache.put(quiz_id, questions)
+        yield sse_event("done", {"quiz_id": quiz_id, "total": len(questions), "near_duplicates": duplicates})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@quiz_bp.route("/search", methods=["GET"])
+def search():
+    """
+    Cari soal yang pernah dibuat: ?q=kata&category=biologi&limit=20&offset=0.
+    Urut relevansi (bm25); `question` sudah di-escape dengan <mark> di kata yang cocok.
+    Kunci jawaban tidak ikut dikirim.
+    """
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "Parameter q wajib"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE)
+        offset = min(max(int(request.args.get("offset", 0)), 0), SEARCH_MAX_OFFSET)
+    except ValueError:
+        return jsonify({"error": "limit/offset harus angka"}), 400
+
+    rows, has_more = search_questions(q, category=request.args.get("category") or None, limit=limit, offset=offset)
+    for r in rows:
+        r["question"] = markup(r["question"])
+    return jsonify({
+        "results": rows,
+        "has_more": has_more,
+        "next_offset": offset + len(rows) if has_more else None,
+    })
 
 
 @quiz_bp.route("/<int:quiz_id>/questions", methods=["GET"])
 def get_questions(quiz_id):
-    qs = get_quiz_questions(quiz_id)
-    return jsonify({"quiz_id": quiz_id, "questions": qs})
+    quiz = quiz_cache.get(quiz_id)
+    return jsonify({"quiz_id": quiz_id, "questions": quiz.questions})
 
 
 @quiz_bp.route("/<int:quiz_id>/submit", methods=["POST"])
 def submit_quiz(quiz_id):
     data = request.get_json() or {}
     answers = data.get("answers") or {}
-    username = data.get("username") or "anonymous"
-
-    questions = get_quiz_questions(quiz_id)
-    total = len(questions)
-    correct = 0
-    wrong = 0
-    details = []
-
-    for q in questions:
-        qid = str(q.get("index"))
-        correct_answer = (q.get("answer") or "").strip()
-        user_ans = (answers.get(qid) or "").strip()
-
-        is_correct = norm(user_ans) == norm(correct_answer) if user_ans else False
-
-        # fleksibilitas: jika correct_answer cuma huruf A/B/C/D
-        if not is_correct and len(correct_answer) == 1 and correct_answer.upper() in ["A","B","C","D"]:
-            idx = ord(correct_answer.upper()) - ord("A")
-            opts = q.get("options") or []
-            if 0 <= idx < len(opts) and norm(user_ans) == norm(opts[idx]):
-                is_correct = True
-
-        if is_correct:
-            correct += 1
-        else:
-            wrong += 1
+    if not isinstance(answers, dict):
+        return jsonify({"error": "answers harus object {index: jawaban}"}), 400
+    username = current_username(data)
 
-        details.append({
-            "index": q.get("index"),
-            "q": q.get("q"),
-            "options": q.get("options"),
-            "user_answer": user_ans,
-            "correct_answer": correct_answer,
-            "correct": is_correct
-        })
+    # quiz sudah terkompilasi di memori: grading tanpa query / json.loads
+    quiz = quiz_cache.get(quiz_id)
+    total = len(quiz.questions)
+    correct, wrong, details = quiz.grade(answers)
 
     score_percent = int((correct / total) * 100) if total > 0 else 0
     save_score(username, quiz_id, correct, wrong, total, score_percent)
@@ -145,9 +357,62 @@ def submit_quiz(quiz_id):
     })
 
 
+@quiz_bp.route("/<int:quiz_id>/submit/bulk", methods=["POST"])
+@login_required
+def submit_quiz_bulk(quiz_id):
+    """
+    Submit satu kelas sekaligus: {"submissions": [{"username", "answers"}, ...]}.
+    Grading satu lintasan, semua skor satu transaksi, plus statistik per soal.
+    Hak akses: pembuat quiz (guru) boleh submit untuk user terdaftar mana pun;
+    user lain hanya boleh submit atas namanya sendiri. Semua username harus terdaftar.
+    """
+    data = request.get_json() or {}
+    submissions = data.get("submissions")
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({"error": "submissions harus list yang tidak kosong"}), 400
+    if len(submissions) > QUIZ_BULK_MAX:
+        return jsonify({"error": f"Maksimal {QUIZ_BULK_MAX} submission per request"}), 400
+    for i, sub in enumerate(submissions):
+        if not isinstance(sub, dict) or not isinstance(sub.get("username"), str) or not sub["username"]:
+            return jsonify({"error": f"submissions[{i}] harus object {{username, answers}}"}), 400
+        if not isinstance(sub.get("answers") or {}, dict):
+            return jsonify({"error": f"submissions[{i}].answers harus object {{index: jawaban}}"}), 400
+
+    quiz = quiz_cache.get(quiz_id)
+    if not quiz.questions:
+        return jsonify({"error": "Quiz tidak ditemukan"}), 404
+
+    usernames = {sub["username"] for sub in submissions}
+    if usernames != {g.username} and get_quiz_owner(quiz_id) != g.username:
+        return jsonify({"error": "Hanya pembuat quiz yang boleh submit untuk user lain"}), 403
+    unknown = sorted(usernames - existing_usernames(usernames))
+    if unknown:
+        return jsonify({"error": "Username tidak terdaftar", "usernames": unknown[:20]}), 400
+
+    results, stats = quiz.grade_many(submissions)
+    save_scores(quiz_id, [
+        (r["username"], r["correct"], r["wrong"], r["total"], r["score_percent"]) for r in results
+    ])
+
+    return jsonify({
+        "quiz_id": quiz_id,
+        "total": len(quiz.questions),
+        "results": results,
+        "stats": stats
+    })
+
+
 @quiz_bp.route("/leaderboard", methods=["GET"])
 def leaderboard():
-    top = get_leaderboard(limit=10)
-    return jsonify({"leaders": top})
+    window = request.args.get("window", "all")
+    if window not in LEADERBOARD_WINDOWS:
+        return jsonify({"error": "window harus all, daily, atau weekly"}), 400
+    category = request.args.get("category") or None
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), 100)
+    except Exception:
+        limit = 10
+    top = get_leaderboard(limit=limit, window=window, category=category)
+    return jsonify({"leaders": top, "window": window, "category": category})
 
 
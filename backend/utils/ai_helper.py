@@ -6,13 +6,21 @@ import os
 import json
 import re
 import ast
-from typing import Optional
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from utils.cache import ai_cache, make_key
+from utils.fake_llm import FAKE_LLM_ENABLED, FakeModel
+from utils.json_stream import QuizStreamParser, iter_quiz_items, validate_item
+from utils.llm_client import LLMClient, LLMError
+from utils.log import get_logger, submit_with_context
+from utils.metrics import quiz_parse, quiz_parse_items
 
+log = get_logger(__name__)
 
 # ======================================================
 # 🔹 Konfigurasi API
@@ -26,76 +34,287 @@ MODEL_PRIORITY = [
     "gemini-1.5-flash",
     "gemini-1.5-pro",
 ]
+DEFAULT_MODEL = "gemini-1.5-flash"
 
-if GEMINI_API_KEY and genai:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Hasil list_models() disimpan ke disk supaya worker baru / cold start tidak perlu
+# memanggil API. Default di temp dir (satu-satunya lokasi writable di Vercel).
+MODEL_CACHE_PATH = Path(os.getenv("AI_MODEL_CACHE", Path(tempfile.gettempdir()) / "edumate_model.json"))
+MODEL_CACHE_TTL = float(os.getenv("AI_MODEL_CACHE_TTL", 24 * 3600))
+
+
+# SDK Gemini di-import saat pertama dipakai (import-nya berat, bikin cold start lambat)
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """Import + configure google.generativeai sekali. None kalau SDK tidak ada."""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                try:
+                    import google.generativeai as sdk
+                    if GEMINI_API_KEY:
+                        sdk.configure(api_key=GEMINI_API_KEY)
+                    _genai = sdk
+                except Exception:
+                    _genai = False
+    return _genai or None
 
 
 # ======================================================
-# 🔹 Deteksi model terbaik
+# 🔹 Deteksi model terbaik (lazy, cache di disk, refresh di background)
 # ======================================================
 def get_available_model():
+    """Panggil list_models() (network) dan pilih model terbaik dari MODEL_PRIORITY."""
+    if FAKE_LLM_ENABLED:
+        return "fake-llm"
+    genai = get_genai()
     if not GEMINI_API_KEY or not genai:
-        print("[AI INIT] ❌ API Key belum diatur.")
-        return "gemini-1.5-flash"
+        log.warning("API key belum diatur")
+        return DEFAULT_MODEL
 
     try:
         models = genai.list_models()
         model_names = [m.name for m in models]
         for pref in MODEL_PRIORITY:
             if any(pref in m for m in model_names):
-                print(f"[AI INIT] ✅ Menggunakan model: {pref}")
+                log.info("model dipilih", extra={"data": {"model": pref}})
                 return pref
     except Exception as e:
-        print(f"[AI INIT] ⚠️ Gagal cek model: {e}")
-    return "gemini-1.5-flash"
+        log.warning("gagal cek model", extra={"data": {"error": str(e)}})
+    return DEFAULT_MODEL
+
+
+_model_state = {"name": None, "checked_at": 0.0, "refreshing": False}
+_model_lock = threading.Lock()
+
+
+def _read_model_cache():
+    try:
+        data = json.loads(MODEL_CACHE_PATH.read_text())
+        return data["model"], float(data["checked_at"])
+    except Exception:
+        return None, 0.0
+
+
+def _write_model_cache(name, checked_at):
+    try:
+        tmp = MODEL_CACHE_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"model": name, "checked_at": checked_at}))
+        tmp.replace(MODEL_CACHE_PATH)  # atomic, aman untuk banyak worker
+    except Exception as e:
+        log.warning("gagal simpan cache model", extra={"data": {"error": str(e)}})
+
+
+def refresh_model_name():
+    """Deteksi ulang model (blocking) lalu simpan ke memori + disk."""
+    try:
+        name = get_available_model()
+        now = time.time()
+        with _model_lock:
+            _model_state.update(name=name, checked_at=now)
+        _write_model_cache(name, now)
+        return name
+    finally:
+        with _model_lock:
+            _model_state["refreshing"] = False
+
+
+def _refresh_in_background():
+    with _model_lock:
+        if _model_state["refreshing"]:
+            return
+        _model_state["refreshing"] = True
+    threading.Thread(target=refresh_model_name, name="ai-model-refresh", daemon=True).start()
+
+
+def get_model_name() -> str:
+    """
+    Tidak pernah memblok pada network:
+    memori -> file cache -> MODEL_PRIORITY[0]; kalau kedaluwarsa / belum ada,
+    deteksi ulang jalan di background (circuit breaker menangani model yang salah).
+    """
+    if FAKE_LLM_ENABLED:
+        return "fake-llm"
+    with _model_lock:
+        name, checked_at = _model_state["name"], _model_state["checked_at"]
+    if name is None:
+        name, checked_at = _read_model_cache()
+        with _model_lock:
+            _model_state.update(name=name or MODEL_PRIORITY[0], checked_at=checked_at)
+        name = name or MODEL_PRIORITY[0]
+    if time.time() - checked_at > MODEL_CACHE_TTL and ai_available():
+        _refresh_in_background()
+    return name
+
+
+def __getattr__(attr):
+    # kompatibilitas: ai_helper.MODEL_NAME tetap bisa dipakai, tapi dihitung lazy
+    if attr == "MODEL_NAME":
+        return get_model_name()
+    raise AttributeError(attr)
 
 
-MODEL_NAME = get_available_model()
+def ai_available() -> bool:
+    return FAKE_LLM_ENABLED or bool(GEMINI_API_KEY and get_genai())
+
+
+def make_model(name: Optional[str] = None):
+    if FAKE_LLM_ENABLED:
+        return FakeModel(name or get_model_name())
+    return get_genai().GenerativeModel(name or get_model_name())
+
+
+def model_order():
+    # Model terpilih dulu, lalu sisa MODEL_PRIORITY sebagai cadangan (circuit breaker)
+    current = get_model_name()
+    return [current] + [m for m in MODEL_PRIORITY if m != current]
+
+
+llm_client = LLMClient(models=model_order, model_factory=make_model)
 
 
 # ======================================================
 # 🔹 Fungsi generate teks dari Gemini (auto retry)
 # ======================================================
 def ask_gemini_raw(prompt: str, max_output_tokens: int = 2048, retries: int = 2) -> str:
-    if not GEMINI_API_KEY or not genai:
+    if not ai_available():
         return "[AI Unavailable] API key / SDK error"
 
-    for attempt in range(retries):
-        try:
-            model = genai.GenerativeModel(MODEL_NAME)
-            response = model.generate_content(
-                prompt,
-                generation_config={"max_output_tokens": max_output_tokens}
-            )
-            text = getattr(response, "text", None)
-            if text and len(text.strip()) > 0:
-                return text.strip()
-            print(f"[AI WARN] Output Gemini terpotong (retry {attempt+1}/{retries})...")
-        except Exception as e:
-            print(f"[AI Error] {e}")
-    return ""
+    try:
+        return llm_client.generate(prompt, max_output_tokens=max_output_tokens, retries=retries)
+    except LLMError as e:
+        log.error("LLM gagal", extra={"data": {"error": str(e)}})
+        return ""
+
+
+# ======================================================
+# 🔹 Streaming (token dikirim begitu datang)
+# ======================================================
+def stream_gemini_raw(prompt: str, max_output_tokens: int = 2048):
+    """Generator potongan teks dari generate_content(stream=True)."""
+    if not ai_available():
+        yield "[AI Unavailable] API key / SDK error"
+        return
+
+    yield from llm_client.stream(prompt, max_output_tokens=max_output_tokens)
+
+
+# ======================================================
+# 🔹 Cache respons (prompt sama -> tidak panggil Gemini lagi)
+# ======================================================
+def cached_generate(kind: str, prompt: str, max_output_tokens: int, refresh: bool = False,
+                    validate: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    ask_gemini_raw + cache. Key = prompt ternormalisasi + model + config.
+    refresh=True: abaikan cache, generate ulang lalu timpa entry lama.
+    Output kosong / error, atau yang ditolak `validate(text)`, tidak disimpan.
+    """
+    key = make_key(kind, prompt, get_model_name(), {"max_output_tokens": max_output_tokens})
+    if not refresh:
+        hit = ai_cache.get(key)
+        if hit is not None:
+            return hit
+
+    text = ask_gemini_raw(prompt, max_output_tokens=max_output_tokens)
+    if not text or text.startswith("[AI Unavailable]"):
+        return text
+    if validate is not None and not validate(text):
+        log.info("output tidak di-cache (tidak lolos validasi)", extra={"data": {"kind": kind}})
+        return text
+    ai_cache.set(key, text)
+    return text
 
 
 # ======================================================
 # 🔹 Generate Chat Reply
 # ======================================================
-def generate_chat_reply(user_message: str, username: Optional[str] = None) -> str:
+def generate_chat_reply(user_message: str, username: Optional[str] = None, refresh: bool = False,
+                        context: Optional[dict] = None) -> str:
+    # username sengaja tidak masuk prompt: jawaban untuk pertanyaan yang sama
+    # bisa dipakai ulang antar siswa lewat cache. Konteks percakapan hanya ikut
+    # kalau pertanyaannya merujuk ke percakapan; kalau ikut, isinya masuk key
+    # cache (make_key meng-hash seluruh prompt) jadi tidak tertukar antar user.
+    prompt = chat_prompt(user_message, context if needs_context(user_message) else None)
+    return cached_generate("chat", prompt, max_output_tokens=300, refresh=refresh)
+
+
+# Kata yang menandakan pertanyaan lanjutan ("jelaskan lagi", "contoh yang tadi", ...):
+# hanya pertanyaan seperti ini yang butuh histori; sisanya dijawab lewat cache bersama.
+CHAT_FOLLOWUP_WORDS = frozenset(
+    os.getenv(
+        "CHAT_FOLLOWUP_WORDS",
+        "tersebut,tadi,sebelumnya,barusan,lanjut,lanjutkan,lagi,lain,lainnya,maksudnya,"
+        "contohnya,begitu,gitu,dia,mereka,nomor,jawabanmu,penjelasanmu",
+    ).split(",")
+)
+
+
+def needs_context(user_message: str) -> bool:
+    """True kalau pertanyaan kemungkinan merujuk ke percakapan sebelumnya."""
+    words = re.findall(r"\w+", (user_message or "").lower())
+    return any(w in CHAT_FOLLOWUP_WORDS for w in words)
+
+
+def chat_prompt(user_message: str, context: Optional[dict] = None) -> str:
     ctx = (
         "Kamu adalah tutor AI yang ramah dan jelas. "
         "Jawab singkat, mudah dimengerti oleh siswa SMA. Berikan contoh jika perlu."
     )
-    user_ctx = f"User: {username}" if username else ""
-    prompt = f"{ctx}\n{user_ctx}\nPertanyaan: {user_message}\nJawab singkat:"
-    return ask_gemini_raw(prompt, max_output_tokens=300)
+    if context:
+        if context.get("summary"):
+            ctx += f"\nRingkasan percakapan sebelumnya: {context['summary']}"
+        if context.get("history"):
+            lines = "\n".join(
+                f"{'Siswa' if role == 'user' else 'Tutor'}: {message}" for role, message in context["history"]
+            )
+            ctx += f"\nPercakapan terakhir:\n{lines}"
+    return f"{ctx}\nPertanyaan: {user_message}\nJawab singkat:"
+
+
+def stream_chat_reply(user_message: str, username: Optional[str] = None, refresh: bool = False,
+                      context: Optional[dict] = None):
+    """
+    Versi streaming generate_chat_reply. Cache hit dikirim sekaligus.
+    Jawaban baru masuk cache hanya kalau stream selesai utuh (bukan terputus).
+    """
+    prompt = chat_prompt(user_message, context if needs_context(user_message) else None)
+    key = make_key("chat", prompt, get_model_name(), {"max_output_tokens": 300})
+    if not refresh:
+        hit = ai_cache.get(key)
+        if hit is not None:
+            yield hit
+            return
+
+    parts = []
+    for text in stream_gemini_raw(prompt, max_output_tokens=300):
+        parts.append(text)
+        yield text
+
+    full = "".join(parts).strip()
+    if full and not full.startswith("[AI Unavailable]"):
+        ai_cache.set(key, full)
 
 
 # ======================================================
 # 🔹 Generate Quiz Questions (AI) - FIXED VERSION
 # ======================================================
-def generate_quiz_questions(category: str, total: int = 30) -> str:
-    prompt = (
-        f"Buat {total} soal pilihan ganda tentang topik '{category}'.\n"
+QUIZ_CHUNK_SIZE = int(os.getenv("QUIZ_CHUNK_SIZE", 10))         # soal per panggilan Gemini
+QUIZ_CHUNK_WORKERS = int(os.getenv("QUIZ_CHUNK_WORKERS", 4))     # panggilan paralel per quiz
+QUIZ_CHUNK_ROUNDS = int(os.getenv("QUIZ_CHUNK_ROUNDS", 3))       # ronde susulan untuk soal yang kurang
+
+
+def quiz_prompt(category: str, total: int, difficulty: str = "", part: Optional[int] = None, parts: Optional[int] = None) -> str:
+    level = f" dengan tingkat kesulitan '{difficulty}'" if difficulty else ""
+    variant = (
+        f"Ini bagian {part} dari {parts}: pilih subtopik yang berbeda dari bagian lain.\n"
+        if part else ""
+    )
+    return (
+        f"Buat {total} soal pilihan ganda tentang topik '{category}'{level}.\n"
+        + variant +
         "Formatkan dalam JSON array valid seperti ini:\n"
         "[\n"
         "  {\"q\": \"Pertanyaan...\", \"options\": [\"A\", \"B\", \"C\", \"D\"], \"answer\": \"A\"}\n"
@@ -103,7 +322,77 @@ def generate_quiz_questions(category: str, total: int = 30) -> str:
         "Jangan sertakan penjelasan, kutipan kode, atau markdown seperti ```json. "
         "Pastikan JSON lengkap dan ditutup dengan benar."
     )
-    return ask_gemini_raw(prompt, max_output_tokens=8192)
+
+
+def quiz_output_complete(total: int) -> Callable[[str], bool]:
+    """
+    Validator cache untuk output quiz: lolos hanya kalau berisi minimal `total` soal
+    valid. Output rusak / terpotong (yang berujung soal [Fallback]) tidak di-cache,
+    supaya prompt yang sama berikutnya generate ulang. Tanpa metrik parse (bukan parse
+    sungguhan - itu tetap lewat parse_possible_json di pemanggil).
+    """
+    def check(raw: str) -> bool:
+        parser = QuizStreamParser()
+        items = parser.feed(raw) + parser.close()
+        return len(items) >= total
+
+    return check
+
+
+def generate_quiz_questions(category: str, total: int = 30, difficulty: str = "", refresh: bool = False) -> str:
+    """
+    Return teks JSON array soal. total > QUIZ_CHUNK_SIZE dipecah jadi beberapa
+    panggilan kecil paralel (lihat generate_quiz_chunked) supaya output tidak terpotong.
+    """
+    if total <= QUIZ_CHUNK_SIZE:
+        return cached_generate("quiz", quiz_prompt(category, total, difficulty), max_output_tokens=8192,
+                               refresh=refresh, validate=quiz_output_complete(total))
+    return json.dumps(generate_quiz_chunked(category, total, difficulty, refresh), ensure_ascii=False)
+
+
+def _question_key(item) -> str:
+    return re.sub(r"\s+", " ", str(item.get("q") or item.get("question") or "").strip().lower())
+
+
+def generate_quiz_chunked(category: str, total: int, difficulty: str = "", refresh: bool = False) -> list:
+    """
+    Pecah jadi potongan QUIZ_CHUNK_SIZE soal, generate paralel, gabung + dedupe.
+    Kalau hasil masih kurang (parse gagal / duplikat), ronde berikutnya hanya
+    meminta kekurangannya dengan nomor bagian baru (prompt & cache key berbeda).
+    """
+    merged, seen = [], set()
+    next_part = 1
+
+    def run_chunk(part, size, parts):
+        raw = cached_generate("quiz", quiz_prompt(category, size, difficulty, part, parts),
+                              max_output_tokens=8192, refresh=refresh, validate=quiz_output_complete(size))
+        try:
+            return parse_possible_json(raw)
+        except Exception as e:
+            log.warning("chunk gagal di-parse", extra={"data": {"part": part, "error": str(e)}})
+            return []
+
+    with ThreadPoolExecutor(max_workers=QUIZ_CHUNK_WORKERS) as pool:
+        for _ in range(QUIZ_CHUNK_ROUNDS):
+            missing = total - len(merged)
+            if missing <= 0:
+                break
+            sizes = [QUIZ_CHUNK_SIZE] * (missing // QUIZ_CHUNK_SIZE)
+            if missing % QUIZ_CHUNK_SIZE:
+                sizes.append(missing % QUIZ_CHUNK_SIZE)
+            parts = next_part + len(sizes) - 1
+            futures = [submit_with_context(pool, run_chunk, next_part + i, size, parts) for i, size in enumerate(sizes)]
+            next_part += len(sizes)
+
+            for fut in futures:  # urutan bagian tetap stabil
+                for item in fut.result():
+                    key = _question_key(item)
+                    if not key or key.startswith("[fallback]") or key in seen:
+                        continue
+                    seen.add(key)
+                    merged.append(item)
+
+    return merged[:total]
 
 
 # ======================================================
@@ -111,60 +400,44 @@ def generate_quiz_questions(category: str, total: int = 30) -> str:
 # ======================================================
 def parse_possible_json(raw: str):
     """
-    Parsing output Gemini jadi JSON valid.
-    - Menghapus blok ```json dan teks non-JSON
-    - Memperbaiki string yang belum tertutup
-    - Menyelamatkan soal yang masih valid (anti fallback)
+    Parsing output Gemini jadi list soal valid (lihat utils/json_stream.py).
+    - Teks non-JSON / blok ```json diabaikan, kutip miring & trailing comma diperbaiki
+    - Soal yang utuh tetap diselamatkan walau output terpotong (anti fallback)
+    - Tiap soal dicek skemanya (q, options, answer)
     """
     if not raw or not isinstance(raw, str):
+        quiz_parse.inc("error")
         raise ValueError("Empty AI output")
 
-    # Hilangkan blok kode markdown
-    raw = re.sub(r"```json|```", "", raw, flags=re.IGNORECASE).strip()
-
-    # Cari JSON array di dalam teks
-    start = raw.find("[")
-    end = raw.rfind("]")
-    if start == -1 or end == -1:
-        raise ValueError("No JSON array found in AI output")
-
-    json_str = raw[start:end + 1]
-
-    # Bersihkan karakter aneh
-    json_str = (
-        json_str.replace("\u201c", '"')
-        .replace("\u201d", '"')
-        .replace("\u2018", "'")
-        .replace("\u2019", "'")
-        .replace("\n", " ")
-    )
-    json_str = re.sub(r",\s*]", "]", json_str)
-    json_str = re.sub(r",\s*}", "}", json_str)
-
-    # ✅ Coba parse langsung
-    try:
-        parsed = json.loads(json_str)
-        if isinstance(parsed, list) and all("q" in q for q in parsed):
-            return parsed
-    except Exception:
-        pass
-
-    # ✅ Jika gagal, coba potong manual
-    fixed = []
-    for match in re.finditer(r'\{[^{}]*\}', json_str):
-        block = match.group()
+    # jalur cepat: output sudah JSON array valid -> satu json.loads
+    start, end = raw.find("["), raw.rfind("]")
+    if start != -1 and end > start:
         try:
-            item = json.loads(block)
-            if "q" in item and "options" in item and "answer" in item:
-                fixed.append(item)
-        except Exception:
-            continue
+            parsed = json.loads(raw[start:end + 1])
+            items = [validate_item(x) for x in parsed] if isinstance(parsed, list) else []
+            if items and all(items):
+                quiz_parse.inc("fast")
+                quiz_parse_items.inc("accepted", amount=len(items))
+                return items
+        except ValueError:
+            pass
 
-    if fixed:
-        print(f"[AI FIX] ✅ Berhasil selamatkan {len(fixed)} soal parsable.")
-        return fixed
+    parser = QuizStreamParser()
+    items = parser.feed(raw) + parser.close()
+    quiz_parse_items.inc("accepted", amount=len(items))
+    quiz_parse_items.inc("rejected", amount=parser.rejected)
+    if items:
+        quiz_parse.inc("salvage" if parser.rejected else "stream")
+        if parser.rejected:
+            log.info("soal diselamatkan dari output rusak", extra={"data": {"items": len(items), "rejected": parser.rejected}})
+        return items
 
-    print("[AI FAIL] ❌ Tidak ada soal valid, fallback dummy quiz.")
+    if not parser.seen_array and "{" not in raw:
+        quiz_parse.inc("error")
+        raise ValueError("No JSON array found in AI output")
+
+    quiz_parse.inc("fallback")
+    log.warning("tidak ada soal valid, fallback dummy quiz")
     return [
         {
             "q": f"[Fallback] Contoh soal 1 untuk topik umum. Pilih jawaban yang paling tepat.",
@@ -174,6 +447,16 @@ def parse_possible_json(raw: str):
     ]
 
 
+def stream_quiz_items(category: str, total: int, difficulty: str = ""):
+    """
+    Generate soal lewat streaming; tiap soal di-yield begitu objek JSON-nya tertutup.
+    Untuk total besar cukup satu stream: soal yang sudah jadi tetap terpakai walau
+    ekor output terpotong.
+    """
+    prompt = quiz_prompt(category, total, difficulty)
+    yield from iter_quiz_items(stream_gemini_raw(prompt, max_output_tokens=8192))
+
+
 # ======================================================
 # 🔹 Helper (optional untuk debug)
 # ======================================================
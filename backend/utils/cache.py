@@ -0,0 +1,171 @@
+# cache.py - cache respons AI (memori LRU + TTL, opsional tier SQLite)
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", 3600))
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", 1024))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "1") != "0"
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase + rapikan spasi, supaya 'Apa itu  Gaya?' == 'apa itu gaya?'."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def make_key(kind: str, prompt: str, model: str, config: dict = None) -> str:
+    payload = json.dumps(
+        [kind, normalize_prompt(prompt), model, config or {}],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryCache:
+    """LRU in-process dengan TTL per entry. Thread-safe."""
+
+    def __init__(self, maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.time() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Tier persisten di tabel ai_cache (dibagi antar worker gunicorn)."""
+
+    def __init__(self, ttl=AI_CACHE_TTL):
+        self.ttl = ttl
+
+    def _conn(self):
+        from database import get_db
+        return get_db()
+
+    def _transaction(self):
+        from database import transaction
+        return transaction()
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM ai_cache WHERE key=?", (key,)
+        ).fetchone()
+        if row is None or row["expires_at"] <= time.time():
+            return None
+        return row["value"]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, created_at, expires_at) VALUES (?,?,?,?)",
+                (key, value, now, now + (ttl or self.ttl)),
+            )
+
+    def delete(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM ai_cache WHERE key=?", (key,))
+
+    def purge_expired(self):
+        with self._transaction() as conn:
+            cur = conn.execute("DELETE FROM ai_cache WHERE expires_at<=?", (time.time(),))
+        return cur.rowcount
+
+
+class TieredCache:
+    """
+    Memori dulu, lalu (opsional) SQLite. Hit di tier persisten diangkat ke memori.
+    Error di tier persisten tidak boleh menggagalkan request, cukup dianggap miss.
+    """
+
+    def __init__(self, memory=None, persistent=None):
+        self.memory = memory or MemoryCache()
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                log.warning("tier persisten cache error", extra={"data": {"error": str(e)}})
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+        self._count(value is not None)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value, ttl)
+            except Exception as e:
+                log.warning("tier persisten cache error", extra={"data": {"error": str(e)}})
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.persistent is not None:
+            try:
+                self.persistent.delete(key)
+            except Exception as e:
+                log.warning("tier persisten cache error", extra={"data": {"error": str(e)}})
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "memory_entries": len(self.memory),
+            "persistent": self.persistent is not None,
+        }
+
+
+ai_cache = TieredCache(persistent=SQLiteCache() if AI_CACHE_PERSIST else None)
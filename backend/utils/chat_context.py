@@ -0,0 +1,159 @@
+# chat_context.py - jendela konteks percakapan + ringkasan bergulir per user
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from models import get_chat_summary, get_chats_for_user, last_chat_id, save_chat_summary
+from utils.log import get_logger, submit_with_context
+
+log = get_logger(__name__)
+
+CHAT_CONTEXT_ENABLED = os.getenv("CHAT_CONTEXT", "1") != "0"
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 800))          # budget histori di prompt
+CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", 20))       # maks pesan dibaca saat reload
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", 200))          # panjang ringkasan
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", 2000))  # user yang state-nya di memori
+
+
+def estimate_tokens(text: str) -> int:
+    """Perkiraan kasar ~4 karakter per token (cukup untuk budget, tanpa tokenizer)."""
+    return math.ceil(len(text or "") / 4)
+
+
+class _State:
+    __slots__ = ("summary", "upto_id", "last_id", "recent", "summarizing")
+
+    def __init__(self, summary="", upto_id=0, last_id=0, recent=None):
+        self.summary = summary
+        self.upto_id = upto_id
+        self.last_id = last_id
+        self.recent = recent or []  # [(id, role, message, tokens)] urut id ASC
+        self.summarizing = False
+
+
+class ConversationContext:
+    """
+    Per user disimpan di memori: ringkasan + pesan terbaru yang belum diringkas.
+    - tiap giliran cukup 1 query (MAX(id) lewat index) untuk memastikan state masih
+      sama dengan DB; beda (mis. worker lain yang menulis) -> baca ulang sekali
+    - pesan lama yang melewati budget dilipat ke ringkasan di background,
+      hanya saat jendela penuh (bukan tiap giliran)
+    """
+
+    def __init__(self, budget=CHAT_CONTEXT_TOKENS, maxsize=CHAT_CONTEXT_CACHE_SIZE):
+        self.budget = budget
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+
+    def _load(self, username):
+        row = get_chat_summary(username)
+        summary, upto_id = (row["summary"], row["upto_id"]) if row else ("", 0)
+        rows = [r for r in get_chats_for_user(username, limit=CHAT_CONTEXT_MESSAGES) if r["id"] > upto_id]
+        recent = [(r["id"], r["role"], r["message"], estimate_tokens(r["message"])) for r in rows]
+        last_id = rows[-1]["id"] if rows else upto_id
+        return _State(summary, upto_id, last_id, recent)
+
+    def _state(self, username):
+        latest = last_chat_id(username)
+        with self._lock:
+            state = self._states.get(username)
+            if state is not None and state.last_id == latest:
+                self._states.move_to_end(username)
+                return state
+        state = self._load(username)
+        with self._lock:
+            self._states[username] = state
+            self._states.move_to_end(username)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+        return state
+
+    def build(self, username):
+        """
+        Return {"summary", "history": [(role, message)]} yang muat di budget,
+        atau None kalau belum ada konteks (giliran pertama / anonim).
+        """
+        if not CHAT_CONTEXT_ENABLED or not username or username == "anonymous":
+            return None
+        state = self._state(username)
+        with self._lock:
+            history, used = [], estimate_tokens(state.summary)
+            for _, role, message, tokens in reversed(state.recent):
+                if used + tokens > self.budget:
+                    break
+                history.append((role, message))
+                used += tokens
+            summary = state.summary
+        if not summary and not history:
+            return None
+        return {"summary": summary, "history": history[::-1]}
+
+    def record(self, username, messages):
+        """Tambahkan pesan yang baru disimpan [(id, role, message)]; lipat ke ringkasan kalau penuh."""
+        if not CHAT_CONTEXT_ENABLED or not username or username == "anonymous":
+            return
+        with self._lock:
+            state = self._states.get(username)
+            if state is None:
+                return  # belum pernah build(): akan dibaca dari DB saat dibutuhkan
+            for msg_id, role, message in messages:
+                if msg_id > state.last_id:
+                    state.recent.append((msg_id, role, message, estimate_tokens(message)))
+                    state.last_id = msg_id
+            total = sum(m[3] for m in state.recent)
+            if total <= self.budget or state.summarizing:
+                return
+            # sisakan separuh budget sebagai pesan mentah, sisanya diringkas
+            fold, keep = [], total
+            for m in state.recent:
+                if keep <= self.budget // 2:
+                    break
+                fold.append(m)
+                keep -= m[3]
+            state.summarizing = True
+            previous = state.summary
+        submit_with_context(self._executor, self._summarize, username, state, previous, fold)
+
+    def _summarize(self, username, state, previous, fold):
+        try:
+            summary = summarize(previous, [(role, message) for _, role, message, _ in fold])
+            upto_id = fold[-1][0]
+            save_chat_summary(username, summary, upto_id)
+            with self._lock:
+                state.summary = summary
+                state.upto_id = upto_id
+                state.recent = [m for m in state.recent if m[0] > upto_id]
+        except Exception as e:
+            log.warning("ringkasan gagal", extra={"data": {"username": username, "error": str(e)}})
+        finally:
+            state.summarizing = False
+
+
+def _format_history(history):
+    return "\n".join(f"{'Siswa' if role == 'user' else 'Tutor'}: {message}" for role, message in history)
+
+
+def summarize(previous, history):
+    """Ringkasan baru = ringkasan lama + pesan yang dilipat. AI gagal -> potong teks saja."""
+    from utils.ai_helper import ask_gemini_raw
+
+    prompt = (
+        "Ringkas percakapan antara siswa dan tutor berikut dalam bahasa Indonesia, "
+        f"maksimal {CHAT_SUMMARY_TOKENS * 3 // 4} kata. Simpan topik, fakta penting, "
+        "dan hal yang belum dipahami siswa.\n"
+        f"Ringkasan sebelumnya: {previous or '-'}\n"
+        f"Percakapan baru:\n{_format_history(history)}\nRingkasan:"
+    )
+    text = ask_gemini_raw(prompt, max_output_tokens=CHAT_SUMMARY_TOKENS)
+    if not text or text.startswith("[AI Unavailable]"):
+        text = f"{previous} {_format_history(history)}".strip()
+    # ringkasan tidak boleh ikut membengkak: potong dari depan (yang paling lama)
+    limit = CHAT_SUMMARY_TOKENS * 4
+    return text[-limit:].strip()
+
+
+conversation = ConversationContext()
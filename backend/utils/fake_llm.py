@@ -0,0 +1,92 @@
+# fake_llm.py - model tiruan Gemini untuk dev/test offline
+# Aktifkan dengan EDUMATE_FAKE_LLM=1 (tidak butuh API key / SDK).
+import json
+import os
+import random
+import re
+import time
+
+FAKE_LLM_ENABLED = os.getenv("EDUMATE_FAKE_LLM", "0") == "1"
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", 0))          # detik sebelum token pertama
+FAKE_LLM_TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", 0))  # detik per token
+FAKE_LLM_FAIL_RATE = float(os.getenv("FAKE_LLM_FAIL_RATE", 0))      # peluang raise error per panggilan
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", 0))  # peluang JSON soal dirusak
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")                              # diisi -> urutan acak bisa diulang
+
+# cara model asli merusak JSON yang sering terlihat; semua harus tetap bisa ditangani parser
+MALFORMATIONS = ("fence", "prose", "trailing_comma", "truncated", "garbage")
+
+# satu generator per proses: make_model() membuat FakeModel baru tiap panggilan
+_shared_rng = random.Random(FAKE_LLM_SEED)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Meniru genai.GenerativeModel.generate_content (mode biasa dan stream=True).
+    Prompt quiz ("Buat N soal") dijawab JSON array N soal, selain itu jawaban teks.
+    """
+
+    def __init__(self, model_name="fake-llm", latency=None, token_delay=None, fail_rate=None,
+                 malformed_rate=None, seed=None):
+        self.model_name = model_name
+        self.latency = FAKE_LLM_LATENCY if latency is None else latency
+        self.token_delay = FAKE_LLM_TOKEN_DELAY if token_delay is None else token_delay
+        self.fail_rate = FAKE_LLM_FAIL_RATE if fail_rate is None else fail_rate
+        self.malformed_rate = FAKE_LLM_MALFORMED_RATE if malformed_rate is None else malformed_rate
+        self._rng = _shared_rng if seed is None else random.Random(seed)
+
+    def reply_for(self, prompt):
+        m = re.search(r"Buat (\d+) soal pilihan ganda tentang topik '([^']*)'", prompt)
+        if m:
+            total, topic = int(m.group(1)), m.group(2)
+            part = re.search(r"Ini bagian (\d+)", prompt)
+            prefix = f"bagian {part.group(1)} " if part else ""
+            text = json.dumps([
+                {
+                    "q": f"Soal {topic} {prefix}nomor {i + 1}?",
+                    "options": [f"Opsi {c} {i + 1}" for c in "ABCD"],
+                    "answer": "ABCD"[i % 4],
+                }
+                for i in range(total)
+            ], ensure_ascii=False)
+            if self.malformed_rate and self._rng.random() < self.malformed_rate:
+                text = self.malform(text, self._rng.choice(MALFORMATIONS))
+            return text
+        m = re.search(r"Pertanyaan: (.*)", prompt)
+        question = m.group(1).strip() if m else prompt[-80:]
+        return f"Ini jawaban tutor untuk: {question}. Semoga membantu!"
+
+    def malform(self, text, kind):
+        if kind == "fence":
+            return f"```json\n{text}\n```"
+        if kind == "prose":
+            return f"Berikut soal-soalnya:\n{text}\nSemoga bermanfaat!"
+        if kind == "trailing_comma":
+            return text[:-1] + ",]"
+        if kind == "truncated":  # output terpotong max_output_tokens di tengah soal terakhir
+            return text[: max(1, int(len(text) * 0.8))]
+        return "Maaf, saya tidak bisa membuat soal itu."  # garbage: tidak ada JSON sama sekali
+
+    def _tokens(self, text):
+        return re.findall(r"\S+\s*", text)
+
+    def _stream(self, text):
+        time.sleep(self.latency)
+        for tok in self._tokens(text):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield FakeResponse(tok)
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            raise RuntimeError(f"{self.model_name}: simulated failure")
+        text = self.reply_for(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency + self.token_delay * len(self._tokens(text)))
+        return FakeResponse(text)
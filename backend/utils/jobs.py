@@ -0,0 +1,146 @@
+# jobs.py - antrian job di SQLite + pool worker thread (mis. generate quiz di luar request HTTP)
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from models import job_claim, job_enqueue, job_fail, job_finish, job_get
+from utils.log import get_logger, request_id_var
+
+log = get_logger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))                 # thread worker per proses (0 = hanya enqueue)
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))     # cek job dari proses lain / status di DB
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))  # job running lebih lama dari ini diambil ulang
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 2))       # detik x percobaan ke-n sebelum dicoba lagi
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", 25))            # long-poll maksimal (di bawah timeout proxy 30 detik)
+
+FINISHED = ("done", "failed")
+
+queues = {}  # kind -> JobQueue, untuk stats / worker CLI
+
+
+class JobQueue:
+    """
+    Antrian per `kind` di tabel jobs:
+    - enqueue() langsung return job_id; permintaan identik yang masih in-flight ikut job yang sama
+    - worker (thread di proses web, atau `manage.py jobs-worker` terpisah) mengambil job
+      dengan BEGIN IMMEDIATE + lease, jadi aman dijalankan di banyak proses sekaligus
+    - wait() untuk long-poll: dibangunkan langsung kalau job selesai di proses yang sama,
+      selain itu cek DB tiap JOB_POLL_SECONDS
+    """
+
+    def __init__(self, kind, handler, workers=JOB_WORKERS):
+        self.kind = kind
+        self.handler = handler  # handler(params) -> dict hasil (JSON)
+        self.workers = workers
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._finished = threading.Condition(threading.Lock())
+        self.processed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        queues[kind] = self
+
+    def start(self):
+        """Nyalakan thread worker (idempotent; setelah fork gunicorn dinyalakan ulang per proses)."""
+        with self._lock:
+            if self.workers <= 0 or (self._pid == os.getpid() and all(t.is_alive() for t in self._threads)):
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"job-{self.kind}-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def enqueue(self, params, dedupe_key=None, username=None):
+        """Return (job_id, created). created=False: ikut job identik yang sudah berjalan."""
+        job_id, created = job_enqueue(uuid.uuid4().hex, self.kind, params, dedupe_key, username)
+        if created:
+            self.start()
+            with self._wakeup:
+                self._wakeup.notify()
+        else:
+            self.deduplicated += 1
+        return job_id, created
+
+    def get(self, job_id):
+        job = job_get(job_id)
+        return job if job and job["kind"] == self.kind else None
+
+    def wait(self, job_id, timeout):
+        """Tunggu sampai job selesai atau `timeout` detik (dibatasi JOB_MAX_WAIT). Return job / None."""
+        deadline = time.monotonic() + min(max(timeout, 0), JOB_MAX_WAIT)
+        self.start()  # job bisa saja di-enqueue proses lain yang sudah mati
+        job = self.get(job_id)
+        while job is not None and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._finished:
+                self._finished.wait(min(remaining, JOB_POLL_SECONDS))
+            job = self.get(job_id)
+        return job
+
+    def run_once(self, worker_name=None):
+        """Ambil dan jalankan satu job. Return True kalau ada job yang dikerjakan."""
+        job = job_claim(self.kind, worker_name or f"{socket.gethostname()}:{os.getpid()}",
+                        JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+        if job is None:
+            return False
+        token = request_id_var.set(f"job:{job['id'][:12]}")  # log handler ikut menyebut job-nya
+        start = time.perf_counter()
+        try:
+            result = self.handler(json.loads(job["params"]))
+            job_finish(job["id"], result)
+            self.processed += 1
+            log.info("job selesai", extra={"data": {
+                "kind": self.kind, "job": job["id"], "seconds": round(time.perf_counter() - start, 3)}})
+        except Exception as e:
+            retry = job["attempts"] < JOB_MAX_ATTEMPTS
+            job_fail(job["id"], str(e), JOB_RETRY_DELAY * job["attempts"] if retry else None)
+            if not retry:
+                self.failed += 1
+            log.exception("job gagal", extra={"data": {"kind": self.kind, "job": job["id"], "retry": retry}})
+        finally:
+            request_id_var.reset(token)
+            with self._finished:
+                self._finished.notify_all()
+        return True
+
+    def _run(self):
+        name = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        while True:
+            try:
+                if self.run_once(name):
+                    continue
+            except Exception:
+                log.exception("worker job error", extra={"data": {"kind": self.kind}})
+            with self._wakeup:
+                self._wakeup.wait(JOB_POLL_SECONDS)
+
+    def run_forever(self):
+        """Proses worker terpisah (manage.py jobs-worker): nyalakan pool lalu tunggu selamanya."""
+        self.workers = max(self.workers, 1)
+        self.start()
+        while True:
+            time.sleep(60)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+        }
+
+
+def stats():
+    return {kind: q.stats() for kind, q in queues.items()}
@@ -0,0 +1,181 @@
+# json_stream.py - parser JSON inkremental untuk output soal dari model
+# Dipanggil per potongan teks (streaming); tiap objek soal yang sudah tertutup
+# langsung dikembalikan tanpa menunggu seluruh respons.
+import json
+import re
+
+_SMART_QUOTES = (("“", '"'), ("”", '"'), ("‘", "'"), ("’", "'"))
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_OUTSIDE = re.compile(r"[\[{]")
+_IN_OBJECT = re.compile(r'[{}"]')
+_IN_STRING = re.compile(r'["\\\r\n]')
+_DECODER = json.JSONDecoder()
+_FULL_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+
+def validate_item(item):
+    """
+    Skema soal: q (teks), options (list >= 2), answer (tidak kosong).
+    Alias question/choices/correct diterima. Return dict ternormalisasi atau None.
+    """
+    if not isinstance(item, dict):
+        return None
+    q = item.get("q") or item.get("question")
+    options = item.get("options") or item.get("choices")
+    answer = item.get("answer") or item.get("correct")
+    if not isinstance(q, str) or not q.strip():
+        return None
+    if not isinstance(options, list) or len([o for o in options if str(o).strip()]) < 2:
+        return None
+    if answer is None or not str(answer).strip():
+        return None
+    return {"q": q.strip(), "options": options, "answer": answer}
+
+
+class QuizStreamParser:
+    """
+    State machine satu kali jalan (O(n) total, tidak scan ulang):
+    - melacak kedalaman {} dan status di-dalam-string / escape
+    - objek level teratas (soal) di-decode begitu kurung tutupnya datang
+    - kutip miring diganti kutip biasa, newline mentah di dalam string jadi spasi,
+      trailing comma dibuang; teks di luar objek (```json, penjelasan) diabaikan
+    - objek terakhir yang terpotong (truncated) dibuang saat close()
+    """
+
+    def __init__(self, validate=validate_item):
+        self.validate = validate
+        self._buf = []          # karakter objek yang sedang dibaca
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.seen_array = False
+        self.items = 0
+        self.rejected = 0
+
+    def feed(self, chunk):
+        # lompat langsung ke karakter penting (regex), bukan loop per karakter
+        text = chunk or ""
+        for smart, plain in _SMART_QUOTES:  # str.replace jauh lebih cepat dari translate
+            if smart in text:
+                text = text.replace(smart, plain)
+        out, buf = [], self._buf
+        i, n = 0, len(text)
+        while i < n:
+            if self._depth == 0:
+                m = _OUTSIDE.search(text, i)
+                if not m:
+                    break
+                if m.group() == "[":
+                    self.seen_array = True
+                    i = m.end()
+                    continue
+                # jalur cepat: objek utuh & valid di chunk ini -> decode di C sekaligus
+                try:
+                    obj, i = _DECODER.raw_decode(text, m.start())
+                    out.extend(self._accept(obj))
+                    continue
+                except ValueError:
+                    pass
+                i = m.end()
+                self._depth = 1
+                buf = self._buf = ["{"]
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    buf.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                m = _IN_STRING.search(text, i)
+                if not m:
+                    buf.append(text[i:])
+                    break
+                buf.append(text[i:m.start()])
+                c = m.group()
+                if c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                else:
+                    c = " "  # newline mentah di dalam string -> spasi
+                buf.append(c)
+                i = m.end()
+                continue
+
+            m = _IN_OBJECT.search(text, i)
+            if not m:
+                buf.append(text[i:])
+                break
+            c = m.group()
+            if c == '"':
+                # string utuh dalam chunk ini: telan sekaligus
+                full = _FULL_STRING.match(text, m.start())
+                if full:
+                    buf.append(text[i:m.start()])
+                    buf.append(full.group().replace("\r", " ").replace("\n", " "))
+                    i = full.end()
+                else:
+                    buf.append(text[i:m.end()])
+                    i = m.end()
+                    self._in_string = True
+                continue
+
+            buf.append(text[i:m.end()])
+            i = m.end()
+            if c == "{":
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if self._depth == 0:
+                out.extend(self._decode("".join(buf)))
+                buf = self._buf = []
+        return out
+
+    def _decode(self, text):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            try:
+                obj = json.loads(_TRAILING_COMMA.sub(r"\1", text))
+            except ValueError:
+                self.rejected += 1
+                return []
+        return self._accept(obj)
+
+    def _accept(self, obj):
+        if not self.validate:
+            self.items += 1
+            return [obj]
+        item = self.validate(obj)
+        if item is not None:
+            self.items += 1
+            return [item]
+        # pembungkus seperti {"questions": [...]}: ambil soal di dalamnya
+        nested = [
+            self.validate(x) for v in (obj.values() if isinstance(obj, dict) else [])
+            if isinstance(v, list) for x in v
+        ]
+        nested = [x for x in nested if x is not None]
+        if not nested:
+            self.rejected += 1
+        self.items += len(nested)
+        return nested
+
+    def close(self):
+        """Akhir stream. Objek yang belum tertutup dianggap terpotong dan dibuang."""
+        truncated = self._depth > 0
+        self._buf = []
+        self._depth = 0
+        self._in_string = self._escape = False
+        if truncated:
+            self.rejected += 1
+        return []
+
+
+def iter_quiz_items(chunks, validate=validate_item):
+    """Generator: potongan teks -> soal valid, begitu masing-masing selesai."""
+    parser = QuizStreamParser(validate)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,264 @@
+# llm_client.py - client LLM: model dipakai ulang, deadline, backoff, circuit breaker
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.log import get_logger, submit_with_context
+from utils.metrics import llm_fallbacks, llm_output_tokens, llm_request_seconds, llm_retries
+
+log = get_logger(__name__)
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))                  # deadline total per panggilan (detik)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))                     # percobaan per model
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))     # panggilan paralel per proses
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", 15))  # jeda maksimal antar potongan stream
+LLM_STREAM_TIMEOUT = float(os.getenv("LLM_STREAM_TIMEOUT", 120))          # durasi maksimal satu stream
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 3))  # gagal beruntun -> model dilewati
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 60))
+
+
+_END = object()  # penanda iterator stream habis (next(it, _END))
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class LLMOverloaded(LLMError):
+    """Slot konkurensi penuh sampai deadline habis."""
+
+
+class CircuitBreaker:
+    """Per model: setelah N gagal beruntun, model dilewati selama cooldown."""
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def is_open(self, name):
+        with self._lock:
+            return self._open_until.get(name, 0) > time.monotonic()
+
+    def success(self, name):
+        with self._lock:
+            self._failures.pop(name, None)
+            self._open_until.pop(name, None)
+
+    def failure(self, name):
+        with self._lock:
+            n = self._failures.get(name, 0) + 1
+            self._failures[name] = n
+            if n >= self.threshold:
+                self._open_until[name] = time.monotonic() + self.cooldown
+                return True
+        return False
+
+    def state(self):
+        now = time.monotonic()
+        with self._lock:
+            return {name: "open" for name, until in self._open_until.items() if until > now}
+
+
+class LLMClient:
+    """
+    Satu instance per proses.
+    - model_factory(name) dipanggil sekali per model, hasilnya dipakai ulang
+    - deadline per panggilan, retry dengan exponential backoff + jitter
+    - circuit breaker: kalau model gagal terus, turun ke model berikutnya di `models`
+    - semaphore membatasi panggilan paralel supaya worker tidak habis menunggu LLM
+    """
+
+    def __init__(self, models, model_factory, timeout=LLM_TIMEOUT, retries=LLM_RETRIES,
+                 max_concurrency=LLM_MAX_CONCURRENCY, breaker=None):
+        self._models = models  # list, atau callable yang mengembalikan list (urutan bisa berubah)
+        self.model_factory = model_factory
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._instances = {}
+        self._instances_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+    @property
+    def models(self):
+        return list(self._models() if callable(self._models) else self._models)
+
+    # ---------- helper ----------
+    def _model(self, name):
+        with self._instances_lock:
+            model = self._instances.get(name)
+            if model is None:
+                model = self._instances[name] = self.model_factory(name)
+            return model
+
+    def _candidates(self):
+        ready = [m for m in self.models if not self.breaker.is_open(m)]
+        # semua breaker terbuka: tetap coba model utama (half-open)
+        return ready or self.models[:1]
+
+    @staticmethod
+    def backoff(attempt):
+        delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _acquire(self, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMOverloaded("Semua slot LLM sedang dipakai")
+
+    def _call(self, name, prompt, config, deadline):
+        self._acquire(deadline)
+        try:
+            future = submit_with_context(
+                self._executor, lambda: self._model(name).generate_content(prompt, generation_config=config)
+            )
+        except Exception:
+            self._slots.release()
+            raise
+        # slot dilepas saat panggilan benar-benar selesai, bukan saat kita berhenti menunggu
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            response = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            raise LLMTimeout(f"{name}: melewati deadline")
+        return (getattr(response, "text", None) or "").strip()
+
+    # ---------- API ----------
+    def generate(self, prompt, max_output_tokens=2048, retries=None, timeout=None):
+        """Return teks (tidak kosong) atau raise LLMError."""
+        retries = retries or self.retries
+        deadline = time.monotonic() + (timeout or self.timeout)
+        config = {"max_output_tokens": max_output_tokens}
+        last_error = None
+
+        previous = None
+        for name in self._candidates():
+            if previous is not None:
+                llm_fallbacks.inc(previous)
+            previous = name
+            for attempt in range(retries):
+                if time.monotonic() >= deadline:
+                    raise LLMTimeout(f"Deadline habis: {last_error}")
+                if attempt:
+                    llm_retries.inc(name)
+                start = time.perf_counter()
+                try:
+                    text = self._call(name, prompt, config, deadline)
+                    if text:
+                        llm_request_seconds.observe(time.perf_counter() - start, name, "ok")
+                        llm_output_tokens.inc(name, amount=len(text) // 4)
+                        self.breaker.success(name)
+                        return text
+                    llm_request_seconds.observe(time.perf_counter() - start, name, "empty")
+                    last_error = LLMError(f"{name}: output kosong/terpotong")
+                    log.warning("output kosong/terpotong", extra={"data": {"model": name, "attempt": attempt + 1, "retries": retries}})
+                except LLMOverloaded:
+                    raise
+                except Exception as e:
+                    outcome = "timeout" if isinstance(e, LLMTimeout) else "error"
+                    llm_request_seconds.observe(time.perf_counter() - start, name, outcome)
+                    last_error = e
+                    log.warning("panggilan LLM gagal", extra={"data": {"model": name, "attempt": attempt + 1, "error": str(e)}})
+                    if self.breaker.failure(name):
+                        log.warning("circuit breaker terbuka, pindah model", extra={"data": {"model": name}})
+                        break
+                if attempt + 1 < retries:
+                    time.sleep(min(self.backoff(attempt), max(0.0, deadline - time.monotonic())))
+
+        raise LLMError(str(last_error) if last_error else "Tidak ada model tersedia")
+
+    def _open_stream(self, name, prompt, config):
+        return iter(self._model(name).generate_content(prompt, generation_config=config, stream=True))
+
+    @staticmethod
+    def _wait(future, deadline, name):
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            raise LLMTimeout(f"{name}: stream macet melewati deadline") from None
+
+    def stream(self, prompt, max_output_tokens=2048, timeout=None):
+        """
+        Generator potongan teks. Gagal SEBELUM token pertama -> coba model berikutnya;
+        gagal setelah token mulai mengalir -> error diteruskan ke pemanggil.
+        Token pertama harus datang dalam `timeout` (LLM_TIMEOUT), jeda antar potongan
+        maksimal LLM_STREAM_IDLE_TIMEOUT, seluruh stream maksimal LLM_STREAM_TIMEOUT.
+        Tiap potongan diambil lewat executor supaya stream yang macet tidak menahan
+        slot + worker gunicorn tanpa batas.
+        """
+        start_at = time.monotonic()
+        first_deadline = start_at + (timeout or self.timeout)
+        stream_deadline = start_at + max(LLM_STREAM_TIMEOUT, timeout or self.timeout)
+        config = {"max_output_tokens": max_output_tokens}
+        self._acquire(first_deadline)
+        pending = None  # future yang masih jalan di executor saat kita berhenti menunggu
+        try:
+            last_error = None
+            for i, name in enumerate(self._candidates()):
+                if i:
+                    llm_fallbacks.inc(previous)
+                previous = name
+                started = False
+                chars = 0
+                start = time.perf_counter()
+                try:
+                    pending = submit_with_context(self._executor, self._open_stream, name, prompt, config)
+                    chunks = self._wait(pending, first_deadline, name)
+                    while True:
+                        deadline = (min(time.monotonic() + LLM_STREAM_IDLE_TIMEOUT, stream_deadline)
+                                    if started else first_deadline)
+                        pending = submit_with_context(self._executor, next, chunks, _END)
+                        chunk = self._wait(pending, deadline, name)
+                        if chunk is _END:
+                            break
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            started = True
+                            chars += len(text)
+                            yield text
+                    llm_request_seconds.observe(time.perf_counter() - start, name, "ok")
+                    llm_output_tokens.inc(name, amount=chars // 4)
+                    self.breaker.success(name)
+                    return
+                except GeneratorExit:
+                    llm_request_seconds.observe(time.perf_counter() - start, name, "cancelled")
+                    raise
+                except LLMTimeout:
+                    llm_request_seconds.observe(time.perf_counter() - start, name, "timeout")
+                    log.warning("stream LLM timeout", extra={"data": {"model": name, "started": started, "chars": chars}})
+                    if not started:
+                        self.breaker.failure(name)
+                    raise  # deadline sudah lewat: model berikutnya tidak punya waktu lagi
+                except Exception as e:
+                    llm_request_seconds.observe(time.perf_counter() - start, name, "error")
+                    if started:
+                        raise
+                    last_error = e
+                    log.warning("stream LLM gagal", extra={"data": {"model": name, "error": str(e)}})
+                    self.breaker.failure(name)
+            raise LLMError(str(last_error) if last_error else "Tidak ada model tersedia")
+        finally:
+            if pending is not None and not pending.done():
+                # sama seperti _call: slot dilepas saat panggilan yang macet benar-benar selesai
+                pending.add_done_callback(lambda _: self._slots.release())
+            else:
+                self._slots.release()
+
+    async def agenerate(self, prompt, max_output_tokens=2048, retries=None, timeout=None):
+        """Versi asyncio: tidak memblok event loop."""
+        return await asyncio.to_thread(self.generate, prompt, max_output_tokens, retries, timeout)
+
+    def stats(self):
+        return {"models": self.models, "breaker": self.breaker.state()}
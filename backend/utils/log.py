@@ -0,0 +1,176 @@
+# log.py - logging terstruktur (JSON) lewat antrian, supaya request tidak menunggu stdout
+# Pemakaian di modul: `log = get_logger(__name__)` lalu `log.info("pesan", extra={"data": {...}})`.
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")                   # per modul: "utils.ai_helper=DEBUG,models=WARNING"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")               # json | text
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", 0.05))  # porsi payload debug yang benar-benar ditulis
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", 500))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))   # penuh -> record dibuang, request tidak diblok
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+
+class _TextDefaults(logging.Filter):
+    """Format teks: pastikan field request_id/data selalu ada."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        record.data = getattr(record, "data", None) or ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        data = getattr(record, "data", None)
+        if data:
+            entry["data"] = data
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler yang tidak pernah memblok: antrian penuh -> record dibuang & dihitung."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record):
+        # request_id harus diambil di thread pemanggil, bukan di thread listener
+        record = copy.copy(record)
+        record.request_id = request_id_var.get()
+        # QueueHandler bawaan melebur traceback ke msg; di sini traceback dirender ke exc_text
+        # (objek exception tidak dibawa ke thread lain) supaya formatter tetap bisa menaruhnya di "exc"
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, level = part.partition("=")
+        if level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=None, levels=None, fmt=None, stream=None):
+    """Pasang handler antrian di root logger (sekali per proses, idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    target = logging.StreamHandler(stream or sys.stdout)
+    if (fmt or LOG_FORMAT) == "json":
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s %(data)s"))
+        target.addFilter(_TextDefaults())
+
+    q = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [_DroppingQueueHandler(q)]
+    root.setLevel(level or LOG_LEVEL)
+    for name, lvl in _parse_levels(LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(name).setLevel(lvl)
+    # werkzeug menulis access log sendiri; cukup warning ke atas
+    logging.getLogger("werkzeug").setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(q, target, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit yang membawa contextvars (request_id) ke thread worker."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def log_payload(logger, msg, payload, sample=None, **data):
+    """
+    Debug berisi payload besar (mis. output mentah model): hanya kalau level DEBUG aktif,
+    di-sampling (LOG_DEBUG_SAMPLE) dan dipotong LOG_PAYLOAD_CHARS karakter.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= (LOG_DEBUG_SAMPLE if sample is None else sample):
+        return
+    text = str(payload)
+    data["payload"] = text[:LOG_PAYLOAD_CHARS]
+    data["payload_len"] = len(text)
+    logger.debug(msg, extra={"data": data})
+
+
+def init_app(app):
+    """Request ID dari header X-Request-ID (atau baru), dikirim balik di response."""
+    from flask import g, request
+
+    @app.before_request
+    def _assign_request_id():
+        rid = (request.headers.get("X-Request-ID") or "")[:64] or uuid.uuid4().hex[:16]
+        g.request_id = rid
+        g._log_start = time.perf_counter()
+        g._log_token = request_id_var.set(rid)
+
+    @app.after_request
+    def _send_request_id(response):
+        rid = g.get("request_id")
+        if rid:
+            response.headers["X-Request-ID"] = rid
+            start = g.get("_log_start")
+            logging.getLogger("edumate.request").debug("request selesai", extra={"data": {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "ms": round((time.perf_counter() - start) * 1000, 2) if start else None,
+            }})
+        return response
+
+    @app.teardown_request
+    def _clear_request_id(exc=None):
+        # teardown jalan setelah stream SSE selesai, jadi log generator tetap punya request_id
+        token = g.pop("_log_token", None)
+        if token is not None:
+            try:
+                request_id_var.reset(token)
+            except ValueError:  # context berbeda (mis. thread lain)
+                request_id_var.set(None)
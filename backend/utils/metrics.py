@@ -0,0 +1,227 @@
+# metrics.py - metrik format Prometheus (text exposition) tanpa dependency tambahan
+# Per proses: di gunicorn dengan banyak worker, tiap worker punya angka sendiri.
+import functools
+import logging
+import math
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class Histogram:
+    """Bucket kumulatif saat export; saat observe cukup satu increment (murah di hot path)."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts per bucket (+Inf terakhir), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _num(bound))])} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {running}"
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge:
+    """Nilai dibaca saat export lewat callback -> {label tuple: nilai}."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels, callback):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.callback = callback
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        try:
+            values = self.callback()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"{self.type} gagal dibaca", extra={"data": {"metric": self.name, "error": str(e)}})
+            return
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class CallbackCounter(Gauge):
+    """Seperti Gauge, tapi untuk total kumulatif yang sudah dihitung di tempat lain (stats())."""
+
+    type = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "edumate_http_request_seconds", "Latensi request HTTP (SSE: sampai header terkirim)",
+    ("method", "route", "status")))
+db_query_seconds = registry.register(Histogram(
+    "edumate_db_query_seconds", "Durasi fungsi models.py (query SQLite)", ("function",), DB_BUCKETS))
+llm_request_seconds = registry.register(Histogram(
+    "edumate_llm_request_seconds", "Latensi panggilan LLM per model", ("model", "outcome")))
+llm_output_tokens = registry.register(Counter(
+    "edumate_llm_output_tokens_total", "Perkiraan token output LLM (4 karakter ~ 1 token)", ("model",)))
+llm_retries = registry.register(Counter(
+    "edumate_llm_retries_total", "Percobaan ulang panggilan LLM", ("model",)))
+llm_fallbacks = registry.register(Counter(
+    "edumate_llm_fallbacks_total", "Pindah ke model cadangan", ("from_model",)))
+quiz_parse = registry.register(Counter(
+    "edumate_quiz_parse_total", "Hasil parse_possible_json per jalur", ("path",)))
+quiz_parse_items = registry.register(Counter(
+    "edumate_quiz_parse_items_total", "Soal hasil parse: diterima / dibuang", ("result",)))
+
+
+def timed_module(namespace, histogram=db_query_seconds, exclude=()):
+    """
+    Bungkus semua fungsi publik yang didefinisikan di modul (mis. models.py) dengan
+    timer. Dipanggil sekali di akhir modul: `timed_module(globals())`.
+    """
+    if not METRICS_ENABLED:
+        return
+    module = namespace.get("__name__")
+    for name, fn in list(namespace.items()):
+        if name.startswith("_") or name in exclude or not callable(fn) or getattr(fn, "__module__", None) != module:
+            continue
+        if isinstance(fn, type):
+            continue
+        namespace[name] = _timed(fn, histogram)
+
+
+def _timed(fn, histogram):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def init_app(app):
+    """Latensi per route (url_rule, bukan path asli supaya label tidak meledak)."""
+    if not METRICS_ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_request_seconds.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+        return response
+
+
+def register_cache(name, stats):
+    """Hit ratio cache (ai_cache, quiz_cache, ...) dari fungsi stats() masing-masing."""
+    registry.register(Gauge(
+        f"edumate_{name}_hit_ratio", f"Hit ratio {name}", (), lambda: {(): stats()["hit_ratio"]}))
+    registry.register(CallbackCounter(
+        f"edumate_{name}_requests_total", f"Hit / miss {name} sejak proses mulai", ("result",),
+        lambda: {("hit",): stats()["hits"], ("miss",): stats()["misses"]}))
+
+
+def render():
+    return registry.render()
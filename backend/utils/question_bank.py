@@ -0,0 +1,171 @@
+# question_bank.py - bank soal + worker pengisi ulang di background
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from models import bank_add_questions, bank_count, bank_sample
+from utils.ai_helper import generate_quiz_questions, parse_possible_json
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+BANK_TARGET = int(os.getenv("QUESTION_BANK_TARGET", 60))        # stok ideal per kategori
+BANK_LOW_WATERMARK = int(os.getenv("QUESTION_BANK_LOW", 30))    # di bawah ini -> isi ulang
+BANK_BATCH = int(os.getenv("QUESTION_BANK_BATCH", 15))          # soal per panggilan Gemini
+BANK_SWEEP_SECONDS = float(os.getenv("QUESTION_BANK_SWEEP", 300))
+BANK_POPULAR_TOP = int(os.getenv("QUESTION_BANK_POPULAR_TOP", 5))
+BANK_WORKER_ENABLED = os.getenv("QUESTION_BANK_WORKER", "1") != "0"
+BANK_DEMAND_MAX = int(os.getenv("QUESTION_BANK_DEMAND_MAX", 1000))  # key (kategori, tingkat) yang dilacak
+# tingkat kesulitan yang dihitung popularitasnya; input bebas lain tidak ikut dilacak
+BANK_DIFFICULTIES = frozenset(
+    d.strip().lower() for d in os.getenv("QUESTION_BANK_DIFFICULTIES", ",mudah,sedang,sulit,easy,medium,hard").split(",")
+)
+
+
+def clean_questions(parsed):
+    """
+    Rapikan hasil parse_possible_json jadi [{"q", "options", "answer"}]:
+    - jawaban huruf A-D dipetakan ke teks opsi
+    - soal fallback dummy dibuang (jangan sampai masuk bank)
+    """
+    questions = []
+    for item in parsed:
+        q_text = item.get("q") or item.get("question") or ""
+        if not q_text or q_text.startswith("[Fallback]"):
+            continue
+        options = item.get("options") or item.get("choices") or []
+        answer = item.get("answer") or item.get("correct") or ""
+
+        options = [str(o).strip() for o in options if str(o).strip()]
+        if not options:
+            options = ["True", "False", "Not sure", "Maybe"]
+
+        ans_raw = str(answer).strip()
+        if len(ans_raw) == 1 and ans_raw.upper() in ["A", "B", "C", "D"]:
+            map_idx = ord(ans_raw.upper()) - ord("A")
+            answer_text = options[map_idx] if 0 <= map_idx < len(options) else options[0]
+        else:
+            found = None
+            for opt in options:
+                if opt.lower() in ans_raw.lower() or ans_raw.lower() in opt.lower():
+                    found = opt
+                    break
+            answer_text = found if found else (options[0] if options else "")
+
+        questions.append({"q": q_text, "options": options, "answer": answer_text})
+    return questions
+
+
+def refill(category, difficulty="", batch=BANK_BATCH):
+    """Generate satu batch soal baru lalu simpan ke bank. Return jumlah soal baru."""
+    raw = generate_quiz_questions(category, total=batch, difficulty=difficulty, refresh=True)
+    try:
+        questions = clean_questions(parse_possible_json(raw))
+    except Exception as e:
+        log.warning("parse bank gagal", extra={"data": {"category": category, "error": str(e)}})
+        return 0
+    return bank_add_questions(category, difficulty, questions)
+
+
+class RefillWorker:
+    """
+    Satu thread daemon per proses:
+    - antrian on-demand (kategori yang stoknya menipis)
+    - sweep periodik untuk kategori paling populer
+    Kategori yang sudah antri tidak diantrikan dua kali.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_sweep = time.monotonic()
+        self.demand = Counter()  # (kategori, tingkat) -> jumlah permintaan; dijaga _lock
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="question-bank-refill", daemon=True)
+                self._thread.start()
+
+    def request(self, category, difficulty=""):
+        key = ((category or "").strip().lower(), difficulty or "")
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(key)
+        self.start()
+
+    def record_demand(self, category, difficulty=""):
+        difficulty = difficulty or ""
+        if difficulty not in BANK_DIFFICULTIES:
+            return
+        key = ((category or "").strip().lower(), difficulty)
+        with self._lock:
+            self.demand[key] += 1
+            if len(self.demand) > BANK_DEMAND_MAX:
+                self._decay()
+
+    def _decay(self):
+        # dipanggil dengan _lock: hitungan dibagi dua, key yang jadi 0 dibuang -> ukuran terbatas,
+        # kategori yang lama tidak diminta pelan-pelan hilang dari daftar populer
+        for key, count in list(self.demand.items()):
+            if count // 2:
+                self.demand[key] = count // 2
+            else:
+                del self.demand[key]
+        while len(self.demand) > BANK_DEMAND_MAX:
+            del self.demand[min(self.demand, key=self.demand.get)]
+
+    def _fill_to_target(self, category, difficulty):
+        # berhenti kalau sudah cukup atau batch tidak menambah soal baru (model mengulang)
+        while bank_count(category, difficulty) < BANK_TARGET:
+            if refill(category, difficulty) == 0:
+                break
+
+    def _sweep(self):
+        with self._lock:
+            popular = self.demand.most_common(BANK_POPULAR_TOP)
+            self._decay()
+        for (category, difficulty), _ in popular:
+            if bank_count(category, difficulty) < BANK_TARGET:
+                self.request(category, difficulty)
+
+    def _run(self):
+        while True:
+            try:
+                key = self._queue.get(timeout=BANK_SWEEP_SECONDS)
+            except queue.Empty:
+                key = None
+            try:
+                if key is not None:
+                    self._fill_to_target(*key)
+                if time.monotonic() - self._last_sweep >= BANK_SWEEP_SECONDS:
+                    self._last_sweep = time.monotonic()
+                    self._sweep()
+            except Exception as e:
+                log.exception("refill bank gagal")
+            finally:
+                if key is not None:
+                    with self._lock:
+                        self._pending.discard(key)
+
+
+refill_worker = RefillWorker()
+
+
+def take_from_bank(category, difficulty, total):
+    """
+    Jalur cepat pembuatan quiz: sampling dari bank (baca DB lokal saja).
+    Return list soal, atau None kalau stok kurang. Stok menipis -> isi ulang di background.
+    """
+    refill_worker.record_demand(category, difficulty)
+
+    questions = bank_sample(category, difficulty, total)
+    if BANK_WORKER_ENABLED and bank_count(category, difficulty) - total < BANK_LOW_WATERMARK:
+        refill_worker.request(category, difficulty)
+    return questions
@@ -0,0 +1,230 @@
+# quiz_cache.py - cache in-process quiz yang sudah "dikompilasi" untuk GET soal & grading
+# Quiz tidak berubah setelah dibuat, jadi aman di-cache tanpa invalidasi.
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", 512))                         # maks jumlah quiz
+QUIZ_CACHE_MAX_BYTES = int(os.getenv("QUIZ_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # perkiraan memori
+
+LETTERS = "ABCD"
+
+
+def norm(s) -> str:
+    return str(s or "").strip().lower()
+
+
+def _sizeof(obj):
+    """Perkiraan kasar ukuran objek (rekursif untuk dict/list/set/tuple)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_sizeof(x) for x in obj)
+    return size
+
+
+class CompiledQuiz:
+    """
+    Soal quiz siap pakai:
+    - `questions`: format yang sama dengan models.get_quiz_questions (options sudah list)
+    - `accepted[i]`: jawaban ternormalisasi yang dianggap benar untuk soal i
+      (teks jawaban, plus teks opsi kalau jawaban tersimpan berupa huruf A-D)
+    """
+
+    __slots__ = ("quiz_id", "questions", "accepted", "option_index", "nbytes")
+
+    def __init__(self, quiz_id, questions):
+        self.quiz_id = quiz_id
+        self.questions = questions
+        self.accepted = []
+        self.option_index = []  # per soal: opsi ternormalisasi -> posisi opsi (statistik distraktor)
+        for q in questions:
+            answer = str(q.get("answer") or "").strip()
+            accepted = {norm(answer)}
+            # fleksibilitas: jika correct_answer cuma huruf A/B/C/D
+            if len(answer) == 1 and answer.upper() in LETTERS:
+                idx = LETTERS.index(answer.upper())
+                opts = q.get("options") or []
+                if 0 <= idx < len(opts):
+                    accepted.add(norm(opts[idx]))
+            accepted.discard("")
+            self.accepted.append(frozenset(accepted))
+            index = {}
+            for pos, opt in enumerate(q.get("options") or []):
+                index.setdefault(norm(opt), pos)
+            self.option_index.append(index)
+        self.nbytes = _sizeof(self.questions) + _sizeof(self.accepted) + _sizeof(self.option_index)
+
+    @classmethod
+    def from_created(cls, quiz_id, questions):
+        """Dari list soal saat quiz dibuat (key q/options/answer), sama seperti yang disimpan ke DB."""
+        return cls(quiz_id, [
+            {
+                "index": idx,
+                "question": item.get("q") or item.get("question"),
+                "options": list(item.get("options") or item.get("choices") or []),
+                "answer": item.get("answer"),
+            }
+            for idx, item in enumerate(questions)
+        ])
+
+    def as_created(self):
+        """Soal dalam bentuk yang sama dengan response POST /api/quiz ({"index", "q", "options", "answer"})."""
+        return [
+            {"index": q["index"], "q": q["question"], "options": q["options"], "answer": q["answer"]}
+            for q in self.questions
+        ]
+
+    def grade(self, answers):
+        """answers: {"<index>": jawaban}. Return (correct, wrong, details)."""
+        correct = 0
+        details = []
+        for q, accepted in zip(self.questions, self.accepted):
+            user_ans = str(answers.get(str(q["index"])) or "").strip()
+            is_correct = norm(user_ans) in accepted if user_ans else False
+            correct += is_correct
+            details.append({
+                "index": q["index"],
+                "q": q["question"],
+                "options": q["options"],
+                "user_answer": user_ans,
+                "correct_answer": str(q.get("answer") or "").strip(),
+                "correct": is_correct,
+            })
+        return correct, len(self.questions) - correct, details
+
+    def grade_many(self, submissions):
+        """
+        Grading massal satu kelas dalam satu lintasan.
+        submissions: [{"username", "answers"}]. Return (results, stats):
+        - results: [{"username", "correct", "wrong", "total", "score_percent"}]
+        - stats: per soal jumlah benar / dijawab / kosong + frekuensi tiap opsi (distraktor)
+        """
+        n = len(self.questions)
+        keys = [str(q["index"]) for q in self.questions]
+        right = [0] * n
+        blank = [0] * n
+        other = [0] * n  # jawaban yang bukan salah satu opsi
+        picks = [[0] * len(q["options"]) for q in self.questions]
+        results = []
+
+        for sub in submissions:
+            answers = sub.get("answers") or {}
+            correct = 0
+            for i in range(n):
+                ans = norm(answers.get(keys[i]))
+                if not ans:
+                    blank[i] += 1
+                    continue
+                if ans in self.accepted[i]:
+                    correct += 1
+                    right[i] += 1
+                pos = self.option_index[i].get(ans)
+                if pos is None:
+                    other[i] += 1
+                else:
+                    picks[i][pos] += 1
+            results.append({
+                "username": sub.get("username") or "anonymous",
+                "correct": correct,
+                "wrong": n - correct,
+                "total": n,
+                "score_percent": int((correct / n) * 100) if n > 0 else 0,
+            })
+
+        count = len(results)
+        stats = {
+            "submissions": count,
+            "average_score": round(sum(r["score_percent"] for r in results) / count, 2) if count else 0.0,
+            "questions": [
+                {
+                    "index": q["index"],
+                    "q": q["question"],
+                    "correct": right[i],
+                    "answered": count - blank[i],
+                    "unanswered": blank[i],
+                    "accuracy": round(right[i] / count, 4) if count else 0.0,
+                    "options": [
+                        {"option": opt, "count": picks[i][pos], "correct": norm(opt) in self.accepted[i]}
+                        for pos, opt in enumerate(q["options"])
+                    ],
+                    "other": other[i],
+                }
+                for i, q in enumerate(self.questions)
+            ],
+        }
+        return results, stats
+
+
+class QuizCache:
+    """LRU quiz_id -> CompiledQuiz, dibatasi jumlah entry dan perkiraan byte. Thread-safe."""
+
+    def __init__(self, loader, maxsize=QUIZ_CACHE_SIZE, max_bytes=QUIZ_CACHE_MAX_BYTES):
+        self.loader = loader  # quiz_id -> list soal dari DB (models.get_quiz_questions)
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, quiz):
+        with self._lock:
+            old = self._data.pop(quiz.quiz_id, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            if quiz.nbytes > self.max_bytes:
+                return
+            self._data[quiz.quiz_id] = quiz
+            self.nbytes += quiz.nbytes
+            while len(self._data) > self.maxsize or self.nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def put(self, quiz_id, questions):
+        """Dipanggil saat quiz dibuat, supaya request pertama pun tidak ke DB."""
+        quiz = CompiledQuiz.from_created(quiz_id, questions)
+        self._store(quiz)
+        return quiz
+
+    def get(self, quiz_id):
+        """Return CompiledQuiz; miss -> baca DB sekali lalu simpan. Quiz kosong tidak di-cache."""
+        with self._lock:
+            quiz = self._data.get(quiz_id)
+            if quiz is not None:
+                self._data.move_to_end(quiz_id)
+                self.hits += 1
+                return quiz
+            self.misses += 1
+        quiz = CompiledQuiz(quiz_id, self.loader(quiz_id))
+        if quiz.questions:
+            self._store(quiz)
+        return quiz
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def _load(quiz_id):
+    from models import get_quiz_questions
+    return get_quiz_questions(quiz_id)
+
+
+quiz_cache = QuizCache(_load)
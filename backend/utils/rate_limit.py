@@ -0,0 +1,204 @@
+# rate_limit.py - token bucket per user + global, dan antrian terbatas (load shedding) untuk endpoint AI
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, jsonify, make_response, request
+
+RATE_USER_PER_MIN = float(os.getenv("RATE_USER_PER_MIN", 12))     # isi ulang token per user per menit
+RATE_USER_BURST = float(os.getenv("RATE_USER_BURST", 6))
+RATE_GLOBAL_PER_MIN = float(os.getenv("RATE_GLOBAL_PER_MIN", 300))  # kuota total (semua user) per menit
+RATE_GLOBAL_BURST = float(os.getenv("RATE_GLOBAL_BURST", 60))
+RATE_PERSIST = os.getenv("RATE_PERSIST", "0") == "1"               # 1: bucket di SQLite, dibagi antar worker
+RATE_MAX_BUCKETS = int(os.getenv("RATE_MAX_BUCKETS", 100_000))      # batas bucket in-memory (LRU)
+AI_MAX_INFLIGHT = int(os.getenv("AI_MAX_INFLIGHT", 16))              # request AI yang dilayani bersamaan
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", 32))                  # yang boleh antri di belakangnya
+AI_QUEUE_WAIT = float(os.getenv("AI_QUEUE_WAIT", 5))                 # detik maksimal menunggu di antrian
+
+
+class TokenBucket:
+    """
+    Bucket in-memory per key. rate = token per detik, burst = kapasitas.
+    Bucket yang sudah terisi penuh lagi sama dengan bucket yang tidak ada, jadi dibuang;
+    sisanya dibatasi max_buckets (LRU) supaya key acak tidak menghabiskan memori.
+    """
+
+    def __init__(self, rate, burst, max_buckets=RATE_MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), urut dari yang paling lama tidak dipakai
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # dipanggil dengan _lock; depan OrderedDict = paling lama tidak diperbarui
+        while self._buckets:
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_buckets and tokens + (now - updated) * self.rate < self.burst:
+                break
+            del self._buckets[key]
+
+    def take(self, key, cost=1.0, now=None):
+        """Return 0 kalau diizinkan, selain itu detik sampai token cukup."""
+        now = now or time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / self.rate
+            self._evict(now)
+            return wait
+
+    def refund(self, key, cost=1.0):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.burst, tokens + cost), updated)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteTokenBucket:
+    """Bucket yang sama di tabel rate_buckets: limit berlaku untuk semua worker gunicorn."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+
+    def take(self, key, cost=1.0, now=None):
+        from models import rate_bucket_take
+        return rate_bucket_take(key, cost, self.rate, self.burst)
+
+    def refund(self, key, cost=1.0):
+        pass  # jarang terjadi; token kembali sendiri lewat isi ulang
+
+
+class RateLimiter:
+    """Cek bucket user dulu, lalu bucket global. Ditolak global -> token user dikembalikan."""
+
+    def __init__(self, persist=RATE_PERSIST):
+        bucket = SQLiteTokenBucket if persist else TokenBucket
+        self.user = bucket(RATE_USER_PER_MIN / 60, RATE_USER_BURST)
+        self.global_ = bucket(RATE_GLOBAL_PER_MIN / 60, RATE_GLOBAL_BURST)
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def check(self, key, cost=1.0):
+        """Return 0 kalau boleh lanjut, selain itu detik Retry-After."""
+        wait = self.user.take("user:" + key, cost)
+        if not wait:
+            wait = self.global_.take("global", cost)
+            if wait:
+                self.user.refund("user:" + key, cost)
+        if wait:
+            with self._lock:
+                self.rejected += 1
+        return wait
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Server AI sedang penuh")
+        self.retry_after = retry_after
+
+
+class AdmissionQueue:
+    """
+    Maksimal `max_inflight` request AI jalan bersamaan; `queue_size` lagi boleh menunggu
+    sampai `wait` detik. Antrian penuh -> langsung ditolak (load shedding), bukan
+    menumpuk sampai semua worker Flask habis.
+    """
+
+    def __init__(self, max_inflight=AI_MAX_INFLIGHT, queue_size=AI_QUEUE_SIZE, wait=AI_QUEUE_WAIT):
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.wait = wait
+        self.waiting = 0
+        self.shed = 0
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            if self.waiting >= self.queue_size:
+                self.shed += 1
+                raise Overloaded(self.wait)
+            self.waiting += 1
+        try:
+            if not self._slots.acquire(timeout=self.wait):
+                with self._lock:
+                    self.shed += 1
+                raise Overloaded(self.wait)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "max_inflight": self.max_inflight,
+            "queue_size": self.queue_size,
+            "waiting": self.waiting,
+            "shed": self.shed,
+        }
+
+
+rate_limiter = RateLimiter()
+admission = AdmissionQueue()
+
+
+def _too_many(msg, retry_after):
+    resp = jsonify({"error": msg, "retry_after": math.ceil(retry_after)})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+
+def ai_limited(cost=1.0):
+    """
+    Decorator untuk route yang memanggil Gemini: rate limit lalu slot antrian.
+    Response biasa melepas slot begitu view selesai; response SSE menahannya sampai stream ditutup.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # hanya username dari session; tanpa login dikunci per IP (username di body bisa diganti-ganti).
+            # Di belakang proxy, IP klien baru benar kalau TRUSTED_PROXIES (app.py) diisi.
+            username = getattr(g, "username", None)
+            key = username if username else "ip:" + (request.remote_addr or "")
+            wait = rate_limiter.check(key, cost)
+            if wait:
+                return _too_many("Terlalu banyak permintaan, coba lagi nanti", wait)
+            try:
+                admission.acquire()
+            except Overloaded as e:
+                return _too_many("Server AI sedang penuh, coba lagi sebentar", e.retry_after)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                admission.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(admission.release)  # SSE: tahan slot sampai stream ditutup
+            else:
+                admission.release()
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    return {"admission": admission.stats(), "rate_limited": rate_limiter.rejected,
+            "buckets": len(rate_limiter.user) if isinstance(rate_limiter.user, TokenBucket) else None}
@@ -0,0 +1,275 @@
+# retention.py - kebijakan retensi per tabel: arsipkan / hapus baris lama per batch, lalu incremental vacuum
+# Dijalankan dari CLI (manage.py retention-run / compact), mis. lewat cron tiap malam.
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from database import DB_PATH, connect, transaction
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+RETENTION_CHATS_DAYS = float(os.getenv("RETENTION_CHATS_DAYS", 180))   # 0 = simpan selamanya
+RETENTION_SCORES_DAYS = float(os.getenv("RETENTION_SCORES_DAYS", 0))   # default simpan (lihat catatan Policy)
+RETENTION_TARGET = os.getenv("RETENTION_TARGET", "db")                 # db: attach arsip SQLite | jsonl: file .jsonl.gz
+RETENTION_ARCHIVE_DB = Path(os.getenv("RETENTION_ARCHIVE_DB", DB_PATH.with_name(DB_PATH.stem + "_archive.db")))
+RETENTION_ARCHIVE_DIR = Path(os.getenv("RETENTION_ARCHIVE_DIR", DB_PATH.parent / "archive"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", 1000))       # baris per transaksi (write lock singkat)
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE", 0.05))     # detik jeda antar batch, beri giliran request
+VACUUM_STEP_PAGES = int(os.getenv("VACUUM_STEP_PAGES", 1000))   # halaman per langkah incremental_vacuum
+
+LAST_RUN_KEY = "retention_last_run"
+
+
+class Policy:
+    """
+    Satu tabel: baris dengan `column` lebih lama dari `days` hari di-`archive` atau di-`delete`.
+    epoch=True: kolom berisi detik unix (expires_at / updated_at), selain itu DATETIME UTC teks.
+    Catatan scores: user_totals tetap utuh, tapi rebuild-leaderboard hanya melihat skor yang
+    belum diarsipkan - karena itu default-nya simpan selamanya.
+    """
+
+    def __init__(self, table, column, days, action="archive", epoch=False):
+        self.table = table
+        self.column = column
+        self.days = days
+        self.action = action
+        self.epoch = epoch
+
+    @property
+    def enabled(self):
+        return self.days > 0 or (self.action == "delete" and self.epoch)
+
+    def cutoff(self, now=None):
+        now = now or time.time()
+        if self.epoch:
+            return now - self.days * 86400
+        moment = datetime.fromtimestamp(now, timezone.utc) - timedelta(days=self.days)
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    def describe(self):
+        if not self.enabled:
+            return "simpan selamanya"
+        if self.epoch and not self.days:
+            return f"hapus saat {self.column} lewat"
+        return f"{self.action} setelah {self.days:g} hari ({self.column})"
+
+
+POLICIES = {
+    "chats": Policy("chats", "created_at", RETENTION_CHATS_DAYS),
+    "scores": Policy("scores", "created_at", RETENTION_SCORES_DAYS),
+    "ai_cache": Policy("ai_cache", "expires_at", 0, "delete", epoch=True),
+    "sessions": Policy("sessions", "expires_at", 0, "delete", epoch=True),
+    "rate_buckets": Policy("rate_buckets", "updated_at", 1, "delete", epoch=True),  # bucket > 1 hari pasti penuh lagi
+    "jobs": Policy("jobs", "finished_at", 1, "delete", epoch=True),  # status job cukup disimpan sehari
+}
+
+
+def _columns(conn, table, schema="main"):
+    return [r["name"] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+class _ArchiveDB:
+    """Tujuan arsip: database SQLite terpisah yang di-ATTACH; salin + hapus dalam satu transaksi."""
+
+    def __init__(self, conn, path=RETENTION_ARCHIVE_DB):
+        self.conn = conn
+        self.path = Path(path)
+        conn.execute("ATTACH DATABASE ? AS archive", (str(self.path),))
+
+    def prepare(self, table):
+        conn = self.conn
+        conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archive.ux_{table}_id ON {table}(id)")
+        # kolom baru di tabel utama (migrasi berikutnya) ikut ditambahkan ke arsip
+        existing = set(_columns(conn, table, "archive"))
+        for column in _columns(conn, table):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+
+    def move(self, policy, cutoff, batch):
+        table, cols = policy.table, ", ".join(_columns(self.conn, policy.table))
+        with transaction(self.conn) as conn:
+            ids = [r[0] for r in conn.execute(
+                f"SELECT rowid FROM main.{table} WHERE {policy.column} < ? ORDER BY rowid LIMIT ?", (cutoff, batch))]
+            if not ids:
+                return 0
+            # OR IGNORE: batch yang pernah tersalin tapi belum terhapus (crash) tidak dobel
+            conn.execute(
+                f"INSERT OR IGNORE INTO archive.{table} ({cols}) SELECT {cols} FROM main.{table} "
+                "WHERE rowid IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+            conn.execute(f"DELETE FROM main.{table} WHERE rowid IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+        return len(ids)
+
+    def close(self):
+        self.conn.execute("DETACH DATABASE archive")
+
+
+class _ArchiveFiles:
+    """Tujuan arsip: <dir>/<tabel>-<waktu run>.jsonl.gz; batch ditulis + fsync dulu, baru dihapus dari DB."""
+
+    def __init__(self, conn, directory=RETENTION_ARCHIVE_DIR):
+        self.conn = conn
+        self.dir = Path(directory)
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+
+    def prepare(self, table):
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def move(self, policy, cutoff, batch):
+        table = policy.table
+        rows = self.conn.execute(
+            f"SELECT rowid AS _rowid, * FROM {table} WHERE {policy.column} < ? ORDER BY rowid LIMIT ?",
+            (cutoff, batch)).fetchall()
+        if not rows:
+            return 0
+        path = self.dir / f"{table}-{self.stamp}.jsonl.gz"
+        with gzip.open(path, "ab") as f:  # tiap batch = satu member gzip; gzip.open membaca semuanya berurutan
+            for r in rows:
+                row = dict(r)
+                row.pop("_rowid")
+                f.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        ids = [r["_rowid"] for r in rows]
+        with transaction(self.conn) as conn:
+            conn.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT value FROM json_each(?)) AND {policy.column} < ?",
+                         (json.dumps(ids), cutoff))
+        return len(ids)
+
+    def close(self):
+        pass
+
+
+def _delete_batch(conn, policy, cutoff, batch):
+    with transaction(conn):
+        cur = conn.execute(
+            f"DELETE FROM {policy.table} WHERE rowid IN "
+            f"(SELECT rowid FROM {policy.table} WHERE {policy.column} < ? LIMIT ?)", (cutoff, batch))
+    return cur.rowcount
+
+
+def run(tables=None, days=None, target=RETENTION_TARGET, batch=RETENTION_BATCH, pause=RETENTION_PAUSE,
+        dry_run=False, now=None):
+    """
+    Jalankan kebijakan retensi. Tiap batch transaksi sendiri (BEGIN IMMEDIATE singkat),
+    jeda `pause` detik di antaranya supaya request aplikasi tidak tertahan lama.
+    Return {tabel: jumlah baris diarsip/dihapus (dry_run: yang akan diproses)}.
+    """
+    now = now or time.time()
+    policies = [POLICIES[t] for t in (tables or POLICIES)]
+    if days is not None:
+        # override hanya untuk tabel yang diarsipkan; kedaluwarsa cache/session tetap apa adanya
+        policies = [Policy(p.table, p.column, days, p.action, p.epoch) if p.action == "archive" else p
+                    for p in policies]
+    conn = connect()
+    archive = None
+    result = {}
+    try:
+        for policy in policies:
+            if not policy.enabled:
+                continue
+            cutoff = policy.cutoff(now)
+            if dry_run:
+                result[policy.table] = conn.execute(
+                    f"SELECT COUNT(*) FROM {policy.table} WHERE {policy.column} < ?", (cutoff,)).fetchone()[0]
+                continue
+            if policy.action == "archive" and archive is None:
+                archive = (_ArchiveDB if target == "db" else _ArchiveFiles)(conn)
+            if policy.action == "archive":
+                archive.prepare(policy.table)
+            start, moved = time.perf_counter(), 0
+            while True:
+                if policy.action == "archive":
+                    n = archive.move(policy, cutoff, batch)
+                else:
+                    n = _delete_batch(conn, policy, cutoff, batch)
+                moved += n
+                if n < batch:
+                    break
+                time.sleep(pause)
+            result[policy.table] = moved
+            log.info("retensi selesai", extra={"data": {
+                "table": policy.table, "action": policy.action, "rows": moved, "cutoff": cutoff,
+                "seconds": round(time.perf_counter() - start, 3)}})
+        if not dry_run:
+            with transaction(conn):
+                conn.execute("INSERT OR REPLACE INTO app_settings (key, value) VALUES (?, ?)",
+                             (LAST_RUN_KEY, json.dumps({"at": now, "target": target, "rows": result})))
+    finally:
+        if archive is not None:
+            archive.close()
+        conn.close()
+    return result
+
+
+def _db_stats(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        "bytes": page_size * pages,
+        "free_bytes": page_size * free,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+    }
+
+
+def compact(max_pages=None, step=VACUUM_STEP_PAGES, full=False, pause=RETENTION_PAUSE):
+    """
+    Kembalikan halaman kosong ke sistem file.
+    - auto_vacuum=incremental: incremental_vacuum bertahap (`step` halaman, lock singkat per langkah)
+    - belum incremental: perlu `full=True` sekali (set mode + VACUUM penuh, lock eksklusif; jalankan saat sepi)
+    Terakhir checkpoint WAL (TRUNCATE) supaya file -wal ikut mengecil.
+    """
+    conn = connect()
+    try:
+        before = _db_stats(conn)
+        if full:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        elif before["auto_vacuum"] != "incremental":
+            log.warning("auto_vacuum bukan incremental; jalankan `manage.py compact --full` sekali")
+        else:
+            freed = 0
+            while conn.execute("PRAGMA freelist_count").fetchone()[0] and (max_pages is None or freed < max_pages):
+                n = step if max_pages is None else min(step, max_pages - freed)
+                conn.execute(f"PRAGMA incremental_vacuum({int(n)})").fetchall()
+                freed += n
+                time.sleep(pause)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        after = _db_stats(conn)
+    finally:
+        conn.close()
+    log.info("compact selesai", extra={"data": {"before": before, "after": after}})
+    return {"before": before, "after": after}
+
+
+def report(now=None):
+    """Ringkasan per tabel (jumlah baris, yang sudah lewat batas, tertua) + ukuran DB & arsip."""
+    now = now or time.time()
+    conn = connect()
+    try:
+        tables = {}
+        for name, policy in POLICIES.items():
+            row = conn.execute(f"SELECT COUNT(*), MIN({policy.column}) FROM {name}").fetchone()
+            eligible = 0
+            if policy.enabled:
+                eligible = conn.execute(
+                    f"SELECT COUNT(*) FROM {name} WHERE {policy.column} < ?", (policy.cutoff(now),)).fetchone()[0]
+            tables[name] = {"policy": policy.describe(), "rows": row[0], "eligible": eligible, "oldest": row[1]}
+        last = conn.execute("SELECT value FROM app_settings WHERE key=?", (LAST_RUN_KEY,)).fetchone()
+        out = {"tables": tables, "db": _db_stats(conn), "last_run": json.loads(last[0]) if last else None}
+    finally:
+        conn.close()
+    archive = {}
+    if RETENTION_ARCHIVE_DB.exists():
+        archive["db"] = {"path": str(RETENTION_ARCHIVE_DB), "bytes": RETENTION_ARCHIVE_DB.stat().st_size}
+    if RETENTION_ARCHIVE_DIR.is_dir():
+        files = list(RETENTION_ARCHIVE_DIR.glob("*.jsonl.gz"))
+        archive["files"] = {"path": str(RETENTION_ARCHIVE_DIR), "count": len(files),
+                            "bytes": sum(f.stat().st_size for f in files)}
+    out["archive"] = archive
+    return out
@@ -0,0 +1,83 @@
+# search.py - query FTS5 yang aman dari input user, highlight, dan deteksi soal mirip
+import html
+import os
+import re
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+SEARCH_MAX_PAGE = int(os.getenv("SEARCH_MAX_PAGE", 100))
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", 1000))    # offset besar = bm25 dihitung ulang untuk semua hit
+QUIZ_DUP_THRESHOLD = float(os.getenv("QUIZ_DUP_THRESHOLD", 0.8))  # kemiripan Jaccard token -> dianggap duplikat
+QUIZ_DUP_CANDIDATES = int(os.getenv("QUIZ_DUP_CANDIDATES", 5))    # kandidat teratas dari FTS yang dibandingkan
+
+# penanda highlight dari snippet()/highlight(); diganti <mark> setelah teks di-escape
+MARK_START, MARK_END = "\x02", "\x03"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "yang dan di ke dari ini itu untuk dengan pada adalah atau apa apakah berapa manakah "
+    "siapa bagaimana mengapa kapan dalam oleh sebagai the of a an is are to in".split()
+)
+
+
+def tokens(text):
+    return [t for t in _WORD.findall((text or "").lower()) if len(t) > 1 or t.isdigit()]
+
+
+def fts_query(text, prefix=True):
+    """
+    Input bebas -> query FTS5 (semua kata wajib ada, token di-quote supaya
+    operator / tanda kutip dari user tidak jadi syntax error). Kata terakhir
+    dicocokkan sebagai prefix (cari sambil mengetik). Return None kalau kosong.
+    """
+    words = tokens(text)
+    if not words:
+        return None
+    parts = [f'"{w}"' for w in words]
+    if prefix:
+        parts[-1] += "*"
+    return " ".join(parts)
+
+
+def fts_any_query(text):
+    """Query OR dari kata bermakna (tanpa stopword): untuk mencari kandidat soal mirip."""
+    words = sorted({w for w in tokens(text) if w not in STOPWORDS})
+    return " OR ".join(f'"{w}"' for w in words) or None
+
+
+def markup(text):
+    """Escape HTML lalu ubah penanda highlight jadi <mark> (aman dipasang sebagai innerHTML)."""
+    return html.escape(text or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def similarity(a, b):
+    """Jaccard atas himpunan token (tanpa stopword)."""
+    a = {t for t in tokens(a) if t not in STOPWORDS}
+    b = {t for t in tokens(b) if t not in STOPWORDS}
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def near_duplicates(category, questions, threshold=QUIZ_DUP_THRESHOLD):
+    """
+    Soal baru yang (hampir) sama dengan soal lain di quiz ini atau soal tersimpan
+    di kategori yang sama. Kandidat diambil dari index FTS (bm25), bukan scan tabel.
+    Return [{"index", "similarity", "duplicate_of": {"index"} | {"quiz_id", "q_index"}}].
+    """
+    from models import similar_questions
+
+    found, seen = [], []
+    for idx, item in enumerate(questions):
+        text = item.get("q") or item.get("question") or ""
+        match = next(((j, s) for j, other in seen if (s := similarity(text, other)) >= threshold), None)
+        if match:
+            found.append({"index": idx, "similarity": round(match[1], 3), "duplicate_of": {"index": match[0]}})
+        else:
+            for row in similar_questions(text, category, limit=QUIZ_DUP_CANDIDATES):
+                score = similarity(text, row["question"])
+                if score >= threshold:
+                    found.append({"index": idx, "similarity": round(score, 3),
+                                  "duplicate_of": {"quiz_id": row["quiz_id"], "q_index": row["q_index"]}})
+                    break
+        seen.append((idx, text))
+    return found
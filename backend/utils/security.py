@@ -1,14 +1,167 @@
 # security.py - password hash & verify
+# Format tersimpan: "<algoritma>$<parameter>$<salt>$<hash>" (salt per user, base64).
+# Hash lama (sha256 + salt global, 64 hex) tetap bisa login lalu di-hash ulang.
+import base64
 import hashlib
 import hmac
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PWD_HASHER = os.getenv("PWD_HASHER", "scrypt")                     # scrypt | pbkdf2_sha256
+PWD_SCRYPT_N = int(os.getenv("PWD_SCRYPT_N", 2 ** 14))
+PWD_SCRYPT_R = int(os.getenv("PWD_SCRYPT_R", 8))
+PWD_SCRYPT_P = int(os.getenv("PWD_SCRYPT_P", 1))
+PWD_PBKDF2_ITERATIONS = int(os.getenv("PWD_PBKDF2_ITERATIONS", 600_000))
+PWD_WORKERS = int(os.getenv("PWD_WORKERS", min(4, os.cpu_count() or 1)))  # hash/verify paralel
+PWD_QUEUE_TIMEOUT = float(os.getenv("PWD_QUEUE_TIMEOUT", 10))            # detik menunggu slot
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class PasswordBusy(Exception):
+    """Semua worker hash sedang penuh sampai batas waktu antri."""
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=PWD_SCRYPT_N, r=PWD_SCRYPT_R, p=PWD_SCRYPT_P):
+        self.n, self.r, self.p = n, r, p
+
+    def _derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES)
+
+    def encode(self, password, salt=None):
+        salt = salt or os.urandom(SALT_BYTES)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}$n={self.n},r={self.r},p={self.p}${_b64(salt)}${_b64(digest)}"
+
+    def _params(self, encoded):
+        _, params, salt, digest = encoded.split("$")
+        values = dict(kv.split("=") for kv in params.split(","))
+        return int(values["n"]), int(values["r"]), int(values["p"]), _unb64(salt), _unb64(digest)
+
+    def verify(self, password, encoded):
+        n, r, p, salt, digest = self._params(encoded)
+        return hmac.compare_digest(self._derive(password, salt, n, r, p), digest)
+
+    def needs_update(self, encoded):
+        n, r, p, _, _ = self._params(encoded)
+        return (n, r, p) != (self.n, self.r, self.p)
+
+
+class PBKDF2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=PWD_PBKDF2_ITERATIONS):
+        self.iterations = iterations
+
+    def _derive(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=HASH_BYTES)
+
+    def encode(self, password, salt=None):
+        salt = salt or os.urandom(SALT_BYTES)
+        digest = self._derive(password, salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${_b64(salt)}${_b64(digest)}"
+
+    def verify(self, password, encoded):
+        _, iterations, salt, digest = encoded.split("$")
+        return hmac.compare_digest(self._derive(password, _unb64(salt), int(iterations)), _unb64(digest))
+
+    def needs_update(self, encoded):
+        return int(encoded.split("$")[1]) != self.iterations
+
+
+class LegacySHA256Hasher:
+    """Format lama: sha256(PWD_SALT + password) hex, salt global. Hanya untuk verifikasi."""
+    algorithm = "sha256_legacy"
+
+    def encode(self, password, salt=None):
+        salt = os.getenv("PWD_SALT", "edumate_salt_default")
+        return hashlib.sha256((salt + password).encode()).hexdigest()
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(self.encode(password), encoded)
+
+    def needs_update(self, encoded):
+        return True
+
+
+HASHERS = {h.algorithm: h for h in (ScryptHasher(), PBKDF2Hasher())}
+_legacy = LegacySHA256Hasher()
+
+
+def get_hasher(name=None):
+    return HASHERS[name or PWD_HASHER]
+
+
+def _identify(hashed):
+    algorithm = (hashed or "").split("$", 1)[0]
+    if algorithm in HASHERS:
+        return HASHERS[algorithm]
+    return _legacy
+
+
+def hash_password(password: str, hasher=None) -> str:
+    return (hasher or get_hasher()).encode(password)
 
-def hash_password(password: str) -> str:
-    # simple salted sha256 (salt stored with hashed password not used here for simplicity)
-    salt = os.getenv("PWD_SALT", "edumate_salt_default")
-    return hashlib.sha256((salt + password).encode()).hexdigest()
 
 def verify_password(password: str, hashed: str) -> bool:
-    return hmac.compare_digest(hash_password(password), hashed)
+    try:
+        return _identify(hashed).verify(password, hashed)
+    except (ValueError, KeyError):  # string hash rusak
+        return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True kalau hash bukan algoritma/parameter default saat ini (rehash saat login berhasil)."""
+    hasher = _identify(hashed)
+    if hasher is not get_hasher():
+        return True
+    try:
+        return hasher.needs_update(hashed)
+    except (ValueError, KeyError):
+        return True
+
+
+class PasswordPool:
+    """
+    KDF sengaja berat di CPU. hashlib.scrypt/pbkdf2_hmac melepas GIL, jadi dijalankan
+    di pool thread terbatas: login serentak di awal kelas maksimal memakai
+    `workers` core, request lain (chat/quiz) tetap jalan.
+    """
+
+    def __init__(self, workers=PWD_WORKERS, queue_timeout=PWD_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        # slot = worker + antrian sepanjang jumlah worker; sisanya menunggu / ditolak
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwd")
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordBusy("Server sedang sibuk memproses login, coba lagi")
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, password, hashed):
+        return self._run(verify_password, password, hashed)
 
 
+password_pool = PasswordPool()
@@ -0,0 +1,135 @@
+# sessions.py - token session bertanda tangan (HMAC) + store: memori LRU di depan tabel sessions
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from functools import wraps
+
+from flask import g, jsonify, request
+
+from models import session_create, session_delete, session_get, get_setting
+from utils.cache import MemoryCache
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", 7 * 24 * 3600))          # umur token (detik)
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 300))        # logout di worker lain terlihat <= ini
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "0") == "1"                # 0: tanpa token tetap boleh, sebagai "anonymous"
+
+_secret = None
+
+
+def _get_secret():
+    # SESSION_SECRET dari env, atau dibuat sekali dan disimpan di DB (sama untuk semua worker)
+    global _secret
+    if _secret is None:
+        value = os.getenv("SESSION_SECRET") or get_setting("session_secret", lambda: secrets.token_hex(32))
+        _secret = value.encode()
+    return _secret
+
+
+def _sign(session_id):
+    digest = hmac.new(_get_secret(), session_id.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+class SessionStore:
+    """
+    resolve(token) -> username dalam O(1):
+    - tanda tangan dicek dulu (token palsu ditolak tanpa menyentuh DB)
+    - lalu memori LRU, baru tabel sessions kalau miss
+    Tabel users tidak pernah dibaca per request.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, cache=None):
+        self.ttl = ttl
+        self.cache = cache or MemoryCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+    def create(self, username):
+        session_id = secrets.token_urlsafe(24)
+        expires_at = time.time() + self.ttl
+        session_create(session_id, username, expires_at)
+        self.cache.set(session_id, (username, expires_at))
+        return f"{session_id}.{_sign(session_id)}"
+
+    def _session_id(self, token):
+        session_id, _, signature = (token or "").partition(".")
+        if not session_id or not hmac.compare_digest(signature, _sign(session_id)):
+            return None
+        return session_id
+
+    def resolve(self, token):
+        session_id = self._session_id(token)
+        if session_id is None:
+            return None
+        hit = self.cache.get(session_id)
+        if hit is None:
+            row = session_get(session_id)
+            if row is None:
+                return None
+            hit = (row["username"], row["expires_at"])
+            self.cache.set(session_id, hit)
+        username, expires_at = hit
+        if expires_at <= time.time():
+            self.cache.delete(session_id)
+            return None
+        return username
+
+    def revoke(self, token):
+        session_id = self._session_id(token)
+        if session_id is not None:
+            self.cache.delete(session_id)
+            session_delete(session_id)
+
+
+session_store = SessionStore()
+
+
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+def load_session():
+    """
+    before_request untuk blueprint chat & quiz: isi g.username dari token.
+    Token ada tapi tidak valid -> 401. Tanpa token -> 401 kalau AUTH_REQUIRED,
+    selain itu g.username None dan request jalan sebagai "anonymous"; username lain
+    di body tanpa token ditolak (tidak bisa mengaku sebagai user lain).
+    """
+    if request.method == "OPTIONS":
+        return None
+    token = _bearer_token()
+    g.username = None
+    if token:
+        g.username = session_store.resolve(token)
+        if g.username is None:
+            return jsonify({"error": "Session tidak valid atau kedaluwarsa"}), 401
+    elif AUTH_REQUIRED:
+        return jsonify({"error": "Login diperlukan"}), 401
+    elif _body_username() not in (None, "", "anonymous"):
+        return jsonify({"error": "Login diperlukan untuk memakai username"}), 401
+    return None
+
+
+def _body_username():
+    data = request.get_json(silent=True) if request.is_json else None
+    return data.get("username") if isinstance(data, dict) else None
+
+
+def login_required(view):
+    """Untuk endpoint yang wajib punya session walaupun AUTH_REQUIRED=0."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not getattr(g, "username", None):
+            return jsonify({"error": "Login diperlukan"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def current_username(data=None):
+    """Username dari session; tanpa session selalu "anonymous" (load_session menolak username lain di body)."""
+    return getattr(g, "username", None) or "anonymous"
@@ -0,0 +1,178 @@
+# static_files.py - index file frontend di memori: hash konten, URL ber-fingerprint,
+# varian gzip/brotli, ETag + 304. Tidak ada stat/open file per request.
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+from pathlib import Path
+
+from flask import Response, request, send_file
+
+try:  # brotli opsional; tanpa paket ini cukup gzip (atau file .br yang sudah ada di disk)
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_MAX_MEMORY_BYTES = int(os.getenv("STATIC_MAX_MEMORY_BYTES", 5 * 1024 * 1024))  # per file
+STATIC_AUTO_RELOAD = os.getenv("STATIC_AUTO_RELOAD", "0") == "1"                      # dev: cek perubahan file
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 256
+ENCODING_TAG_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+# href="style.css" / src="script.js" di HTML -> URL ber-fingerprint
+_ASSET_REF = re.compile(r'((?:href|src)=["\'])([^"\'#?:]+)(["\'])')
+
+
+class StaticFile:
+    __slots__ = ("name", "path", "mimetype", "tag", "fingerprinted", "variants", "mtime")
+
+    def __init__(self, name, path, mimetype, data, mtime):
+        self.name = name
+        self.path = path
+        self.mimetype = mimetype
+        self.mtime = mtime
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        self.tag = digest  # ETag (tanpa kutip) varian identity; varian terkompresi diberi suffix
+        stem, dot, ext = name.rpartition(".")
+        self.fingerprinted = f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+        self.variants = {}  # encoding ("identity" / "gzip" / "br") -> bytes
+        if len(data) <= STATIC_MAX_MEMORY_BYTES:
+            self.variants["identity"] = data
+            self._compress(data)
+
+    def _compress(self, data):
+        if len(data) < MIN_COMPRESS_BYTES or not self.mimetype.startswith(COMPRESSIBLE):
+            return
+        for encoding, suffix, compress in (
+            ("br", ".br", brotli.compress if brotli else None),
+            ("gzip", ".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0)),
+        ):
+            precompressed = Path(str(self.path) + suffix)
+            if precompressed.is_file() and precompressed.stat().st_mtime >= self.mtime:
+                body = precompressed.read_bytes()  # hasil build (mis. brotli -q 11) dipakai apa adanya
+            elif compress is not None:
+                body = compress(data)
+            else:
+                continue
+            if len(body) < len(data):
+                self.variants[encoding] = body
+
+
+class StaticIndex:
+    """
+    Dibangun sekali saat startup dari folder frontend:
+    - nama file & nama ber-fingerprint (style.<hash>.css) -> StaticFile
+    - HTML ditulis ulang supaya memakai URL ber-fingerprint (cache immutable 1 tahun),
+      HTML sendiri `no-cache` + ETag (revalidasi murah, 304)
+    """
+
+    def __init__(self, root, auto_reload=STATIC_AUTO_RELOAD):
+        self.root = Path(root)
+        self.auto_reload = auto_reload
+        self._files = {}
+        self._by_fingerprint = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _scan(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            p for p in self.root.rglob("*")
+            if p.is_file() and p.suffix not in (".gz", ".br") and not p.name.startswith(".")
+        )
+
+    def reload(self):
+        paths = self._scan()
+        raw = {p.relative_to(self.root).as_posix(): p for p in paths}
+        files = {}
+        # aset dulu (hash-nya dipakai untuk menulis ulang HTML), HTML belakangan
+        for name in sorted(raw, key=lambda n: n.endswith(".html")):
+            path = raw[name]
+            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            data = path.read_bytes()
+            if name.endswith(".html"):
+                data = self._rewrite_html(name, data, files)
+            files[name] = StaticFile(name, path, mimetype, data, path.stat().st_mtime)
+        with self._lock:
+            self._files = files
+            self._by_fingerprint = {f.fingerprinted: f for f in files.values()}
+            self._signature = self._fingerprint_of(paths)
+        return len(files)
+
+    @staticmethod
+    def _fingerprint_of(paths):
+        return tuple((str(p), p.stat().st_mtime_ns) for p in paths)
+
+    def _rewrite_html(self, name, data, files):
+        base = name.rpartition("/")[0]
+
+        def repl(m):
+            ref = m.group(2)
+            target = ref.lstrip("/") if ref.startswith("/") else posixpath.normpath(posixpath.join(base, ref))
+            asset = files.get(target)
+            if asset is None or target.endswith(".html"):
+                return m.group(0)
+            head, sep, _ = ref.rpartition("/")
+            return f"{m.group(1)}{head}{sep}{asset.fingerprinted.rpartition('/')[2]}{m.group(3)}"
+
+        return _ASSET_REF.sub(repl, data.decode("utf-8")).encode("utf-8")
+
+    def _maybe_reload(self):
+        if not self.auto_reload or time.monotonic() - self._checked_at < 1:
+            return
+        self._checked_at = time.monotonic()
+        if self._fingerprint_of(self._scan()) != self._signature:
+            self.reload()
+
+    def lookup(self, name):
+        """Return (StaticFile, immutable) atau (None, False)."""
+        self._maybe_reload()
+        with self._lock:
+            entry = self._by_fingerprint.get(name)
+            if entry is not None:
+                return entry, True
+            return self._files.get(name), False
+
+    def url_for(self, name):
+        entry, _ = self.lookup(name)
+        return "/" + (entry.fingerprinted if entry else name)
+
+    def serve(self, name):
+        """Response untuk file `name`, atau None kalau tidak ada di index."""
+        entry, immutable = self.lookup(name)
+        if entry is None:
+            return None
+        cache_control = f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable" if immutable else "no-cache"
+        if "identity" not in entry.variants:  # file besar: tidak ditahan di memori
+            resp = send_file(entry.path, mimetype=entry.mimetype, conditional=True, etag=entry.tag)
+            resp.headers["Cache-Control"] = cache_control
+            return resp
+
+        accepted = request.accept_encodings
+        encoding = next((e for e in ("br", "gzip") if e in entry.variants and accepted.quality(e) > 0), "identity")
+        # tiap content-coding punya validator sendiri (RFC 9110 8.8.3): "<hash>", "<hash>-gz", "<hash>-br"
+        tag = entry.tag + ENCODING_TAG_SUFFIX[encoding]
+        headers = {"ETag": f'"{tag}"', "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+        # If-None-Match diparse werkzeug jadi daftar tag: "*", W/"..." (perbandingan lemah) dan beberapa tag
+        if request.if_none_match.contains_weak(tag):
+            return Response(status=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(entry.variants[encoding], mimetype=entry.mimetype, headers=headers)
+
+    def stats(self):
+        with self._lock:
+            files = list(self._files.values())
+        return {
+            "files": len(files),
+            "bytes": sum(len(v) for f in files for v in f.variants.values()),
+            "brotli": brotli is not None,
+        }
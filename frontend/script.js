@@ -9,12 +9,17 @@ function detectApiBase() {
 const API_BASE = detectApiBase();
 
 ///// ====== API helpers ======
+function authHeaders() {
+  const token = localStorage.getItem("token");
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
 async function apiPost(path, body = {}) {
   if (!path.startsWith("/")) path = "/" + path;
   const url = `${API_BASE}${path}`;
   return fetch(url, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", ...authHeaders() },
     body: JSON.stringify(body),
   });
 }
@@ -22,7 +27,7 @@ async function apiPost(path, body = {}) {
 async function apiGet(path) {
   if (!path.startsWith("/")) path = "/" + path;
   const url = `${API_BASE}${path}`;
-  return fetch(url, { method: "GET" });
+  return fetch(url, { method: "GET", headers: authHeaders() });
 }
 
 ///// ====== Utils ======
@@ -80,6 +85,7 @@ if (loginForm) {
       }
 
       localStorage.setItem("username", username);
+      if (data.token) localStorage.setItem("token", data.token);
       msgEl.innerText = "Login berhasil. Mengalihkan...";
       setTimeout(() => (window.location.href = "home.html"), 800);
     } catch {
@@ -140,16 +146,11 @@ async function startQuizRequest() {
   const total = parseInt(document.getElementById("quizTotal")?.value) || 10;
 
   try {
-    const res = await apiPost("/api/quiz", { username, category, total });
-    const text = await res.text();
-    console.log("DEBUG RAW QUIZ OUTPUT:", text);
-
-    let data = {};
-    try {
-      data = JSON.parse(text);
-    } catch {
-      console.warn("⚠️ Gagal parse JSON quiz, fallback ke array.");
-    }
+    // generate di worker background: dapat job_id, lalu long-poll sampai selesai
+    const res = await apiPost("/api/quiz/jobs", { username, category, total });
+    let data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.error || "Gagal membuat quiz.");
+    data = await waitQuizJob(data.job_id);
 
     const questions =
       data.questions ||
@@ -168,6 +169,16 @@ async function startQuizRequest() {
   }
 }
 
+async function waitQuizJob(jobId) {
+  for (;;) {
+    const res = await apiGet(`/api/quiz/jobs/${encodeURIComponent(jobId)}?wait=20`);
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.error || "Status quiz tidak tersedia.");
+    if (data.status === "done") return data;
+    if (data.status === "failed") throw new Error(data.error || "Gagal membuat quiz.");
+  }
+}
+
 function startQuiz(questions, quizId) {
   quizState.questions = questions.map((q, i) => ({ ...q, index: i }));
   quizState.quizId = quizId;
@@ -285,6 +296,8 @@ function normalizeAnswer(ans, options = []) {
 }
 
 ///// ====== CHAT ======
+let chatCursor = { before: null, after: null, hasMore: false, loading: false };
+
 const chatForm = document.getElementById("chatForm");
 if (chatForm) {
   chatForm.addEventListener("submit", async (e) => {
@@ -296,19 +309,116 @@ if (chatForm) {
     const username = localStorage.getItem("username") || "anonymous";
     appendChat("user", msg);
 
+    input.value = "";
     try {
-      const res = await apiPost("/api/chat", { username, message: msg });
-      const data = await res.json().catch(() => ({}));
-      if (!res.ok) throw new Error(data.error || "Gagal kirim chat");
-      appendChat("bot", data.reply);
+      await streamChat(username, msg);
     } catch (err) {
       appendChat("bot", "⚠️ Gagal kirim pesan: " + err.message);
     }
-    input.value = "";
   });
+
+  // riwayat: halaman terbaru dulu, pesan lama diambil saat scroll ke atas
+  loadChatHistory();
+  const box = document.getElementById("chatBox");
+  box && box.addEventListener("scroll", () => {
+    if (box.scrollTop === 0 && chatCursor.hasMore) loadChatHistory({ older: true });
+  });
+  // balik ke tab: ambil pesan baru saja (mis. dari tab lain) lewat after_id
+  document.addEventListener("visibilitychange", () => {
+    if (!document.hidden && chatCursor.after) loadChatHistory({ newer: true });
+  });
+}
+
+async function loadChatHistory({ older = false, newer = false } = {}) {
+  const box = document.getElementById("chatBox");
+  const username = localStorage.getItem("username");
+  if (!box || !username || chatCursor.loading) return;
+
+  const params = new URLSearchParams({ limit: "50" });
+  if (older && chatCursor.before) params.set("before_id", chatCursor.before);
+  if (newer && chatCursor.after) params.set("after_id", chatCursor.after);
+
+  chatCursor.loading = true;
+  try {
+    const res = await apiGet(`/api/chat/history/${encodeURIComponent(username)}?${params}`);
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) return;
+
+    const rows = data.history || [];
+    if (older) {
+      // prepend tanpa loncat posisi scroll
+      const prevHeight = box.scrollHeight;
+      rows.slice().reverse().forEach((r) => appendChat(r.role, r.message, { prepend: true }));
+      box.scrollTop = box.scrollHeight - prevHeight;
+      chatCursor.before = data.before_id;
+      chatCursor.hasMore = !!data.has_more;
+    } else if (newer) {
+      rows.forEach((r) => appendChat(r.role, r.message));
+      chatCursor.after = data.after_id;
+    } else {
+      rows.forEach((r) => appendChat(r.role, r.message));
+      chatCursor.after = data.after_id;
+      chatCursor.before = data.before_id;
+      chatCursor.hasMore = !!data.has_more;
+    }
+  } catch (err) {
+    console.warn("Gagal memuat riwayat chat:", err);
+  } finally {
+    chatCursor.loading = false;
+  }
+}
+
+// Jawaban bot tampil token per token lewat SSE (/api/chat/stream).
+// Browser tanpa ReadableStream pakai endpoint biasa.
+async function streamChat(username, message) {
+  if (!window.ReadableStream || !window.TextDecoder) {
+    const res = await apiPost("/api/chat", { username, message });
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.error || "Gagal kirim chat");
+    appendChat("bot", data.reply);
+    if (data.cursor) chatCursor.after = data.cursor;
+    return;
+  }
+
+  const res = await apiPost("/api/chat/stream", { username, message });
+  if (!res.ok || !res.body) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.error || "Gagal kirim chat");
+  }
+
+  const bubble = appendChat("bot", "");
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let text = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = (raw.match(/^event: (.*)$/m) || [])[1] || "message";
+      const dataLine = (raw.match(/^data: (.*)$/m) || [])[1];
+      const data = dataLine ? JSON.parse(dataLine) : {};
+
+      if (event === "token" || event === "error") {
+        text += data.text || data.error || "";
+      } else if (event === "done") {
+        text = data.reply || text;
+        if (data.cursor) chatCursor.after = data.cursor;
+      }
+      bubble && (bubble.querySelector(".msg-text").textContent = text);
+      const box = document.getElementById("chatBox");
+      box && (box.scrollTop = box.scrollHeight);
+    }
+  }
 }
 
-function appendChat(role, text) {
+function appendChat(role, text, { prepend = false } = {}) {
   const box = document.getElementById("chatBox");
   if (!box) return;
   const div = document.createElement("div");
@@ -319,15 +429,24 @@ function appendChat(role, text) {
       <span class="msg-text">${escapeHtml(text)}</span>
     </div>
   `;
+  if (prepend) {
+    box.insertBefore(div, box.firstChild);
+    return div;
+  }
   box.appendChild(div);
   box.scrollTop = box.scrollHeight;
+  return div;
 }
 
 ///// ====== LOGOUT ======
 const btnLogout = document.getElementById("btnLogout");
 if (btnLogout) {
-  btnLogout.addEventListener("click", () => {
+  btnLogout.addEventListener("click", async () => {
+    try {
+      await apiPost("/api/auth/logout");
+    } catch {}
     localStorage.removeItem("username");
+    localStorage.removeItem("token");
     window.location.href = "login.html";
   });
 }